@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
-from utils.file_loader import load_file
-from utils.scoring import CollectionScorer
-from utils.analyzer import CollectionAnalyzer
-from utils.font_config import set_chinese_font
-from utils.qwen_helper import analyze_with_qwen
-import matplotlib.pyplot as plt
-
-set_chinese_font()
+from utils.analyzer import CollectionAnalyzer, TrendAnalyzer
+from utils.session_store import SessionStore
+from utils.exporter import EXPORT_FORMATS, export_to_file
+from utils.region import LEVEL_NAMES
+from utils.scoring import EXPLAIN_COL, WeightedRanker, explain
+from utils.quality import quality_issues
+from utils.job_queue import save_upload, start_workers
+from utils.snapshot import load_snapshot
+import json
+from datetime import date
+import os
+import uuid
+
+# 中文字体在 CollectionAnalyzer 首次创建时配置（进程内只执行一次）
 # plt.rcParams["font.family"] = ["DejaVu Sans", "sans-serif"]
 st.set_page_config(page_title="催收分析系统", layout="wide")
 st.title("📊 催收用户画像分析系统")
@@ -36,102 +42,407 @@ if api_key:
 else:
     st.sidebar.warning("⚠️ 请输入 Qwen API Key 才能使用画像分析功能")
 
+# 评分基准日：同一文件在同一基准日下的评分结果可复现，并直接复用快照
+as_of = st.sidebar.date_input("评分基准日：", value=date.today())
+
+
+@st.cache_resource
+def get_session_store():
+    """进程级会话数据仓库：所有会话共用，按会话内存预算溢写空闲数据"""
+    return SessionStore()
+
+
+@st.cache_resource
+def get_job_queue():
+    """后台任务队列：每个服务进程启动一次 worker（并发数由 PROFILE_JOB_WORKERS 控制）"""
+    return start_workers()
+
+
+store = get_session_store()
+jobs = get_job_queue()
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+
+
+@st.fragment(run_every=1.5)
+def show_job_progress(job_id, label):
+    """轮询任务进度，任务结束后整页刷新"""
+    job = jobs.get(job_id)
+    if job is None or job["status"] in ("done", "failed"):
+        st.rerun()
+    if job["status"] == "queued":
+        st.progress(0.0, text=f"{label}：排队中（前面还有 {jobs.position(job_id)} 个任务）")
+    else:
+        st.progress(job["progress"] or 0.0, text=f"{label}：{job['message'] or '执行中'}")
+
+
+def get_scored_frame(uploaded_file, as_of):
+    """
+    读取并评分上传文件：评分在后台任务中执行，页面只轮询进度。
+    同一文件 + 基准日在会话内只计算一次（评分结果存放在会话仓库中）；
+    总是返回评分结果，任务未完成 / 失败时由 st.stop() / st.rerun() 结束本次运行，不返回 None
+    """
+    data_key = f"{uploaded_file.file_id}:{as_of}"
+    if st.session_state.get("scored_key") == data_key:
+        scored_df = store.get(session_id, "scored")
+        if scored_df is not None:
+            return scored_df
+
+    score_job = st.session_state.get("score_job")
+    if score_job is None or score_job["data_key"] != data_key:
+        job_id = jobs.submit("score", {
+            "input_path": save_upload(uploaded_file),
+            "file_name": uploaded_file.name,
+            "as_of": as_of.isoformat(),
+        }, owner=session_id)
+        score_job = st.session_state["score_job"] = {"job_id": job_id, "data_key": data_key}
+
+    job = jobs.get(score_job["job_id"])
+    if job is None:
+        # 任务记录已过期清理（或任务库被重置）：重新提交评分任务
+        st.session_state.pop("score_job", None)
+        st.rerun()
+    if job["status"] == "failed":
+        st.error(f"❌ 文件处理失败：{job['error']}")
+        st.stop()
+    if job["status"] != "done":
+        show_job_progress(job["id"], "评分")
+        st.stop()
+
+    # 任务完成：读取评分快照放入会话仓库（原始上传数据不在页面进程中保留）
+    scored_df, _ = load_snapshot(job["result"]["snapshot_key"])
+    if scored_df is None:
+        # 快照已被清理：重新提交评分任务
+        st.session_state.pop("score_job", None)
+        st.rerun()
+    store.put(session_id, "scored", scored_df)
+    st.session_state["scored_key"] = data_key
+    st.session_state["snapshot_meta"] = job["result"]["meta"]
+    # 数据质量报告随评分结果一起缓存，读取时已顺带算好，不再扫描文件
+    st.session_state["quality"] = job["result"].get("quality")
+    return scored_df
+
+
 # 上传文件
 uploaded_file = st.file_uploader("请上传 Excel 文件（在案 / 前催）", type=["xlsx"])
 if uploaded_file:
-    df, file_type = load_file(uploaded_file)
+    scored_df = get_scored_frame(uploaded_file, as_of)
 
-    if df is None:
-        st.error("❌ 文件读取失败，请检查格式")
-    else:
-        st.success(f"✅ 文件加载成功，识别为 **{file_type}**")
+    snapshot_meta = st.session_state["snapshot_meta"]
+    st.success(f"✅ 文件加载成功，识别为 **{snapshot_meta['file_type']}**")
+    st.caption(
+        f"评分基准日 {snapshot_meta['as_of']} · 规则版本 {snapshot_meta['rules_version']}"
+        f" · 输入哈希 {snapshot_meta['input_hash'][:12]}"
+    )
+
+    quality = st.session_state.get("quality")
+    if quality:
+        issues = quality_issues(quality)
+        if quality["skipped_rules"]:
+            st.warning(f"⚠️ 缺少列 {'、'.join(quality['missing_columns'])}，以下规则未评分："
+                       f"{'、'.join(quality['skipped_rules'])}")
+        for col, suggested in quality.get("needs_confirmation", {}).items():
+            st.info(f"ℹ️ 列「{col}」可能对应「{suggested}」，含义不完全相同，未自动映射；"
+                    f"确认后请在原文件中改列名")
+        with st.expander(f"🩺 数据质量检查（{len(issues)} 项问题）", expanded=False):
+            if len(issues):
+                st.dataframe(issues, hide_index=True)
+            else:
+                st.write("未发现问题")
+            null_rates = pd.Series(quality["null_rates"], name="空值率(%)")
+            st.caption("各列空值率（%）")
+            st.dataframe(null_rates[null_rates > 0].sort_values(ascending=False))
 
-        # 打分
-        scorer = CollectionScorer(df, file_type)
-        scored_df = scorer.run_scoring()
+    # 用户选择分析类型
+    analysis_mode = st.radio(
+        "请选择分析方向：",
+        ["📈 基础数据统计", "💡 最容易还款人员画像与话术", "🔀 两期评分对比"]
+    )
 
-        # 用户选择分析类型
-        analysis_mode = st.radio(
-            "请选择分析方向：",
-            ["📈 基础数据统计", "💡 最容易还款人员画像与话术"]
+    if analysis_mode == "📈 基础数据统计":
+        # 地区计数跨刷新复用：切换 Top N / 下钻不再重新解析证件号
+        cached_rollup = st.session_state.get("region_rollup")
+        analyzer = CollectionAnalyzer(
+            scored_df,
+            region_rollup=cached_rollup["rollup"]
+            if cached_rollup and cached_rollup["scored_key"] == st.session_state["scored_key"] else None
         )
+        menu = st.sidebar.radio("选择分析视图", [
+            "还款模式分布",
+            "风险等级与还款模式",
+            "总体欠款构成",
+            "欠款金额与本金占比",
+            "客户年龄分布",
+            "客户地区分布",
+            "风险概率分布"
+        ])
 
-        if analysis_mode == "📈 基础数据统计":
-            analyzer = CollectionAnalyzer(scored_df)
-            menu = st.sidebar.radio("选择分析视图", [
-                "还款模式分布",
-                "风险等级与还款模式",
-                "总体欠款构成",
-                "欠款金额与本金占比",
-                "客户年龄分布",
-                "客户地区分布",
-                "风险概率分布"
-            ])
-
-            if menu == "还款模式分布":
-                fig = analyzer.analyze_payment_history()
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info('暂无还款数据')
+        if menu == "还款模式分布":
+            fig = analyzer.analyze_payment_history()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info('暂无还款数据')
 
-            elif menu == "风险等级与还款模式":
-                fig = analyzer.analyze_risk_factors()
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("暂无风险数据")
+        elif menu == "风险等级与还款模式":
+            fig = analyzer.analyze_risk_factors()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info("暂无风险数据")
 
-            elif menu == "总体欠款构成":
-                fig = analyzer.analyze_debt_composition()
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info('暂无欠款构成数据')
+        elif menu == "总体欠款构成":
+            fig = analyzer.analyze_debt_composition()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info('暂无欠款构成数据')
 
-            elif menu == "欠款金额与本金占比":
-                fig = analyzer.analyze_debt_ratio()
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info('暂无欠款比例数据')
+        elif menu == "欠款金额与本金占比":
+            fig = analyzer.analyze_debt_ratio()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info('暂无欠款比例数据')
 
-            elif menu == "客户年龄分布":
-                fig = analyzer.analyze_age_distribution()
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("暂无年龄数据")
+        elif menu == "客户年龄分布":
+            fig = analyzer.analyze_age_distribution()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info("暂无年龄数据")
 
-            elif menu == "客户地区分布":
-                top_n = st.number_input("请选择要显示的前 N 个地区", min_value=5, max_value=50, value=10, step=1)
-                fig = analyzer.analyze_region_distribution(top_n=top_n)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("暂无地区数据")
+        elif menu == "客户地区分布":
+            top_n = st.number_input("请选择要显示的前 N 个地区", min_value=5, max_value=50, value=10, step=1)
+            ascending = st.checkbox("升序（显示人数最少的地区）")
+            level, parent = "county", None
+            if "证件号" in scored_df.columns:
+                rollup = analyzer.region_rollup()
+                st.session_state["region_rollup"] = {"scored_key": st.session_state["scored_key"], "rollup": rollup}
 
-            elif menu == "风险概率分布":
-                fig = analyzer.analyze_risk_distribution()
-                if fig:
-                    st.pyplot(fig)
+                # 逐级下钻：省 -> 市 -> 区县，只在预计算的计数上切片
+                provinces = rollup.children("province")
+                province = st.selectbox(
+                    "省份（下钻）", [None] + list(provinces.index),
+                    format_func=lambda c: "全国" if c is None else f"{rollup.name(c)}（{provinces[c]} 人）"
+                )
+                if province is None:
+                    level = st.radio("统计层级", list(LEVEL_NAMES), index=2,
+                                     format_func=LEVEL_NAMES.get, horizontal=True)
                 else:
-                    st.info("暂无风险概率数据")
+                    cities = rollup.children("city", province)
+                    city = st.selectbox(
+                        "城市", [None] + list(cities.index),
+                        format_func=lambda c: "全省各市" if c is None else f"{rollup.name(c)}（{cities[c]} 人）"
+                    )
+                    level, parent = ("city", province) if city is None else ("county", city)
+                if rollup.unparsed:
+                    st.caption(f"共 {rollup.unparsed} 条证件号无法解析地区，未计入统计")
+            fig = analyzer.analyze_region_distribution(top_n=top_n, ascending=ascending, level=level, parent=parent)
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info("暂无地区数据")
 
-        elif analysis_mode == "💡 最容易还款人员画像与话术":
-            k = st.slider("选择要分析的候选人数", min_value=5, max_value=100, value=20, step=5)
+        elif menu == "风险概率分布":
+            fig = analyzer.analyze_risk_distribution()
+            if fig:
+                st.pyplot(fig)
+            else:
+                st.info("暂无风险概率数据")
+
+    elif analysis_mode == "💡 最容易还款人员画像与话术":
+        k = st.slider("选择要分析的候选人数", min_value=5, max_value=100, value=20, step=5)
+        # 规则权重：得分矩阵跨刷新复用，拖动滑块只做一次加权求和 + Top K 选择
+        ranker = st.session_state.get("ranker")
+        if ranker is None or ranker["scored_key"] != st.session_state.get("scored_key"):
+            ranker = st.session_state["ranker"] = {
+                "scored_key": st.session_state.get("scored_key"),
+                "ranker": WeightedRanker(scored_df),
+            }
+        ranker = ranker["ranker"]
+        with st.sidebar.expander("⚖️ 规则权重（试算排名）"):
+            weights = {
+                col: st.slider(col, min_value=0.0, max_value=3.0, value=1.0, step=0.5, key=f"weight_{col}")
+                for col in ranker.score_cols
+            }
+
+        # 评分依据只对展示 / 发给 Qwen 的 Top K 行解码
+        if any(w != 1.0 for w in weights.values()):
+            positions, weighted = ranker.top_k(weights, k)
+            selected_df = scored_df.iloc[positions].assign(加权总评分=weighted)
+        else:
             selected_df = scored_df.head(k)
-            st.subheader(f"🏆 候选人 Top {k}")
-            st.dataframe(selected_df)
-
-            if "qwen_api_key" in st.session_state and st.button("🔍 生成话术指导"):
-                result = analyze_with_qwen(
-                    selected_df,
-                    st.session_state["qwen_api_key"],
-                    st.session_state["qwen_model"]
-                )
+        selected_df = selected_df.assign(评分依据=explain(selected_df)).drop(columns=EXPLAIN_COL, errors="ignore")
+        st.subheader(f"🏆 候选人 Top {k}")
+        st.dataframe(selected_df)
+
+        # 导出完整排名：点击生成后流式写到数据目录下的文件，会话中只保存路径，避免每次刷新都重新导出
+        with st.expander(f"📥 导出完整排名（共 {len(scored_df)} 条）"):
+            export_fmt = st.selectbox("导出格式：", list(EXPORT_FORMATS))
+            if st.button("生成导出文件"):
+                suffix, _, mime = EXPORT_FORMATS[export_fmt]
+                old_export = st.session_state.pop("export_file", None)
+                if old_export and os.path.exists(old_export["path"]):
+                    os.remove(old_export["path"])
+                with st.spinner("正在导出..."):
+                    path = export_to_file(scored_df, export_fmt, prefix=session_id)
+                st.session_state["export_file"] = {
+                    "path": path, "suffix": suffix, "mime": mime,
+                    "scored_key": st.session_state["scored_key"]
+                }
+
+            export_file = st.session_state.get("export_file")
+            if (export_file and export_file["scored_key"] == st.session_state["scored_key"]
+                    and os.path.exists(export_file["path"])):
+                with open(export_file["path"], "rb") as f:
+                    st.download_button(
+                        "⬇️ 下载导出文件",
+                        data=f,
+                        file_name=f"评分排名{export_file['suffix']}",
+                        mime=export_file["mime"]
+                    )
+
+        if "qwen_api_key" in st.session_state and st.button("🔍 生成话术指导"):
+            # 提交后台任务，页面刷新 / 切换后仍可继续查看结果
+            profiles = json.loads(selected_df.to_json(orient="records", force_ascii=False, date_format="iso"))
+            st.session_state["qwen_job"] = jobs.submit("qwen", {
+                "profiles": profiles,
+                "model": st.session_state["qwen_model"],
+                "session_id": session_id,
+            }, owner=session_id, secrets={"api_key": st.session_state["qwen_api_key"]})
+
+        qwen_job = jobs.get(st.session_state["qwen_job"]) if "qwen_job" in st.session_state else None
+        if qwen_job:
+            if qwen_job["status"] == "done":
                 st.subheader("💡 Qwen画像分析与话术建议")
-                st.write(result)
+                st.write(qwen_job["result"]["text"])
+                usage = qwen_job["result"].get("usage") or {}
+                if usage:
+                    st.caption(
+                        f"本会话用量：请求 {usage.get('requests', 0)} 次（重试 {usage.get('retries', 0)}，"
+                        f"限流 {usage.get('throttled', 0)}），输入 {usage.get('input_tokens', 0)} / "
+                        f"输出 {usage.get('output_tokens', 0)} tokens"
+                    )
+            elif qwen_job["status"] == "failed":
+                st.error(f"❌ 生成失败：{qwen_job['error']}")
+            else:
+                show_job_progress(qwen_job["id"], "生成话术")
+
+    elif analysis_mode == "🔀 两期评分对比":
+        st.caption("上传上期导出的完整排名（parquet / csv / xlsx），与本期评分按证件号对比")
+        prev_file = st.file_uploader("上期评分结果", type=["parquet", "csv", "xlsx"], key="prev_scored")
+        k = st.slider("Top K", min_value=10, max_value=1000, value=100, step=10)
+        if prev_file is not None:
+            # 对比结果跨刷新复用：同一对文件 + K 只计算一次
+            diff_key = (st.session_state.get("scored_key"), prev_file.file_id, k)
+            cached = st.session_state.get("run_diff")
+            if cached is None or cached["key"] != diff_key:
+                from utils.run_diff import compare_runs, load_scored
+
+                try:
+                    diff = compare_runs(load_scored(prev_file), scored_df, top_k=k)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                    st.stop()
+                cached = st.session_state["run_diff"] = {"key": diff_key, "diff": diff}
+            diff = cached["diff"]
+            if diff.table.empty:
+                st.warning("⚠️ 上期或本期评分结果为空，无法对比")
+            else:
+                summary = diff.summary()
+                cols = st.columns(5)
+                for col, name in zip(cols, ["共同客户", "本期新增", "本期移出", "进入TopK", "跌出TopK"]):
+                    col.metric(name, summary[name])
+                st.caption(f"名次上升 {summary['名次上升']} 人，下降 {summary['名次下降']} 人；"
+                           f"总评分上升 {summary['总评分上升']} 人，下降 {summary['总评分下降']} 人")
+
+                st.subheader("各规则得分变化合计")
+                st.dataframe(diff.rule_contribution())
+                show_cols = [diff.key, "状态", "上期排名", "本期排名", "排名变化", "总评分变化", "主要原因"]
+                st.subheader(f"进入 Top {k}")
+                st.dataframe(diff.entered()[show_cols], hide_index=True)
+                st.subheader(f"跌出 Top {k}")
+                st.dataframe(diff.left()[show_cols], hide_index=True)
 
 
+# ========== 组合分布摘要（月末全量扫描） ==========
+with st.expander("🗂️ 组合分布摘要（多文件分块统计，适合无法一次载入的全量数据）"):
+    portfolio_files = st.file_uploader(
+        "上传多个文件（xlsx / csv / parquet）", type=["xlsx", "csv", "parquet"],
+        accept_multiple_files=True, key="portfolio_files"
+    )
+    if portfolio_files and st.button("生成组合摘要"):
+        # 全量扫描在后台任务中执行：每个文件分块评分后累加为可合并摘要，不保留明细
+        st.session_state["sketch_job"] = jobs.submit("sketch", {
+            "input_paths": [save_upload(f) for f in portfolio_files],
+            "file_names": [f.name for f in portfolio_files],
+            "as_of": as_of.isoformat(),
+        }, owner=session_id)
 
+    if "sketch_job" in st.session_state:
+        sketch_job = jobs.get(st.session_state["sketch_job"])
+        if sketch_job is None:
+            st.session_state.pop("sketch_job")
+            st.warning("⚠️ 摘要任务记录已过期清理，请重新生成")
+        elif sketch_job["status"] == "done":
+            from utils.sketch import PortfolioSketch
+
+            st.session_state.pop("sketch_job")
+            try:
+                st.session_state["portfolio_sketch"] = PortfolioSketch.load(sketch_job["result"]["sketch_path"])
+            except FileNotFoundError:
+                st.warning("⚠️ 摘要结果已过期清理，请重新生成")
+        elif sketch_job["status"] == "failed":
+            st.session_state.pop("sketch_job")
+            st.error(f"❌ 摘要生成失败：{sketch_job['error']}")
+        else:
+            show_job_progress(sketch_job["id"], "组合摘要")
+
+    if "portfolio_sketch" in st.session_state:
+        sketch = st.session_state["portfolio_sketch"]
+        st.caption(f"共汇总 {sketch.rows} 条记录")
+        sketch_analyzer = CollectionAnalyzer.from_sketch(sketch)
+        sketch_view = st.radio("分布视图", ["客户年龄分布", "风险概率分布", "欠款金额与本金占比", "客户地区分布"],
+                               horizontal=True, key="sketch_view")
+        if sketch_view == "客户年龄分布":
+            fig = sketch_analyzer.analyze_age_distribution()
+        elif sketch_view == "风险概率分布":
+            fig = sketch_analyzer.analyze_risk_distribution()
+        elif sketch_view == "欠款金额与本金占比":
+            fig = sketch_analyzer.analyze_debt_ratio()
+        else:
+            fig = sketch_analyzer.analyze_region_distribution(top_n=20)
+        if fig:
+            st.pyplot(fig)
+        else:
+            st.info("暂无相关数据")
+        for key in ["风险概率分位数", "欠款比例分位数"]:
+            if key in sketch_analyzer.analysis_results:
+                st.write(key, sketch_analyzer.analysis_results[key].to_frame("近似值").T)
+
+
+# ========== 多月趋势（组合历史库） ==========
+with st.expander("📅 多月趋势（读取历史评分库，不重新解析原始文件）"):
+    trend = TrendAnalyzer()
+    partitions = trend.store.partitions()
+    if partitions.empty:
+        st.info("历史库为空：上传的文件评分后会按 月份 / 手别 自动入库"
+                "（批量补录：python -m utils.portfolio_store 2406三手.xlsx 2410三手.xlsx ...）")
+    else:
+        all_months = sorted(partitions["month"].unique())
+        trend.months = st.multiselect("月份", all_months, default=all_months, key="trend_months")
+        trend.hands = st.multiselect("手别", sorted(partitions["手别"].unique()), key="trend_hands") or None
+        trend_view = st.radio("趋势视图", ["还款模式占比", "风险等级占比", "人数与平均总评分"],
+                              horizontal=True, key="trend_view")
+        if trend_view == "还款模式占比":
+            fig = trend.analyze_payment_trend()
+        elif trend_view == "风险等级占比":
+            fig = trend.analyze_risk_trend()
+        else:
+            fig = trend.analyze_score_trend()
+        if fig:
+            st.pyplot(fig)
+            for result in trend.analysis_results.values():
+                st.dataframe(result.round(2))
+        else:
+            st.info("所选月份 / 手别暂无相关数据")
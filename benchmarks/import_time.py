@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动导入耗时基准
+
+每个模块在独立的新 Python 进程中导入（真正的冷启动），重复多次取中位数，
+同时检查是否提前加载了应延迟导入的重型依赖（seaborn / requests / adjustText）。
+
+用法：
+    python benchmarks/import_time.py              # 输出各模块导入耗时
+    python benchmarks/import_time.py --max-ms 3000  # 超过阈值或提前加载重型依赖时返回非 0，便于 CI 跟踪回归
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# worker 进程中执行任务时才导入的模块（app.py 顶层不导入，但影响任务启动耗时）
+WORKER_TARGETS = ["utils.file_loader", "utils.qwen_helper"]
+LAZY_MODULES = ["seaborn", "requests", "adjustText"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "eager": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def app_imports(app_file: str = os.path.join(ROOT, "app.py")) -> list:
+    """
+    app.py 顶层导入的第三方 / 项目模块（解析源码得到，不执行 Streamlit 页面脚本），
+    app.py 新增依赖时自动纳入测量，不需要手动维护列表
+    """
+    with open(app_file, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return [m for m in dict.fromkeys(modules) if m.split(".")[0] not in sys.stdlib_module_names]
+
+
+TARGETS = app_imports() + WORKER_TARGETS
+
+
+def measure(module: str, repeat: int):
+    """在新进程中导入模块，返回 (耗时中位数 ms, 被提前加载的重型模块)"""
+    times, eager = [], set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["ms"])
+        eager.update(result["eager"])
+    return statistics.median(times), sorted(eager)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动导入耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块重复次数（取中位数）")
+    parser.add_argument("--max-ms", type=float, default=None, help="单个模块导入耗时上限（毫秒）")
+    parser.add_argument("modules", nargs="*", default=TARGETS, help="要测量的模块")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'模块':<24}{'导入耗时(ms)':>14}  提前加载的重型依赖")
+    for module in args.modules:
+        try:
+            ms, eager = measure(module, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<24}{'导入失败':>14}  {e.stderr.strip().splitlines()[-1] if e.stderr else ''}")
+            failed = True
+            continue
+        print(f"{module:<24}{ms:>14.1f}  {', '.join(eager) or '-'}")
+        if eager or (args.max_ms is not None and ms > args.max_ms):
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
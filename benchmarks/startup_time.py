@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准（启动到可用）
+
+启动桌面版入口（源码 start.py 或打包后的 dist/profile_analysis 可执行文件），
+轮询 Streamlit 健康检查接口直到返回 ok，记录从启动到可用的耗时，重复多次取中位数。
+
+用法：
+    python benchmarks/startup_time.py                                   # 源码运行 start.py
+    python benchmarks/startup_time.py dist/profile_analysis/profile_analysis.exe --repeat 3
+    python benchmarks/startup_time.py --max-s 5                         # 超过阈值返回非 0
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure(command: list, timeout: float) -> float:
+    """启动一次并等待健康检查通过，返回耗时（秒）；超时返回 None"""
+    port = free_port()
+    env = dict(os.environ, PROFILE_PORT=str(port), STREAMLIT_SERVER_HEADLESS="true")
+    url = f"http://127.0.0.1:{port}/_stcore/health"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"进程提前退出（返回码 {proc.returncode}）")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.read().strip() == b"ok":
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.1)
+        return None
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动到可用耗时基准")
+    parser.add_argument("executable", nargs="?", default=None, help="打包后的可执行文件（默认源码运行 start.py）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（取中位数）")
+    parser.add_argument("--timeout", type=float, default=120, help="单次等待上限（秒）")
+    parser.add_argument("--max-s", type=float, default=None, help="启动耗时上限（秒）")
+    args = parser.parse_args()
+
+    command = [os.path.abspath(args.executable)] if args.executable else [sys.executable, os.path.join(ROOT, "start.py")]
+    times = []
+    for i in range(args.repeat):
+        elapsed = measure(command, args.timeout)
+        if elapsed is None:
+            print(f"第 {i + 1} 次：{args.timeout:.0f} 秒内未就绪")
+            sys.exit(1)
+        print(f"第 {i + 1} 次：{elapsed:.2f} 秒")
+        times.append(elapsed)
+
+    median = statistics.median(times)
+    print(f"启动到可用（中位数）：{median:.2f} 秒")
+    sys.exit(1 if args.max_s is not None and median > args.max_s else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+from utils import compute
+from utils.compute import DEBT_COMPONENTS, PAYMENT_HISTORY_COLS
+from utils.schema import normalize_columns
+
 # 设置中文显示
 plt.rcParams["font.family"] = ["SimHei", "WenQuanYi Micro Hei", "Heiti TC"]
 sns.set(font="SimHei", font_scale=1.2)
@@ -14,30 +18,45 @@ plt.rcParams['axes.unicode_minus'] = False
 
 
 class ThreeHandCollectionAnalyzer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, backend="pandas"):
+        """
+        :param backend: "pandas" 读入内存分析；"duckdb" 只做聚合，在 Parquet 上用 SQL 计算（适合超出内存的数据）
+        """
         self.file_path = file_path
+        self.backend = backend
         self.data = None
+        self.sql = None
         self.analysis_results = {}
+        # 派生列缓存（还款模式、风险等级等只计算一次）
+        self.derived = {}
+        self.payment_history_cols = PAYMENT_HISTORY_COLS
         
+    def _loaded(self):
+        if self.data is None and self.sql is None:
+            print("请先加载数据")
+            return False
+        return True
+
     def load_data(self):
         """加载并预处理2406三手数据"""
+        if self.backend == "duckdb":
+            from utils.sql_backend import DuckDBAggregator
+
+            try:
+                self.sql = DuckDBAggregator.from_file(self.file_path)
+                print(f"DuckDB 聚合模式：{self.sql.row_count()}条记录，{len(self.sql.columns)}列")
+                return self.sql
+            except Exception as e:
+                print(f"数据加载失败: {str(e)}")
+                return None
+
         try:
             self.data = pd.read_excel(self.file_path)
             print(f"成功加载数据：{self.data.shape[0]}条记录，{self.data.shape[1]}列")
             
-            # 处理日期列
-            date_columns = [col for col in self.data.columns if '日期' in col]
-            for col in date_columns:
-                self.data[col] = pd.to_datetime(self.data[col], errors='coerce')
-            
-            # 处理金额列
-            money_columns = [col for col in self.data.columns 
-                           if '金额' in col or '款' in col or '费' in col or '息' in col]
-            for col in money_columns:
-                self.data[col] = pd.to_numeric(self.data[col], errors='coerce')
-                
-            # 历史还款列
-            self.payment_history_cols = [f'上{i}个月最小还款额' for i in range(1,9)] + ['当期最小还款额']
+            # 列名规范化 + 日期列 / 金额列批量转换（同一表头布局只识别一次）
+            self.data = normalize_columns(self.data)
+            self.derived = {}
             
             return self.data
         except Exception as e:
@@ -46,41 +65,19 @@ class ThreeHandCollectionAnalyzer:
     
     def analyze_payment_history(self):
         """分析历史还款模式"""
-        if self.data is None:
-            print("请先加载数据")
+        if not self._loaded():
             return
         
-        payment_analysis = {}
-        
-        # 连续未达标月数
-        self.data['连续未达标月数'] = 0
-        for idx, row in self.data.iterrows():
-            consecutive = 0
-            for col in self.payment_history_cols:
-                if pd.isna(row[col]) or row[col] <= 0:
-                    consecutive += 1
-                else:
-                    consecutive = 0
-            self.data.at[idx, '连续未达标月数'] = consecutive
-        
-        # 分类
-        def classify_payment_pattern(row):
-            if row['连续未达标月数'] >= 6:
-                return '长期拖欠'
-            elif row['连续未达标月数'] >= 3:
-                return '中期拖欠'
-            elif row['连续未达标月数'] > 0:
-                return '短期拖欠'
-            else:
-                return '正常还款'
-        
-        self.data['还款模式'] = self.data.apply(classify_payment_pattern, axis=1)
-        payment_analysis['还款模式分布'] = self.data['还款模式'].value_counts(normalize=True) * 100
-        
-        # 历史还款与总欠款相关性
-        if '总欠款' in self.data.columns:
-            corr_data = self.data[[col for col in self.payment_history_cols if col in self.data.columns] + ['总欠款']]
-            payment_analysis['历史还款与总欠款相关性'] = corr_data.corr()['总欠款']
+        if self.sql is not None:
+            payment_analysis = self.sql.payment_history(self.payment_history_cols)
+            self.analysis_results['payment_history'] = payment_analysis
+            print("历史还款模式分析完成")
+            return payment_analysis
+
+        # 与 CollectionAnalyzer 共用 utils.compute 的实现
+        payment_analysis = compute.payment_history(self.data, self.payment_history_cols, self.derived)
+        self.data['连续未达标月数'] = self.derived['连续未达标月数']
+        self.data['还款模式'] = self.derived['还款模式']
         
         self.analysis_results['payment_history'] = payment_analysis
         print("历史还款模式分析完成")
@@ -88,28 +85,18 @@ class ThreeHandCollectionAnalyzer:
     
     def analyze_risk_factors(self):
         """分析风险因素"""
-        if self.data is None:
-            print("请先加载数据")
+        if not self._loaded():
             return
         
-        risk_analysis = {}
-        
+        if self.sql is not None:
+            risk_analysis = self.sql.risk_factors(self.payment_history_cols)
+            self.analysis_results['risk_factors'] = risk_analysis
+            print("风险因素分析完成")
+            return risk_analysis
+
+        risk_analysis = compute.risk_factors(self.data, self.payment_history_cols, self.derived)
         if 'risk_prob' in self.data.columns:
-            risk_analysis['risk_prob分布'] = self.data['risk_prob'].describe()
-            self.data['风险等级'] = pd.cut(
-                self.data['risk_prob'],
-                bins=[-0.01, 0.3, 0.7, 1.01],
-                labels=['低风险', '中风险', '高风险']
-            )
-            risk_analysis['风险等级分布'] = self.data['风险等级'].value_counts()
-        
-        if '逾期天数' in self.data.columns and 'risk_prob' in self.data.columns:
-            risk_analysis['逾期天数与风险相关性'] = self.data['逾期天数'].corr(self.data['risk_prob'])
-        
-        if '近两年内逾期次数' in self.data.columns:
-            risk_analysis['近两年内逾期次数分布'] = self.data['近两年内逾期次数'].value_counts()
-            if '总欠款' in self.data.columns:
-                risk_analysis['逾期次数与总欠款关系'] = self.data.groupby('近两年内逾期次数')['总欠款'].mean()
+            self.data['风险等级'] = self.derived['风险等级']
         
         self.analysis_results['risk_factors'] = risk_analysis
         print("风险因素分析完成")
@@ -117,34 +104,25 @@ class ThreeHandCollectionAnalyzer:
     
     def analyze_debt_composition(self):
         """分析欠款构成"""
-        if self.data is None:
-            print("请先加载数据")
+        if not self._loaded():
             return
         
-        debt_components = [
-            '本金', '应收利息', '应收费用', '违约金', '滞纳金',
-            '取现手续费', '现金分期手续费', '账单分期手续费', '年费'
-        ]
-        debt_components = [col for col in debt_components if col in self.data.columns]
+        columns = self.sql.columns if self.sql is not None else self.data.columns
+        debt_components = [col for col in DEBT_COMPONENTS if col in columns]
         
         if not debt_components:
             print("未找到欠款构成相关列")
             return
         
-        debt_analysis = {}
-        debt_analysis['总体欠款构成(总额)'] = self.data[debt_components].sum()
-        debt_analysis['总体欠款构成(占比)'] = (
-            debt_analysis['总体欠款构成(总额)'] /
-            debt_analysis['总体欠款构成(总额)'].sum() * 100
-        )
-        
+        if self.sql is not None:
+            debt_analysis = self.sql.debt_composition(debt_components)
+            self.analysis_results['debt_composition'] = debt_analysis
+            print("欠款构成分析完成")
+            return debt_analysis
+
+        debt_analysis = compute.debt_composition(self.data, debt_components, self.derived)
         if '逾期天数' in self.data.columns:
-            self.data['逾期天数分组'] = pd.cut(
-                self.data['逾期天数'],
-                bins=[-1, 30, 90, 180, 360, float('inf')],
-                labels=['30天内', '31-90天', '91-180天', '181-360天', '360天以上']
-            )
-            debt_analysis['按逾期天数分组的欠款构成'] = self.data.groupby('逾期天数分组')[debt_components].sum()
+            self.data['逾期天数分组'] = self.derived['逾期天数分组']
         
         self.analysis_results['debt_composition'] = debt_analysis
         print("欠款构成分析完成")
@@ -191,8 +169,9 @@ class ThreeHandCollectionAnalyzerInteractive(ThreeHandCollectionAnalyzer):
                 plt.show()
             
             elif choice == "2":
-                if 'risk_prob' in self.data.columns and '还款模式' in self.data.columns:
-                    risk_payment = pd.crosstab(self.data['风险等级'], self.data['还款模式'], normalize='index') * 100
+                # pandas / DuckDB 两种后端都在 risk_factors 中给出交叉表
+                risk_payment = self.analysis_results.get('risk_factors', {}).get('风险等级与还款模式')
+                if risk_payment is not None:
                     risk_payment = risk_payment.loc[:, risk_payment.mean().sort_values(ascending=False).index]
                     risk_payment.plot(kind='bar', stacked=True, colormap='viridis', figsize=(12, 7))
                     plt.title('不同风险等级的还款模式分布(%)', fontsize=16)
@@ -210,8 +189,18 @@ class ThreeHandCollectionAnalyzerInteractive(ThreeHandCollectionAnalyzer):
                 plt.show()
             
             elif choice == "4":
+                if self.sql is not None:
+                    # 聚合模式下不加载明细，抽样画散点
+                    try:
+                        scatter_data = self.sql.sample(['逾期天数', 'risk_prob'])
+                    except ValueError as e:
+                        print(f"无法绘制：{e}")
+                        continue
+                    scatter_data['风险等级'] = compute.risk_level(scatter_data)
+                else:
+                    scatter_data = self.data
                 plt.figure(figsize=(12, 7))
-                sns.scatterplot(x='逾期天数', y='risk_prob', hue='风险等级', data=self.data,
+                sns.scatterplot(x='逾期天数', y='risk_prob', hue='风险等级', data=scatter_data,
                                 alpha=0.6, s=100)
                 plt.title('逾期天数与风险概率关系', fontsize=16)
                 plt.show()
@@ -231,6 +220,7 @@ def main():
     root_dir = r'D:\project\collection\data\qd'
     file_path = os.path.join(root_dir, "2406三手.xlsx")
     
+    # 数据量超出内存时改用 backend="duckdb"（只做聚合分析）
     analyzer = ThreeHandCollectionAnalyzerInteractive(file_path)
     analyzer.load_data()
     analyzer.analyze_payment_history()
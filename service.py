@@ -0,0 +1,204 @@
+# 无界面 HTTP 服务：供外呼系统等按接口获取排名与统计（JSON）
+# 启动：uvicorn service:app --host 0.0.0.0 --port 8000
+#   PROFILE_SERVICE_WORKERS    评分进程数（默认 2）
+#   PROFILE_SERVICE_CACHE      结果缓存条数（默认 64）
+#   PROFILE_SERVICE_DATA_DIRS  允许按路径读取的目录（多个用系统路径分隔符分隔），未配置时禁用路径接口
+import asyncio
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from pydantic import BaseModel
+
+from utils.file_loader import detect_file_type
+from utils.scoring import RULES_VERSION
+
+SERVICE_WORKERS = int(os.environ.get("PROFILE_SERVICE_WORKERS", 2))
+CACHE_SIZE = int(os.environ.get("PROFILE_SERVICE_CACHE", 64))
+DATA_DIRS = [os.path.realpath(p) for p in os.environ.get("PROFILE_SERVICE_DATA_DIRS", "").split(os.pathsep) if p]
+# 输入文件本身的问题（格式错误、无法解析、列不合规等）返回 422；其他异常（进程池故障、内存不足、程序错误）为 500
+INPUT_ERRORS = (ValueError, zipfile.BadZipFile)
+
+
+def _series(s) -> dict:
+    """pandas Series -> JSON 可序列化的 dict（NaN 转为 null）"""
+    return {str(k): (None if math.isnan(float(v)) else float(v)) for k, v in s.items()}
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _in_data_dirs(path: str) -> bool:
+    """path 是否位于允许读取的目录下（不同盘符时 commonpath 报 ValueError，视为不在目录中）"""
+    for d in DATA_DIRS:
+        try:
+            if os.path.commonpath([path, d]) == d:
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def _check_weights(weights) -> dict:
+    """规则权重校验：需为 {规则名: 有限数值}，否则 422"""
+    if weights is None:
+        return {}
+    if not isinstance(weights, dict):
+        raise HTTPException(422, "weights 需为 JSON 对象，如 {\"逾期得分\": 2}")
+    checked = {}
+    for k, v in weights.items():
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not math.isfinite(v):
+            raise HTTPException(422, f"weights 中 {k} 的权重需为有限数值")
+        checked[str(k)] = float(v)
+    return checked
+
+
+def score_request(data: bytes, file_name: str, as_of: str, top_k: int, weights: dict = None) -> dict:
+    """
+    评分 + 统计（在进程池中执行）
+    :return: meta 快照元数据, top_k Top K 记录（含评分依据）, stats 聚合统计, quality 数据质量报告
+    """
+    from utils.file_loader import load_file
+    from utils.scoring import EXPLAIN_COL, WeightedRanker, explain
+    from utils.sketch import PortfolioSketch
+    from utils.snapshot import score_with_snapshot
+
+    df, file_type, quality = load_file(io.BytesIO(data), file_name=file_name, quality=True)
+    scored, meta = score_with_snapshot(df, file_type, as_of=date.fromisoformat(as_of))
+
+    if weights:
+        positions, weighted = WeightedRanker(scored).top_k(weights, top_k)
+        top = scored.iloc[positions].assign(加权总评分=weighted)
+    else:
+        top = scored.head(top_k)
+    top = top.assign(评分依据=explain(top)).drop(columns=EXPLAIN_COL, errors="ignore")
+
+    sketch = PortfolioSketch().update(scored)
+    stats = {
+        "rows": len(scored),
+        "总评分": _series(scored["总评分"].describe()),
+        "规则平均得分": _series(scored[[c for c in scored.columns if c.endswith("得分")]].mean()),
+        "年龄分布(%)": _series(sketch.age_distribution()),
+        "欠款比例分布(%)": _series(sketch.debt_ratio_distribution()),
+        "风险概率分位数": _series(sketch.risk_quantiles.quantiles()) if sketch.risk_quantiles.count else {},
+        "地区Top10": _series(sketch.region_top(10)),
+    }
+    return {
+        "meta": meta,
+        "top_k": json.loads(top.to_json(orient="records", force_ascii=False, date_format="iso")),
+        "stats": stats,
+        "quality": quality,
+    }
+
+
+class ResultCache:
+    """
+    按内容哈希缓存响应（LRU）；同一请求正在计算时，后到的请求等待同一个结果，不重复评分
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.results = OrderedDict()
+        self.pending = {}
+
+    async def get_or_compute(self, key: str, compute):
+        if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key], True
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key]), True
+
+        future = asyncio.ensure_future(compute())
+        self.pending[key] = future
+        try:
+            # 发起请求的客户端断开时不取消计算，其他等待者仍可拿到结果
+            result = await asyncio.shield(future)
+        finally:
+            self.pending.pop(key, None)
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+        return result, False
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # spawn 方式启动评分进程，避免继承服务进程的事件循环与线程状态
+    app.state.pool = ProcessPoolExecutor(max_workers=SERVICE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    app.state.cache = ResultCache()
+    yield
+    app.state.pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(title="催收客户画像评分服务", lifespan=lifespan)
+
+
+class ScoreByPath(BaseModel):
+    path: str
+    top_k: int = 20
+    as_of: date = None
+    weights: dict[str, float] = None
+
+
+async def _score(data: bytes, file_name: str, top_k: int, as_of: date, weights: dict) -> dict:
+    if not 1 <= top_k <= 10_000:
+        raise HTTPException(422, "top_k 需在 1-10000 之间")
+    as_of = (as_of or date.today()).isoformat()
+    weights = _check_weights(weights)
+    key = hashlib.sha256(data).hexdigest()
+    cache_key = json.dumps([key, detect_file_type(file_name), as_of, RULES_VERSION, top_k, weights], sort_keys=True)
+
+    loop = asyncio.get_running_loop()
+
+    async def compute():
+        return await loop.run_in_executor(app.state.pool, score_request, data, file_name, as_of, top_k, weights)
+
+    try:
+        result, cached = await app.state.cache.get_or_compute(cache_key, compute)
+    except INPUT_ERRORS as e:
+        raise HTTPException(422, f"文件处理失败: {type(e).__name__}: {e}")
+    return {"content_hash": key, "cached": cached, **result}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "rules_version": RULES_VERSION, "workers": SERVICE_WORKERS,
+            "cached": len(app.state.cache.results)}
+
+
+@app.post("/score")
+async def score_upload(
+    file: UploadFile = File(...),
+    top_k: int = Query(20),
+    as_of: date = Query(None),
+    weights: str = Query(None, description='规则权重 JSON，如 {"逾期得分": 2, "地区得分": 0}'),
+):
+    """上传 Excel，返回 Top K 排名与聚合统计"""
+    try:
+        weights = json.loads(weights) if weights else None
+    except ValueError:
+        raise HTTPException(422, "weights 不是合法的 JSON")
+    return await _score(await file.read(), file.filename or "", top_k, as_of, weights)
+
+
+@app.post("/score/path")
+async def score_path(req: ScoreByPath):
+    """按服务器路径评分（仅限 PROFILE_SERVICE_DATA_DIRS 下的文件）"""
+    path = os.path.realpath(req.path)
+    if not _in_data_dirs(path):
+        raise HTTPException(403, "该路径不在允许读取的目录中")
+    if not os.path.isfile(path):
+        raise HTTPException(404, "文件不存在")
+    data = await asyncio.to_thread(_read_bytes, path)
+    return await _score(data, os.path.basename(path), req.top_k, req.as_of, req.weights)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+桌面版启动入口：在本进程内启动 Streamlit 并打开浏览器。
+
+    python start.py                 # 源码运行
+    pyinstaller start.spec          # 打包为 onedir（dist/profile_analysis/）
+
+环境变量 PROFILE_PORT 指定端口（默认 8501）。
+打包后安装目录可能只读，任务队列 / 快照 / 组合库写入 %LOCALAPPDATA%\profile_analysis
+（非 Windows 为 ~/.profile_analysis），可用 PROFILE_DATA_DIR 覆盖，见 utils/paths.py。
+"""
+import multiprocessing
+import os
+import sys
+
+
+def base_dir() -> str:
+    """资源根目录：打包后为 PyInstaller 解包目录，源码运行时为项目根目录"""
+    return getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    # 打包后任务队列 / 评分进程池以 spawn 方式重新执行本程序，需先交给 multiprocessing 处理
+    multiprocessing.freeze_support()
+
+    root = base_dir()
+    os.chdir(root)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = [
+        "streamlit", "run", os.path.join(root, "app.py"),
+        "--global.developmentMode=false",
+        "--server.port", os.environ.get("PROFILE_PORT", "8501"),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()
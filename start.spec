@@ -1,38 +1,87 @@
-# -*- mode: python ; coding: utf-8 -*-
-
-
-a = Analysis(
-    ['start.py'],
-    pathex=[],
-    binaries=[],
-    datas=[],
-    hiddenimports=[],
-    hookspath=[],
-    hooksconfig={},
-    runtime_hooks=[],
-    excludes=[],
-    noarchive=False,
-    optimize=0,
-)
-pyz = PYZ(a.pure)
-
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='start',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+# -*- mode: python ; coding: utf-8 -*-
+# 桌面版打包（onedir）：pyinstaller start.spec，产物在 dist/profile_analysis/
+# onedir 不再每次启动解包到临时目录；参考数据预编译为 utils/reference_data.pkl 一并打包。
+import os
+import sys
+
+from PyInstaller.utils.hooks import collect_data_files, collect_submodules, copy_metadata
+
+ROOT = os.path.abspath(SPECPATH)
+sys.path.insert(0, ROOT)
+
+# 预编译参考数据（地区码表）
+from utils.reference_data import build_reference_blob
+build_reference_blob()
+
+datas = [
+    (os.path.join(ROOT, "app.py"), "."),  # Streamlit 按文件路径执行页面脚本
+    (os.path.join(ROOT, "utils", "id_card.csv"), "utils"),
+    (os.path.join(ROOT, "utils", "reference_data.pkl"), "utils"),
+]
+font_file = os.path.join(ROOT, "STHeiti Light.ttc")
+if os.path.exists(font_file):
+    datas.append((font_file, "."))
+datas += collect_data_files("streamlit") + copy_metadata("streamlit")
+
+# app.py 不经过静态分析，它用到的模块需显式列出
+hiddenimports = collect_submodules("utils") + [
+    "streamlit.web.cli",
+    "streamlit.runtime.scriptrunner.magic_funcs",
+    "pyarrow.parquet",
+    "openpyxl",
+    "seaborn",
+    "adjustText",
+]
+
+# 桌面版用不到的重型模块（命令行 DuckDB 后端、HTTP 服务、Notebook / GUI 工具链等）
+excludes = [
+    "tkinter", "PyQt5", "PyQt6", "PySide2", "PySide6",
+    "IPython", "ipykernel", "jupyter_client", "jupyter_core", "notebook", "nbformat",
+    "pytest", "sphinx", "docutils",
+    "duckdb", "fastapi", "uvicorn", "starlette", "multipart",
+    "torch", "tensorflow", "sklearn", "statsmodels",
+]
+
+
+a = Analysis(
+    ['start.py'],
+    pathex=[ROOT],
+    binaries=[],
+    datas=datas,
+    hiddenimports=hiddenimports,
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=excludes,
+    noarchive=False,
+    optimize=1,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='profile_analysis',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,  # UPX 压缩的 DLL 每次加载都要解压，拖慢启动
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='profile_analysis',
+)
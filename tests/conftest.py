@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.compute import PAYMENT_HISTORY_COLS
+from utils.reference_data import ID_CARD_FILE
+
+
+def make_frame(n: int = 2000, seed: int = 0) -> pd.DataFrame:
+    """构造一份列名已规范化的催收数据（证件号地区码取自 id_card.csv）"""
+    rng = np.random.default_rng(seed)
+    codes = pd.read_csv(ID_CARD_FILE, dtype=str)["number"]
+    codes = codes[~codes.str.endswith("00")].sample(200, random_state=seed).to_numpy()
+    regions = rng.choice(codes, n)
+    births = rng.integers(1955, 2004, n).astype(str)
+    ids = [f"{r}{y}0101{rng.integers(100, 999)}{rng.choice(list('0123456789X'))}" for r, y in zip(regions, births)]
+    df = pd.DataFrame({
+        "证件号": ids,
+        "客户姓名": [f"客户{i}" for i in range(n)],
+        "账单地址": rng.choice(["北京市东城区", "上海市", "广东省广州市", None], n),
+        "本金": rng.uniform(1000, 50000, n).round(2),
+        "当期账单金额": rng.uniform(1000, 120000, n).round(2),
+        "逾期期数": rng.choice(["M1", "M3", "M5", "M13", None], n),
+        "联系人关系1": rng.choice(["父亲", "朋友", "同事", None], n),
+        "联系人关系2": rng.choice(["母亲", "朋友", None], n),
+        "risk_prob": rng.uniform(0, 1, n),
+        "逾期天数": rng.integers(0, 800, n).astype(float),
+        "近两年内逾期次数": rng.integers(0, 8, n).astype(float),
+        "总欠款": rng.uniform(1000, 100000, n),
+        "应收利息": rng.uniform(0, 5000, n),
+        "滞纳金": rng.uniform(0, 500, n),
+        "年费": rng.choice([0.0, 100.0, np.nan], n),
+    })
+    for col in PAYMENT_HISTORY_COLS:
+        df[col] = rng.choice([0.0, 100.0, np.nan], n)
+    return df
+
+
+def assert_same(pandas_result, sql_result):
+    """两种实现的结果逐项比较（值、索引顺序；不比较 dtype / 名称）"""
+    if isinstance(pandas_result, dict):
+        assert set(pandas_result) == set(sql_result)
+        for key in pandas_result:
+            assert_same(pandas_result[key], sql_result[key])
+    elif isinstance(pandas_result, pd.DataFrame):
+        pd.testing.assert_frame_equal(pandas_result, sql_result, check_dtype=False, check_names=False,
+                                      check_index_type=False, check_column_type=False, check_categorical=False)
+    elif isinstance(pandas_result, pd.Series):
+        pd.testing.assert_series_equal(pandas_result, sql_result, check_dtype=False, check_names=False,
+                                       check_index_type=False, check_categorical=False)
+    else:
+        assert pandas_result == pytest.approx(sql_result)
+
+
+@pytest.fixture(scope="session")
+def frame() -> pd.DataFrame:
+    return make_frame()
@@ -0,0 +1,56 @@
+import matplotlib
+import pandas as pd
+import pytest
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from profile_analysis import ThreeHandCollectionAnalyzer  # noqa: E402
+from tests.conftest import assert_same, make_frame  # noqa: E402
+from utils.analyzer import CollectionAnalyzer  # noqa: E402
+from utils.schema import normalize_columns  # noqa: E402
+
+ANALYSES = ["analyze_payment_history", "analyze_risk_factors", "analyze_debt_composition"]
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """三种实现读取同一个 Excel 文件"""
+    path = tmp_path_factory.mktemp("compute") / "2406三手.xlsx"
+    make_frame(500, seed=1).to_excel(path, index=False)
+    return str(path)
+
+
+def run_three_hand(source, backend):
+    analyzer = ThreeHandCollectionAnalyzer(source, backend=backend)
+    assert analyzer.load_data() is not None
+    return [getattr(analyzer, name)() for name in ANALYSES]
+
+
+@pytest.fixture(scope="module")
+def pandas_results(source):
+    return run_three_hand(source, "pandas")
+
+
+def test_collection_analyzer_matches_three_hand(source, pandas_results):
+    """Streamlit 页面（CollectionAnalyzer）与命令行分析器展示的统计一致"""
+    payment, risk, debt = pandas_results
+    analyzer = CollectionAnalyzer(normalize_columns(pd.read_excel(source)))
+    for name in ANALYSES:
+        plt.close(getattr(analyzer, name)())
+    results = analyzer.analysis_results
+    assert_same(payment["还款模式分布"], results["还款模式分布"])
+    assert_same(risk["风险等级与还款模式"], results["风险等级分布"])
+    assert_same(debt["总体欠款构成(占比)"].sort_values(ascending=False), results["总体欠款构成(占比)"])
+
+
+def test_duckdb_backend_matches_pandas(source, pandas_results, tmp_path, monkeypatch):
+    """命令行分析器 DuckDB 后端与 pandas 后端结果逐项一致"""
+    pytest.importorskip("duckdb")
+    from utils.sql_backend import DuckDBAggregator
+
+    from_file = DuckDBAggregator.from_file.__func__
+    monkeypatch.setattr(DuckDBAggregator, "from_file",
+                        classmethod(lambda cls, path: from_file(cls, path, cache_dir=str(tmp_path / "cache"))))
+    for expected, actual in zip(pandas_results, run_three_hand(source, "duckdb")):
+        assert_same(expected, actual)
@@ -0,0 +1,84 @@
+import os
+import time
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from utils import exporter
+from utils.exporter import EXPORT_FORMATS, cleanup_exports, export_to_file
+
+
+@pytest.fixture(scope="module")
+def scored():
+    rng = np.random.default_rng(0)
+    n = 300
+    return pd.DataFrame({
+        "证件号": [f"44030019900101{i:04d}" for i in range(n)],
+        "总评分": rng.integers(0, 50, n),
+        "逾期得分": rng.integers(0, 10, n),
+        "风险等级": rng.choice(["低风险", "中风险", "高风险"], n),
+        "risk_prob": rng.uniform(0, 1, n),
+        "还款日": [None] * n,
+    })
+
+
+def read_back(path: str) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".csv"):
+        return pd.read_csv(path, dtype={"证件号": str}, encoding="utf-8-sig")
+    return pd.read_excel(path, dtype={"证件号": str})
+
+
+@pytest.mark.parametrize("fmt", list(EXPORT_FORMATS))
+def test_round_trip(scored, tmp_path, fmt):
+    path = export_to_file(scored, fmt, export_dir=str(tmp_path), prefix="s1")
+    assert os.path.basename(path).startswith("s1-") and path.endswith(EXPORT_FORMATS[fmt][0])
+    back = read_back(path)
+    # parquet 中评分 / 低基数列为 category，读回后按值比较
+    pd.testing.assert_frame_equal(back.drop(columns="还款日"), scored.drop(columns="还款日"),
+                                  check_dtype=False, check_categorical=False)
+    assert back["还款日"].isna().all()
+
+
+def test_unknown_format(scored, tmp_path):
+    with pytest.raises(ValueError):
+        export_to_file(scored, "json", export_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_xlsx_splits_sheets_in_write_only_mode(scored, tmp_path, monkeypatch):
+    """超过单表行数上限时续写到下一个工作表，且始终使用只写模式"""
+    modes = []
+    workbook = openpyxl.Workbook
+
+    def spy(*args, **kwargs):
+        modes.append(kwargs.get("write_only", False))
+        return workbook(*args, **kwargs)
+
+    monkeypatch.setattr(openpyxl, "Workbook", spy)
+    monkeypatch.setattr(exporter, "XLSX_MAX_ROWS", 120)
+    monkeypatch.setattr(exporter, "CHUNK_ROWS", 50)
+    path = export_to_file(scored, "Excel (xlsx)", export_dir=str(tmp_path))
+    monkeypatch.undo()
+    assert modes == [True]
+
+    sheets = pd.read_excel(path, sheet_name=None, dtype={"证件号": str})
+    assert list(sheets) == ["评分结果", "评分结果2", "评分结果3"]
+    assert [len(s) for s in sheets.values()] == [120, 120, 60]
+    combined = pd.concat(sheets.values(), ignore_index=True)
+    assert combined["证件号"].tolist() == scored["证件号"].tolist()
+
+
+def test_empty_xlsx_keeps_header(scored, tmp_path):
+    path = export_to_file(scored.head(0), "Excel (xlsx)", export_dir=str(tmp_path))
+    assert list(pd.read_excel(path).columns) == list(scored.columns)
+
+
+def test_cleanup_exports(scored, tmp_path):
+    old = export_to_file(scored, "CSV", export_dir=str(tmp_path))
+    os.utime(old, (time.time() - 10, time.time() - 10))
+    assert cleanup_exports(str(tmp_path), ttl=5) == 1
+    assert not os.path.exists(old)
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from utils.job_queue import HANDLERS, JobQueue, run_next
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """测试用任务类型：记录收到的 payload，payload 中 fail=True 时抛错"""
+    calls = []
+
+    def run(payload, report):
+        calls.append(dict(payload, input_exists=os.path.exists(payload.get("input_path", ""))))
+        report(0.5, "处理中")
+        if payload.get("fail"):
+            raise ValueError("坏数据")
+        return {"ok": True}
+
+    monkeypatch.setitem(HANDLERS, "echo", run)
+    return calls
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def upload(tmp_path, name="in.xlsx"):
+    path = tmp_path / "uploads" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"data")
+    return str(path)
+
+
+def age(queue, job_id, **columns):
+    """把任务的时间字段改到过去"""
+    sets = ", ".join(f"{col} = ?" for col in columns)
+    with sqlite3.connect(queue.db_path) as con:
+        con.execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*columns.values(), job_id))
+
+
+def test_submit_and_claim_in_order(queue, handler):
+    first = queue.submit("echo", {"n": 1}, owner="s1")
+    second = queue.submit("echo", {"n": 2}, owner="s1")
+    assert queue.get(first)["status"] == "queued"
+    assert queue.position(second) == 1
+
+    job = queue.claim(worker_pid=123)
+    assert job["id"] == first and job["payload"] == {"n": 1}
+    running = queue.get(first)
+    assert running["status"] == "running" and running["worker_pid"] == 123
+    assert queue.claim(worker_pid=123)["id"] == second
+    assert queue.claim(worker_pid=123) is None
+
+    with pytest.raises(ValueError):
+        queue.submit("unknown", {})
+
+
+def test_run_next_finishes_and_removes_upload(queue, handler, tmp_path):
+    ok = queue.submit("echo", {"input_path": upload(tmp_path, "a.xlsx")})
+    bad = queue.submit("echo", {"input_path": upload(tmp_path, "b.xlsx"), "fail": True})
+    assert run_next(queue) and run_next(queue) and not run_next(queue)
+
+    assert [c["input_exists"] for c in handler] == [True, True]
+    assert queue.get(ok)["status"] == "done" and queue.get(ok)["result"] == {"ok": True}
+    assert queue.get(bad)["status"] == "failed" and "坏数据" in queue.get(bad)["error"]
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_expired_lease_is_requeued_with_upload(queue, handler, tmp_path):
+    """worker 领取后退出（无心跳）：租约过期后重新排队，上传文件仍在，可再次执行"""
+    job_id = queue.submit("echo", {"input_path": upload(tmp_path)})
+    queue.claim(worker_pid=1)
+    assert queue.requeue_expired(lease_seconds=60) == 0
+
+    age(queue, job_id, heartbeat_at=time.time() - 120)
+    assert queue.requeue_expired(lease_seconds=60) == 1
+    assert queue.get(job_id)["status"] == "queued"
+
+    assert run_next(queue)
+    assert handler[0]["input_exists"]
+    assert queue.get(job_id)["status"] == "done"
+
+
+def test_secrets_stay_out_of_sqlite(tmp_path, handler):
+    secrets = {}
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), secrets=secrets, server_id="srv-1")
+    with pytest.raises(ValueError):
+        queue.submit("echo", {"api_key": "sk-leak"})
+    with pytest.raises(RuntimeError):
+        JobQueue(queue.db_path).submit("echo", {}, secrets={"api_key": "sk-secret"})
+
+    job_id = queue.submit("echo", {"n": 1}, secrets={"api_key": "sk-secret"})
+    # 其他服务进程领取不到带敏感信息的任务
+    assert JobQueue(queue.db_path, secrets={}, server_id="srv-2").claim(worker_pid=1) is None
+
+    assert run_next(queue)
+    assert handler[0]["api_key"] == "sk-secret"
+    assert job_id not in secrets
+    with sqlite3.connect(queue.db_path) as con:
+        con.execute("PRAGMA wal_checkpoint(FULL)")
+    for name in os.listdir(tmp_path):
+        with open(tmp_path / name, "rb") as f:
+            assert b"sk-secret" not in f.read()
+
+
+def test_secret_job_fails_when_secret_lost(tmp_path, handler):
+    """服务进程重启后内存中的 API Key 已丢失：任务直接失败，不会无 Key 执行"""
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), secrets={}, server_id="srv-1")
+    job_id = queue.submit("echo", {}, secrets={"api_key": "sk-secret"})
+    queue.secrets.clear()
+    assert run_next(queue)
+    assert queue.get(job_id)["status"] == "failed" and handler == []
+
+
+def test_cleanup_removes_expired_jobs_and_uploads(queue, handler, tmp_path):
+    old = queue.submit("echo", {})
+    recent = queue.submit("echo", {})
+    run_next(queue)
+    run_next(queue)
+    age(queue, old, finished_at=time.time() - 7200)
+
+    stale, fresh = upload(tmp_path, "old.xlsx"), upload(tmp_path, "new.xlsx")
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    assert queue.cleanup(ttl_seconds=3600, upload_dir=str(tmp_path / "uploads")) == 1
+    assert queue.get(old) is None and queue.get(recent) is not None
+    assert not os.path.exists(stale) and os.path.exists(fresh)
+
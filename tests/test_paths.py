@@ -0,0 +1,27 @@
+import os
+import sys
+
+from utils import paths
+
+
+def test_data_dir_env_override(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DATA_DIR", str(tmp_path))
+    assert paths.default_data_dir() == str(tmp_path)
+
+
+def test_frozen_build_uses_user_dir(tmp_path, monkeypatch):
+    """打包版不写安装目录"""
+    monkeypatch.delenv("PROFILE_DATA_DIR", raising=False)
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    assert paths.default_data_dir() == os.path.join(str(tmp_path), "profile_analysis")
+
+    monkeypatch.delenv("LOCALAPPDATA")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert paths.default_data_dir() == os.path.join(str(tmp_path), ".profile_analysis")
+
+
+def test_source_run_uses_project_root(monkeypatch):
+    monkeypatch.delenv("PROFILE_DATA_DIR", raising=False)
+    monkeypatch.delattr(sys, "frozen", raising=False)
+    assert paths.default_data_dir() == os.path.dirname(os.path.dirname(os.path.abspath(paths.__file__)))
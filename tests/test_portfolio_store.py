@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pyarrow.parquet as pq
+
+from utils.portfolio_store import PortfolioStore
+from utils.snapshot import score_with_snapshot
+
+
+def scored_run(frame, tmp_path, as_of=date(2024, 6, 30)):
+    return score_with_snapshot(frame.head(300), "三手", as_of=as_of, snapshot_dir=str(tmp_path / "snapshots"))
+
+
+def test_append_schema(frame, tmp_path):
+    scored, meta = scored_run(frame, tmp_path)
+    path = PortfolioStore(str(tmp_path / "store")).append(scored, "2406三手.xlsx", meta)
+    schema = pq.read_schema(path)
+    assert "证件号" not in schema.names
+    assert str(schema.field("评分依据码").type) == "int32"
+    stored = pq.read_table(path).to_pandas()
+    assert stored["评分依据码"].tolist() == scored["评分依据码"].tolist()
+
+
+def test_concurrent_appends(frame, tmp_path):
+    """同一次评分并发写入：各自使用唯一的临时文件，最终只有一个完整文件，不残留临时文件"""
+    store = PortfolioStore(str(tmp_path / "store"))
+    scored, meta = scored_run(frame, tmp_path)
+    with ThreadPoolExecutor(8) as pool:
+        paths = set(pool.map(lambda _: store.append(scored, "2406三手.xlsx", meta), range(16)))
+    assert len(paths) == 1
+    part_dir = tmp_path / "store" / "month=2024-06" / "手别=三手"
+    assert [p.name for p in part_dir.iterdir()] == [os.path.basename(paths.pop())]
+    assert len(store.read(["总评分"])) == len(scored)
+
+
+def test_reads_legacy_files(frame, tmp_path):
+    """旧版文件（含证件号、评分依据码为 float64）与新文件可一起读取"""
+    store = PortfolioStore(str(tmp_path / "store"))
+    scored, meta = scored_run(frame, tmp_path)
+    path = store.append(scored, "2406三手.xlsx", meta)
+    legacy = pq.read_table(path).to_pandas()
+    legacy["评分依据码"] = legacy["评分依据码"].astype("float64")
+    legacy["证件号"] = scored["证件号"].to_numpy()
+    legacy["run_id"] = "legacy"
+    legacy_dir = tmp_path / "store" / "month=2024-05" / "手别=三手"
+    legacy_dir.mkdir(parents=True)
+    legacy.to_parquet(legacy_dir / "run-legacy.parquet", index=False)
+
+    df = store.read(["总评分", "评分依据码"])
+    assert sorted(df["month"].unique()) == ["2024-05", "2024-06"]
+    assert len(df) == 2 * len(scored)
+
+
+def test_partitions_skip_stray_entries(frame, tmp_path):
+    """分区目录中的 .DS_Store、残留临时文件、无法识别的目录不影响分区列表"""
+    store = PortfolioStore(str(tmp_path / "store"))
+    scored, meta = scored_run(frame, tmp_path)
+    store.append(scored, "2406三手.xlsx", meta)
+    root = tmp_path / "store"
+    (root / ".DS_Store").write_bytes(b"")
+    (root / "month=2024-07").write_bytes(b"")
+    (root / "month=bad").mkdir()
+    month_dir = root / "month=2024-06"
+    (month_dir / ".DS_Store").write_bytes(b"")
+    (month_dir / "手别=三手.tmp").write_bytes(b"")
+    (month_dir / "手别=五手").mkdir()
+    (month_dir / "tmp").mkdir()
+    (month_dir / "手别=三手" / ".run-x.parquet.tmp").write_bytes(b"")
+    parts = store.partitions()
+    assert parts.to_dict("records") == [{"month": "2024-06", "手别": "三手", "runs": 1}]
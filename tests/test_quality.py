@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from utils.quality import ID_CHECK_CODES, ID_WEIGHTS, _id_checks, profile_quality, quality_issues
+
+
+def with_checksum(first17: str) -> str:
+    """按 GB 11643 计算校验位，拼成完整的 18 位证件号"""
+    digits = np.array([int(c) for c in first17], dtype=np.int64)
+    return first17 + chr(ID_CHECK_CODES[(digits @ ID_WEIGHTS) % 11])
+
+
+def counts(ids: list) -> dict:
+    return {c["检查项"]: c["问题行数"] for c in _id_checks(pd.Series(ids, dtype=object), len(ids))}
+
+
+def test_valid_ids_have_no_issues():
+    ids = [with_checksum("11010119900307123"), with_checksum("31010420000229456").lower(), " " + with_checksum("44010619851231789")]
+    assert all(n == 0 for n in counts(ids).values())
+
+
+def test_bad_checksum():
+    good = with_checksum("11010119900307123")
+    wrong = good[:17] + ("0" if good[17] != "0" else "1")
+    result = counts([good, wrong])
+    assert result["证件号校验位错误"] == 1
+    assert result["出生日期无效"] == result["地区码未收录"] == 0
+
+
+def test_invalid_birth_date():
+    # 2 月 30 日、13 月、非闰年 2 月 29 日
+    ids = [with_checksum("11010119900230123"), with_checksum("11010119901301123"), with_checksum("11010120010229123")]
+    result = counts(ids + [with_checksum("11010120000229123")])
+    assert result["出生日期无效"] == 3
+    assert result["证件号校验位错误"] == 0
+
+
+def test_unmapped_region_code():
+    result = counts([with_checksum("99999919900307123"), with_checksum("11010119900307123")])
+    assert result["地区码未收录"] == 1
+    assert result["证件号校验位错误"] == result["出生日期无效"] == 0
+
+
+def test_missing_and_malformed_ids_are_not_checked_further():
+    result = counts([None, "", "1101011990030712", "11010119900307123Y"])
+    assert result["证件号缺失"] == 2
+    assert result["证件号格式错误"] == 2
+    assert result["证件号校验位错误"] == result["出生日期无效"] == result["地区码未收录"] == 0
+
+
+def test_profile_quality_reports_skipped_rules(frame):
+    report = profile_quality(frame.drop(columns=["本金", "联系人关系1", "联系人关系2"]).head(50),
+                             {"coerce_failures": {"总欠款": 3}})
+    assert "本金" in report["missing_columns"] and "联系人关系" in report["missing_columns"]
+    assert {"欠款占比得分", "父母联系人得分"} <= set(report["skipped_rules"])
+    issues = quality_issues(report)
+    assert (issues["问题行数"] > 0).all()
+    assert "总欠款 无法转换" in set(issues["检查项"])
@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+from utils import qwen_client  # noqa: E402
+from utils.qwen_client import QwenClient, QwenError, SharedTokenBucket, TokenBucket  # noqa: E402
+
+
+class FakeQwenHandler(BaseHTTPRequestHandler):
+    """模拟 DashScope：每个请求延迟 latency 秒；每 throttle_every 个请求返回一次 429（带 Retry-After）"""
+    latency = 0.02
+    throttle_every = 3
+    lock = threading.Lock()
+    hits = []
+    bodies = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.lock:
+            self.hits.append((time.time(), self.headers["Authorization"]))
+            self.bodies.append(body)
+            n = len(self.hits)
+        time.sleep(self.latency)
+        if "/missing/" in self.path:
+            self._send(404, {"code": "NotFound", "message": "no such model"})
+        elif self.throttle_every and n % self.throttle_every == 0:
+            self._send(429, {"code": "Throttling", "message": "rate limited"}, {"Retry-After": "0.05"})
+        else:
+            self._send(200, {"output": {"text": f"ok {body['model']}"}, "usage": {"input_tokens": 10, "output_tokens": 5},
+                             "request_id": str(n)})
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture()
+def fake_qwen():
+    FakeQwenHandler.hits = []
+    FakeQwenHandler.bodies = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeQwenHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(base_url, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return QwenClient("test-key", base_url=base_url, **kwargs)
+
+
+def test_retries_throttled_requests(fake_qwen):
+    client = make_client(fake_qwen)
+    results = [client.generate("你好", session_id="s1", max_tokens=10) for _ in range(6)]
+    assert all(r["text"] == "ok qwen-plus" for r in results)
+    usage = client.usage_for("s1")
+    # 每 3 个请求有 1 个 429，被重试后成功
+    assert usage["throttled"] == usage["retries"] >= 2
+    assert usage["requests"] == 6 + usage["retries"]
+    assert usage["input_tokens"] == 60 and usage["output_tokens"] == 30
+    assert all(auth == "Bearer test-key" for _, auth in FakeQwenHandler.hits)
+
+
+def test_non_retryable_error_raises(fake_qwen):
+    client = make_client(fake_qwen + "/missing", max_retries=3)
+    with pytest.raises(QwenError) as err:
+        client.generate("x", session_id="s")
+    assert err.value.status == 404
+    assert client.usage_for("s") == {"requests": 1, "wait_ms": 0, "failures": 1}
+
+
+def test_retries_exhausted(fake_qwen):
+    FakeQwenHandler.throttle_every = 1
+    try:
+        client = make_client(fake_qwen, max_retries=2)
+        with pytest.raises(QwenError) as err:
+            client.generate("x", session_id="s")
+        assert err.value.status == 429
+        assert client.usage_for("s")["requests"] == 3
+    finally:
+        FakeQwenHandler.throttle_every = 3
+
+
+def test_shared_state_across_clients(fake_qwen, tmp_path):
+    """两个 worker（各自一个客户端实例）共用同一份额度，用量汇总"""
+    db = str(tmp_path / "state.sqlite3")
+    first, second = make_client(fake_qwen, state_db=db), make_client(fake_qwen, state_db=db)
+    first.generate("x", session_id="s", max_tokens=10)
+    second.generate("x", session_id="s", max_tokens=10)
+    assert first.usage_for("s")["input_tokens"] == second.usage_for("s")["input_tokens"] == 20
+    # 同一 Key 的桶在库中只有一份（按 Key 哈希命名）
+    assert first.request_bucket.name == second.request_bucket.name
+    assert "test-key" not in open(db, "rb").read().decode("utf-8", "ignore")
+
+
+def _drain_bucket(args):
+    db, n = args
+    bucket = SharedTokenBucket(db, "k:rpm", rate_per_minute=600, capacity=5)
+    for _ in range(n):
+        bucket.acquire(1)
+    return time.time()
+
+
+def test_shared_bucket_limits_across_processes(tmp_path):
+    """两个进程共用容量 5、每秒补充 10 个的桶：共 20 次请求至少要等 (20 - 5) / 10 = 1.5 秒"""
+    db = str(tmp_path / "state.sqlite3")
+    SharedTokenBucket(db, "k:rpm", rate_per_minute=600, capacity=5)
+    start = time.time()
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        finished = list(pool.map(_drain_bucket, [(db, 10), (db, 10)]))
+    assert max(finished) - start >= 1.4
+
+
+def test_local_bucket_waits_when_empty():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)
+    bucket.acquire(1)
+    start = time.monotonic()
+    assert bucket.acquire(1) > 0
+    assert time.monotonic() - start >= 0.08
+
+
+def test_generate_under_latency_respects_rpm(fake_qwen, tmp_path):
+    """并发调用时共享 RPM 生效：容量 2、每秒补充 10 个，8 次成功请求不会在 0.5 秒内完成"""
+    FakeQwenHandler.throttle_every = 0
+    try:
+        db = str(tmp_path / "state.sqlite3")
+        clients = [make_client(fake_qwen, state_db=db, rpm=600) for _ in range(2)]
+        for client in clients:
+            client.request_bucket.capacity = 2
+        start = time.time()
+        threads = [threading.Thread(target=clients[i % 2].generate, args=("x",), kwargs={"session_id": "s"})
+                   for i in range(8)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert time.time() - start >= 0.5
+        assert clients[0].usage_for("s")["requests"] == 8
+    finally:
+        FakeQwenHandler.throttle_every = 3
+
+
+def test_max_tokens_only_sent_when_requested(fake_qwen):
+    """默认不限制输出长度；预计输出 token 只用于限流预估"""
+    FakeQwenHandler.throttle_every = 0
+    try:
+        client = make_client(fake_qwen)
+        client.generate("你好", expected_output_tokens=5000)
+        client.generate("你好", max_tokens=10)
+    finally:
+        FakeQwenHandler.throttle_every = 3
+    assert "max_tokens" not in FakeQwenHandler.bodies[0]["parameters"]
+    assert FakeQwenHandler.bodies[1]["parameters"]["max_tokens"] == 10
+    assert QwenClient.estimate_tokens("你好", 5000) == 5002
+
+
+def test_client_cache_hashed_and_bounded(monkeypatch):
+    monkeypatch.setattr(qwen_client, "_clients", qwen_client.OrderedDict())
+    monkeypatch.setattr(qwen_client, "CLIENT_CACHE_SIZE", 2)
+    first = qwen_client.get_client("sk-a")
+    assert qwen_client.get_client("sk-a") is first
+    qwen_client.get_client("sk-b")
+    qwen_client.get_client("sk-c")
+    assert len(qwen_client._clients) == 2
+    assert not any(key.startswith("sk-") for key in qwen_client._clients)
+    assert qwen_client.get_client("sk-a") is not first
+
+
+def test_prompt_counts_profiles():
+    import pandas as pd
+
+    from utils.qwen_helper import build_prompt
+
+    assert "下面是7位客户的画像" in build_prompt(pd.DataFrame({"总评分": range(7)}))
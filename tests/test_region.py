@@ -0,0 +1,57 @@
+import pandas as pd
+
+from utils.reference_data import load_region_map
+from utils.region import RegionRollup
+
+ID_MAP = {
+    "440000": "广东省", "440100": "广东省-广州市", "440106": "广东省-广州市-天河区",
+    "440300": "广东省-深圳市", "440305": "广东省-深圳市-南山区",
+    # 行政区划调整后重新编号：同名地区两个编码
+    "440304": "广东省-深圳市-福田区", "440399": "广东省-深圳市-福田区",
+    "110000": "北京市", "110100": "北京市-市辖区", "110101": "北京市-市辖区-东城区",
+}
+
+
+def ids(*codes_with_counts):
+    return pd.Series([f"{code}19900101123X" for code, n in codes_with_counts for _ in range(n)])
+
+
+def rollup():
+    return RegionRollup(
+        pd.concat([ids(("440106", 3), ("440305", 5), ("440304", 2), ("440399", 2), ("110101", 4), ("500101", 1)),
+                   pd.Series([None, "abc", "0001011990"])], ignore_index=True),
+        id_map=ID_MAP,
+    )
+
+
+def test_counts_by_level():
+    r = rollup()
+    assert (r.total, r.unparsed) == (20, 3)
+    assert r.top("province", mapped_only=False).to_dict() == {"广东省": 12, "北京市": 4, "500000": 1}
+    assert r.top("province").to_dict() == {"广东省": 12, "北京市": 4}
+    assert r.top("city", n=2).to_dict() == {"广东省-深圳市": 9, "北京市-市辖区": 4}
+
+
+def test_top_merges_codes_with_same_name():
+    top = rollup().top("county")
+    assert top.to_dict() == {"广东省-深圳市-南山区": 5, "广东省-深圳市-福田区": 4,
+                             "北京市-市辖区-东城区": 4, "广东省-广州市-天河区": 3}
+    assert top.tolist() == [5, 4, 4, 3]
+    assert rollup().top("county", n=1, ascending=True).to_dict() == {"广东省-广州市-天河区": 3}
+
+
+def test_top_matches_value_counts(frame):
+    region_map = load_region_map()
+    names = frame["证件号"].str[:6].map(region_map).dropna()
+    expected = names.value_counts()
+    top = RegionRollup(frame["证件号"]).top("county", n=len(expected))
+    assert top.to_dict() == expected.to_dict()
+
+
+def test_children_drill_down():
+    r = rollup()
+    assert r.children("city", parent=440000).to_dict() == {440300: 9, 440100: 3}
+    assert r.children("county", parent=440300).to_dict() == {440305: 5, 440304: 2, 440399: 2}
+    assert r.children("county", parent=110100).to_dict() == {110101: 4}
+    # 不限定上级时包含码表未收录的地区
+    assert r.children("province").to_dict() == {440000: 12, 110000: 4, 500000: 1}
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from utils.run_diff import RunDiff
+
+
+def run(rows: dict) -> pd.DataFrame:
+    """证件号 -> (逾期得分, 地区得分)，按总评分降序排列（与 run_scoring 输出一致）"""
+    df = pd.DataFrame([(k, a, b) for k, (a, b) in rows.items()], columns=["证件号", "逾期得分", "地区得分"])
+    df["总评分"] = df["逾期得分"] + df["地区得分"]
+    return df.sort_values("总评分", ascending=False, kind="stable").reset_index(drop=True)
+
+
+@pytest.fixture
+def diff():
+    prev = run({"A": (10, 10), "B": (10, 8), "C": (5, 10), "D": (5, 5)})
+    curr = run({"A": (10, 5), "B": (10, 8), "C": (10, 10), "E": (8, 8)})
+    return RunDiff(prev, curr, top_k=2)
+
+
+def test_entered_and_left(diff):
+    entered = diff.entered()
+    assert entered["证件号"].tolist() == ["C"]
+    assert (entered["上期排名"].iloc[0], entered["本期排名"].iloc[0], entered["排名变化"].iloc[0]) == (3, 1, 2)
+    assert entered["主要原因"].tolist() == ["逾期上升"]
+
+    left = diff.left()
+    assert left["证件号"].tolist() == ["A"]
+    assert (left["上期排名"].iloc[0], left["本期排名"].iloc[0]) == (1, 4)
+    assert left["主要原因"].tolist() == ["地区下降"]
+
+    reasons = diff.table.set_index("证件号")["主要原因"]
+    assert reasons[["B", "D", "E"]].tolist() == ["得分未变（他人排名变化）", "本期移出", "本期新增"]
+
+
+def test_rule_contribution(diff):
+    contribution = diff.rule_contribution()
+    assert contribution.index.tolist() == ["逾期得分", "地区得分"]
+    assert contribution.to_dict("index") == {
+        "逾期得分": {"进入TopK": 5.0, "跌出TopK": 0.0, "全部共同客户": 5.0},
+        "地区得分": {"进入TopK": 0.0, "跌出TopK": -5.0, "全部共同客户": -5.0},
+    }
+    assert diff.summary() == {"共同客户": 3, "本期新增": 1, "本期移出": 1, "进入TopK": 1, "跌出TopK": 1,
+                              "名次上升": 1, "名次下降": 1, "总评分上升": 1, "总评分下降": 1}
+
+
+def test_duplicate_and_missing_keys():
+    """同一期重复主键保留名次最高的一条，空主键不参与关联"""
+    prev = run({"A": (10, 10), "B": (5, 5)})
+    prev = pd.concat([prev, pd.DataFrame({"证件号": ["A", None], "逾期得分": [0, 10], "地区得分": [0, 10],
+                                          "总评分": [0, 20]})], ignore_index=True)
+    curr = run({"A": (10, 10), "B": (5, 5)})
+    table = RunDiff(prev, curr, top_k=1).table.set_index("证件号")
+    assert table.index.tolist() == ["A", "B"]
+    assert table.loc["A", "总评分变化"] == 0 and table.loc["A", "上期排名"] == 1
+
+
+def test_empty_run_gives_empty_views():
+    curr = run({"A": (10, 10)})
+    diff = RunDiff(curr.iloc[:0], curr, top_k=1)
+    assert diff.table.empty and diff.entered().empty and diff.left().empty
+    assert (diff.rule_contribution() == 0).all().all()
+
+
+def test_missing_columns_rejected():
+    with pytest.raises(ValueError, match="上期"):
+        RunDiff(pd.DataFrame({"证件号": []}), run({"A": (1, 1)}))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from utils.schema import detect_schema, normalize_columns
+
+
+def test_detect_schema_aliases():
+    schema = detect_schema(("身份证号码", "客户名称", "欠款本金（元）", "本期账单金额", " 逾期 天 ", "末次取现日期", "备注"))
+    assert schema.rename == {"身份证号码": "证件号", "客户名称": "客户姓名", "本期账单金额": "当期账单金额",
+                             " 逾期 天 ": "逾期天数", "末次取现日期": "最后取现日期"}
+    assert schema.numeric == ("当期账单金额", "逾期天数")
+    assert schema.text == ("证件号", "客户姓名")
+    assert schema.datetime == ("最后取现日期",)
+    # 未登记的列按列名猜测类型
+    assert schema.guessed_numeric == ("欠款本金（元）",)
+    assert detect_schema(("身份证号码", "客户名称")) is detect_schema(("身份证号码", "客户名称"))
+
+
+def test_canonical_name_wins_over_alias():
+    """规范列名与变体同时出现时，变体保持原名"""
+    schema = detect_schema(("身份证号", "证件号", "欠款本金", "本金余额"))
+    assert schema.rename == {"欠款本金": "本金"}
+    assert schema.text == ("证件号",)
+    assert schema.numeric == ("本金",)
+
+
+def test_unconfirmed_aliases_are_not_renamed():
+    schema = detect_schema(("委案金额", "账龄", "逾期期数"))
+    assert schema.rename == {}
+    # 逾期期数已存在，不再提示账龄
+    assert schema.needs_confirmation == {"委案金额": "总欠款"}
+
+    report = {}
+    df = normalize_columns(pd.DataFrame({"委案金额": ["100"], "账龄": ["M1"]}), report=report)
+    assert list(df.columns) == ["委案金额", "账龄"]
+    assert report["needs_confirmation"] == {"委案金额": "总欠款", "账龄": "逾期期数"}
+
+
+def test_normalize_columns_types_and_failures():
+    report = {}
+    df = normalize_columns(pd.DataFrame({
+        "身份证号": [1.101011990030712e17, np.nan, 1.2e17],
+        "欠款本金": ["1,000", "2000", None],
+        "最近取现日期": ["2024-01-05", "不详", None],
+    }), report=report)
+    assert list(df.columns) == ["证件号", "本金", "最后取现日期"]
+    assert df["证件号"].tolist() == ["110101199003071200", None, "120000000000000000"]
+    assert df["本金"].isna().tolist() == [True, False, True]
+    assert pd.api.types.is_datetime64_any_dtype(df["最后取现日期"])
+    assert report["coerce_failures"] == {"本金": 1, "最后取现日期": 1}
+
+
+def test_guessed_numeric_threshold():
+    """按列名猜测的数值列：至少 90% 的非空值可解析才转换，否则保留原文本"""
+    parsed = [str(i) for i in range(9)] + ["未知"]
+    mostly_text = [str(i) for i in range(8)] + ["未知", "不详"]
+    report = {}
+    df = normalize_columns(pd.DataFrame({"其他费": parsed, "分期金额": mostly_text}), report=report)
+    assert pd.api.types.is_numeric_dtype(df["其他费"])
+    assert df["其他费"].isna().sum() == 1
+    assert df["分期金额"].tolist() == mostly_text
+    assert report["coerce_failures"] == {"其他费": 1}
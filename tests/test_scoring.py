@@ -0,0 +1,66 @@
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.scoring import (EXPLAIN_BITS, EXPLAIN_COL, RULE_INDEX, SCORE_RULES, CollectionScorer, WeightedRanker,
+                           explain, explain_code)
+
+
+def test_weighted_ranker_fills_missing_scores():
+    df = pd.DataFrame({"逾期得分": [1, np.nan, 3], "地区得分": [2, 2, None]})
+    ranker = WeightedRanker(df)
+    np.testing.assert_array_equal(ranker.scores(), [3, 2, 3])
+    order, _ = ranker.top_k(k=3)
+    assert order.tolist() == [0, 2, 1]
+
+
+@pytest.mark.parametrize("value", [128, -129, 1.5])
+def test_weighted_ranker_rejects_out_of_range_scores(value):
+    df = pd.DataFrame({"逾期得分": [1, 2], "信用得分": [10, value]})
+    with pytest.raises(ValueError, match="信用得分"):
+        WeightedRanker(df)
+
+
+# 各规则分档 -> 得分列
+RULE_SCORE_COLUMNS = {"地区一致性": "地区一致性得分", "欠款占比": "欠款占比得分", "城市": "地区得分",
+                      "逾期期数": "逾期得分", "年龄": "年龄得分", "父母联系人": "父母联系人得分"}
+
+
+def pack(bands: dict) -> int:
+    return sum(band << (EXPLAIN_BITS * RULE_INDEX[rule]) for rule, band in bands.items())
+
+
+@pytest.mark.parametrize("bands", [
+    {"地区一致性": 1, "欠款占比": 2, "城市": 3, "逾期期数": 4, "年龄": 5, "父母联系人": 1},
+    {"城市": 5, "年龄": 2},
+    {"父母联系人": 2},
+])
+def test_explain_code_round_trip(bands):
+    expected = [SCORE_RULES[RULE_INDEX[rule]][1][band] for rule, band in sorted(bands.items(), key=lambda x: RULE_INDEX[x[0]])]
+    assert explain_code(pack(bands)).split("；") == expected
+
+
+def test_explain_code_edge_cases():
+    assert explain_code(0) == explain_code(np.nan) == explain_code(pd.NA) == ""
+    assert explain_code(pack({"逾期期数": 7})) == "未知分档7"
+
+
+def test_explain_matches_scores(frame):
+    """评分依据中每条规则的分值与对应得分列一致；缺列的规则不出现在评分依据中"""
+    df = frame.head(500).drop(columns=["逾期期数"])
+    df.loc[:9, "证件号"] = None
+    scored = CollectionScorer(df, "在案", as_of=date(2024, 6, 30)).run_scoring()
+    texts = explain(scored)
+    assert texts.name == "评分依据" and texts.index.equals(scored.index)
+    for (_, row), text in zip(scored.iterrows(), texts):
+        parts = text.split("；")
+        assert len(parts) == len(RULE_SCORE_COLUMNS) - 1 and not any("逾期" in p for p in parts)
+        for rule, bands in SCORE_RULES:
+            if rule == "逾期期数":
+                continue
+            part = next(p for p in parts if p in bands.values())
+            assert int(re.search(r"\+(\d+)\)", part).group(1)) == row[RULE_SCORE_COLUMNS[rule]]
+    assert (explain(scored.drop(columns=[EXPLAIN_COL])) == "").all()
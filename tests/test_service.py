@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import service
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(service, "DATA_DIRS", [str(tmp_path)])
+    # 只测请求校验，不启动评分进程池
+    return TestClient(service.app)
+
+
+@pytest.mark.parametrize("weights", ["[1]", '{"逾期得分": "abc"}', '{"逾期得分": NaN}', '"x"'])
+def test_upload_rejects_invalid_weights(client, weights):
+    resp = client.post("/score", params={"weights": weights}, files={"file": ("a.xlsx", b"")})
+    assert resp.status_code == 422
+
+
+@pytest.mark.parametrize("weights", [[1], {"逾期得分": "abc"}])
+def test_path_rejects_invalid_weights(client, tmp_path, weights):
+    path = tmp_path / "a.xlsx"
+    path.write_bytes(b"")
+    resp = client.post("/score/path", json={"path": str(path), "weights": weights})
+    assert resp.status_code == 422
+
+
+def test_path_outside_data_dirs(client, tmp_path, monkeypatch):
+    assert client.post("/score/path", json={"path": str(tmp_path.parent / "b.xlsx")}).status_code == 403
+    # 不同盘符（Windows）时 commonpath 报 ValueError，同样拒绝
+    def commonpath(paths):
+        raise ValueError("Paths don't have the same drive")
+
+    monkeypatch.setattr(service.os.path, "commonpath", commonpath)
+    assert client.post("/score/path", json={"path": str(tmp_path / "a.xlsx")}).status_code == 403
+
+
+@pytest.fixture(scope="module")
+def upload(tmp_path_factory):
+    from tests.conftest import make_frame
+
+    path = tmp_path_factory.mktemp("service") / "2406三手.xlsx"
+    make_frame(300, seed=2).to_excel(path, index=False)
+    return path
+
+
+@pytest.fixture(scope="module")
+def expected(upload):
+    """直接调用评分器得到的排名（服务结果应与之一致）"""
+    from datetime import date
+
+    import pandas as pd
+
+    from utils.schema import normalize_columns
+    from utils.scoring import CollectionScorer, WeightedRanker
+
+    df = normalize_columns(pd.read_excel(upload, dtype={"证件号": str}))
+    scored = CollectionScorer(df, "在案", as_of=date(2024, 6, 30)).run_scoring()
+    positions, _ = WeightedRanker(scored).top_k({"地区得分": 0}, 10)
+    return {"default": scored["证件号"].head(10).tolist(), "weighted": scored["证件号"].iloc[positions].tolist()}
+
+
+@pytest.fixture(scope="module")
+def live_client(upload, tmp_path_factory):
+    """启动真实的评分进程池（数据目录指向临时目录，不写项目目录）"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("PROFILE_DATA_DIR", str(tmp_path_factory.mktemp("data")))
+        mp.setattr(service, "SERVICE_WORKERS", 1)
+        mp.setattr(service, "DATA_DIRS", [str(upload.parent)])
+        with TestClient(service.app) as client:
+            yield client
+
+
+def test_score_upload_ranking_and_cache(live_client, upload, expected):
+    params = {"top_k": 10, "as_of": "2024-06-30"}
+    first = live_client.post("/score", params=params, files={"file": (upload.name, upload.read_bytes())})
+    assert first.status_code == 200
+    body = first.json()
+    assert not body["cached"] and body["stats"]["rows"] == 300
+    assert [r["证件号"] for r in body["top_k"]] == expected["default"]
+    assert all(r["评分依据"] for r in body["top_k"])
+
+    again = live_client.post("/score", params=params, files={"file": ("copy.xlsx", upload.read_bytes())})
+    assert again.json()["cached"] and again.json()["top_k"] == body["top_k"]
+
+
+def test_score_path_with_weights(live_client, upload, expected):
+    req = {"path": str(upload), "top_k": 10, "as_of": "2024-06-30", "weights": {"地区得分": 0}}
+    first = live_client.post("/score/path", json=req).json()
+    assert [r["证件号"] for r in first["top_k"]] == expected["weighted"]
+    assert "加权总评分" in first["top_k"][0]
+    assert live_client.post("/score/path", json=req).json()["cached"]
+
+
+def test_input_errors_are_422_and_bugs_are_500(live_client, monkeypatch):
+    resp = live_client.post("/score", files={"file": ("bad.xlsx", b"not an excel file")})
+    assert resp.status_code == 422 and "文件处理失败" in resp.json()["detail"]
+
+    async def broken(key, compute):
+        raise RuntimeError("scorer bug")
+
+    monkeypatch.setattr(service.app.state.cache, "get_or_compute", broken)
+    client = TestClient(service.app, raise_server_exceptions=False)
+    assert client.post("/score", files={"file": ("a.xlsx", b"x")}).status_code == 500
@@ -0,0 +1,98 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.session_store import SessionStore, frame_nbytes
+
+
+def make_df(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"证件号": [f"{i:018d}" for i in range(rows)], "总评分": rng.integers(0, 50, rows)})
+
+
+@pytest.fixture
+def small():
+    return make_df(1000)
+
+
+def make_store(tmp_path, small, **kwargs):
+    kwargs.setdefault("session_budget", int(frame_nbytes(small) * 1.5))
+    return SessionStore(spill_dir=str(tmp_path / "spill"), **kwargs)
+
+
+def test_spill_and_reload(tmp_path, small):
+    store = make_store(tmp_path, small)
+    other = make_df(1000, seed=1)
+    store.put("s1", "a", small)
+    store.put("s1", "b", other)
+    usage = store.usage()["s1"]
+    # 超出会话预算：最久未用的 a 溢写到磁盘，当前数据 b 留在内存
+    assert usage["memory"] == frame_nbytes(other) and usage["spilled"] > 0
+
+    pd.testing.assert_frame_equal(store.get("s1", "a"), small)
+    assert store.usage()["s1"]["memory"] == frame_nbytes(small)
+    pd.testing.assert_frame_equal(store.get("s1", "b"), other)
+
+
+def test_oversized_active_frame_spills(tmp_path, small):
+    """会话只有一个数据、且超出预算时，该数据本身也溢写"""
+    store = make_store(tmp_path, small)
+    big = make_df(5000)
+    store.put("s1", "scored", big)
+    assert store.usage()["s1"]["memory"] == 0
+    for _ in range(2):
+        pd.testing.assert_frame_equal(store.get("s1", "scored"), big)
+        assert store.usage()["s1"]["memory"] == 0
+    store.drop("s1", "scored")
+    assert store.get("s1", "scored") is None
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_total_budget_spills_least_recent_session(tmp_path, small):
+    store = make_store(tmp_path, small, total_budget=int(frame_nbytes(small) * 1.5))
+    store.put("old", "scored", small)
+    store.put("new", "scored", make_df(1000, seed=1))
+    usage = store.usage()
+    assert usage["old"]["memory"] == 0 and usage["old"]["spilled"] > 0
+    assert usage["new"]["memory"] > 0
+    pd.testing.assert_frame_equal(store.get("old", "scored"), small)
+
+
+def test_idle_session_spills(tmp_path, small):
+    store = make_store(tmp_path, small, idle_seconds=60)
+    store.put("idle", "scored", small)
+    store._sessions["idle"]["last_access"] = time.time() - 120
+    store.put("active", "scored", small)
+    assert store.usage()["idle"]["memory"] == 0
+
+
+def test_expire_drops_session_and_files(tmp_path, small):
+    store = make_store(tmp_path, small, expire_seconds=60)
+    store.put("s1", "a", small)
+    store.put("s1", "b", make_df(1000, seed=1))
+    store._sessions["s1"]["last_access"] = time.time() - 120
+    assert store.expire() == ["s1"]
+    assert "s1" not in store.usage()
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_cleanup_stale_spill_files(tmp_path, small):
+    spill = tmp_path / "spill"
+    spill.mkdir()
+    stale, fresh = spill / "old.pkl", spill / "new.pkl"
+    small.to_pickle(stale)
+    small.to_pickle(fresh)
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    make_store(tmp_path, small, expire_seconds=3600)
+    assert sorted(os.listdir(spill)) == ["new.pkl"]
+
+
+def test_missing_spill_file(tmp_path, small):
+    store = make_store(tmp_path, small)
+    store.put("s1", "scored", make_df(5000))
+    for name in os.listdir(tmp_path / "spill"):
+        os.remove(tmp_path / "spill" / name)
+    assert store.get("s1", "scored") is None
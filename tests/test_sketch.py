@@ -0,0 +1,133 @@
+from datetime import date
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+from utils.analyzer import CollectionAnalyzer  # noqa: E402
+from utils.scoring import CollectionScorer  # noqa: E402
+from utils.sketch import (  # noqa: E402
+    RISK_PROB_EDGES, FixedHistogram, HeavyHitters, PortfolioSketch, QuantileSketch,
+)
+
+
+def chunks(values, n=7):
+    return np.array_split(np.asarray(values), n)
+
+
+@pytest.fixture(scope="module")
+def scored(frame):
+    return CollectionScorer(frame, "在案", as_of=date(2024, 6, 30)).run_scoring()
+
+
+@pytest.fixture(scope="module")
+def values():
+    rng = np.random.default_rng(0)
+    return np.concatenate([rng.lognormal(3, 1.5, 5000), -rng.lognormal(1, 1, 500), np.zeros(50), [np.nan] * 20])
+
+
+def merged(cls, values, *args):
+    out = cls(*args)
+    for part in chunks(values):
+        out.merge(cls(*args).update(part))
+    return out
+
+
+def test_histogram_merge_equals_single_pass(values):
+    single = FixedHistogram([0, 1, 10, 100], right=True).update(values)
+    combined = merged(FixedHistogram, values, [0, 1, 10, 100], True)
+    assert combined.counts.tolist() == single.counts.tolist()
+    assert (combined.missing, combined.on_edge) == (single.missing, single.on_edge) == (20, 50)
+    with pytest.raises(ValueError):
+        single.merge(FixedHistogram([0, 1]))
+
+
+def test_quantile_merge_equals_single_pass(values):
+    single = QuantileSketch(0.01).update(values)
+    combined = merged(QuantileSketch, values, 0.01)
+    assert (combined.positive, combined.negative, combined.zero, combined.count) == \
+           (single.positive, single.negative, single.zero, single.count)
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(values, accuracy):
+    sketch = QuantileSketch(accuracy).update(values)
+    finite = values[np.isfinite(values)]
+    for q in [0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 1]:
+        # 草图返回排名 floor(q * (n - 1)) 处的值，对应 np.quantile 的 lower 口径
+        exact = np.quantile(finite, q, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= accuracy * abs(exact) + 1e-12
+
+
+def test_heavy_hitters_error_bound():
+    rng = np.random.default_rng(1)
+    items = rng.zipf(1.3, 20000) % 5000
+    truth = pd.Series(items).value_counts()
+    capacity = 50
+    single = HeavyHitters(capacity).update(items)
+    # Misra-Gries 合并结果与单次统计不一定相同，但误差界相同
+    for sketch in (single, merged(HeavyHitters, items, capacity)):
+        assert sketch.total == len(items) and len(sketch.counters) <= capacity
+        bound = sketch.total / (capacity + 1)
+        estimates = pd.Series(sketch.counters).reindex(truth.index, fill_value=0)
+        assert (estimates <= truth).all()
+        assert (truth - estimates).max() <= bound
+
+
+def test_risk_histogram_matches_numpy():
+    """1.0 计入最后一箱，超出 [0, 1] 的值不计入"""
+    risk = np.array([0.0, 0.02, 0.05, 0.5, 0.97, 1.0, 1.0, 1.2, 3.0, -0.1, np.nan])
+    sketch = PortfolioSketch().update(pd.DataFrame({"risk_prob": risk}))
+    expected, _ = np.histogram(risk[~np.isnan(risk)], bins=RISK_PROB_EDGES)
+    assert sketch.risk_histogram().tolist() == expected.tolist()
+    assert sketch.risk_histogram().iloc[-1] == 3
+
+
+def test_distributions_match_collection_analyzer(scored):
+    sketch = PortfolioSketch()
+    for part in np.array_split(np.arange(len(scored)), 5):
+        sketch.merge(PortfolioSketch().update(scored.iloc[part]))
+    assert sketch.rows == len(scored)
+
+    analyzer = CollectionAnalyzer(scored)
+    plt.close(analyzer.analyze_age_distribution())
+    plt.close(analyzer.analyze_debt_ratio())
+    results = analyzer.analysis_results
+    pd.testing.assert_series_equal(sketch.age_distribution(), results["年龄分布"],
+                                   check_names=False, check_index_type=False, check_categorical=False)
+    debt = sketch.debt_ratio_distribution()
+    pd.testing.assert_series_equal(debt.sort_index(), results["欠款比例分布"].sort_index(), check_names=False)
+
+
+def test_sketch_debt_ratio_all_missing():
+    """欠款比例全部无效时与明细模式一致：100%「无效数据」"""
+    df = pd.DataFrame({"本金": [np.nan, np.nan], "当期账单金额": [100.0, np.nan]})
+    sketch_analyzer = CollectionAnalyzer.from_sketch(PortfolioSketch().update(df))
+    fig = sketch_analyzer.analyze_debt_ratio()
+    assert fig is not None
+    plt.close(fig)
+    assert sketch_analyzer.analysis_results["欠款比例分布"].to_dict() == {"无效数据": 100.0}
+
+    analyzer = CollectionAnalyzer(df)
+    plt.close(analyzer.analyze_debt_ratio())
+    assert analyzer.analysis_results["欠款比例分布"].to_dict() == {"无效数据": 100.0}
+
+
+def test_sketch_job(scored, tmp_path, monkeypatch):
+    from utils import job_queue
+
+    monkeypatch.setattr(job_queue, "SKETCH_DIR", str(tmp_path / "sketches"))
+    paths = []
+    for i, part in enumerate(np.array_split(np.arange(len(scored)), 2)):
+        path = tmp_path / f"part{i}.csv"
+        scored.iloc[part].to_csv(path, index=False)
+        paths.append(str(path))
+    progress = []
+    result = job_queue.run_sketch_job({"input_paths": paths, "file_names": ["2406三手.csv", "2406前催.csv"],
+                                       "as_of": "2024-06-30"}, lambda p, m=None: progress.append(p))
+    assert result["rows"] == len(scored) and progress == [0.0, 0.5]
+    assert PortfolioSketch.load(result["sketch_path"]).rows == len(scored)
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils import compute
+from utils.compute import DEBT_COMPONENTS, PAYMENT_HISTORY_COLS
+from tests.conftest import assert_same
+
+duckdb = pytest.importorskip("duckdb")
+from utils.sql_backend import (  # noqa: E402
+    DuckDBAggregator, _overdue_group_sql, _payment_pattern_sql, _risk_level_sql,
+)
+
+
+@pytest.fixture(scope="module")
+def aggregator(frame, tmp_path_factory):
+    path = tmp_path_factory.mktemp("duckdb") / "data.parquet"
+    frame.to_parquet(path, index=False)
+    return DuckDBAggregator(str(path))
+
+
+def test_row_level_categories_match(frame, aggregator):
+    """逐行派生结果（还款模式 / 风险等级 / 逾期天数分组）与 pandas 一致"""
+    rows = aggregator._df(
+        f"SELECT {_payment_pattern_sql(PAYMENT_HISTORY_COLS)} AS pattern, {_risk_level_sql()} AS level, "
+        f"{_overdue_group_sql()} AS grp FROM data"
+    )
+    derived = {}
+    assert rows["pattern"].tolist() == compute.payment_pattern(frame, derived=derived).tolist()
+    assert rows["level"].tolist() == compute.risk_level(frame, derived).astype(object).tolist()
+    assert rows["grp"].tolist() == compute.overdue_group(frame, derived).astype(object).tolist()
+
+
+def test_payment_history_matches(frame, aggregator):
+    assert_same(compute.payment_history(frame, PAYMENT_HISTORY_COLS),
+                aggregator.payment_history(PAYMENT_HISTORY_COLS))
+
+
+def test_risk_factors_match(frame, aggregator):
+    """统计量、分布以及 value_counts 的排序（排名）一致"""
+    assert_same(compute.risk_factors(frame, PAYMENT_HISTORY_COLS),
+                aggregator.risk_factors(PAYMENT_HISTORY_COLS))
+
+
+def test_debt_composition_matches(frame, aggregator):
+    assert_same(compute.debt_composition(frame, DEBT_COMPONENTS), aggregator.debt_composition(DEBT_COMPONENTS))
+
+
+def test_from_file_caches_outside_source_dir(frame, tmp_path):
+    source_dir, cache_dir = tmp_path / "source", tmp_path / "cache"
+    source_dir.mkdir()
+    source = source_dir / "2406三手.xlsx"
+    frame.head(300).to_excel(source, index=False)
+
+    agg = DuckDBAggregator.from_file(str(source), cache_dir=str(cache_dir), chunksize=100)
+    assert os.listdir(source_dir) == ["2406三手.xlsx"]
+    assert agg.row_count() == 300
+    assert len(agg.parquet_path) == 3
+    # 源文件未变化时复用缓存
+    assert DuckDBAggregator.from_file(str(source), cache_dir=str(cache_dir)).parquet_path == agg.parquet_path
+
+    # 源文件更新后重建缓存，旧缓存删除
+    frame.head(50).to_excel(source, index=False)
+    os.utime(source, ns=(os.stat(source).st_atime_ns, os.stat(source).st_mtime_ns + 10 ** 9))
+    assert DuckDBAggregator.from_file(str(source), cache_dir=str(cache_dir)).row_count() == 50
+    assert len(os.listdir(cache_dir)) == 1
+
+
+def test_from_file_matches_pandas(frame, tmp_path):
+    """Excel 分块转存后的统计结果与整表读入的 pandas 结果一致"""
+    from utils.file_loader import load_file
+
+    source = tmp_path / "data.xlsx"
+    frame.head(500).to_excel(source, index=False)
+    agg = DuckDBAggregator.from_file(str(source), cache_dir=str(tmp_path / "cache"), chunksize=128)
+    df, _ = load_file(str(source))
+    assert_same(compute.risk_factors(df, PAYMENT_HISTORY_COLS), agg.risk_factors(PAYMENT_HISTORY_COLS))
+    assert_same(compute.debt_composition(df, DEBT_COMPONENTS), agg.debt_composition(DEBT_COMPONENTS))
+
+
+def test_sample_validates_columns(aggregator):
+    sample = aggregator.sample(["逾期天数", "risk_prob"], n=100)
+    assert sample.columns.tolist() == ["逾期天数", "risk_prob"] and len(sample) == 100
+    with pytest.raises(ValueError, match="不存在的列"):
+        aggregator.sample(["逾期天数", "不存在的列"])
+    with pytest.raises(ValueError):
+        aggregator.sample([])
@@ -1,9 +1,20 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from adjustText import adjust_text  
-from matplotlib import font_manager
+
+from utils import compute
+from utils.font_config import set_chinese_font
+from utils.portfolio_store import PortfolioStore
+from utils.reference_data import ID_CARD_FILE, load_region_map
+from utils.region import LEVEL_NAMES, RegionRollup
+from utils.sketch import PortfolioSketch
+
+
+def _sns():
+    """seaborn 导入较慢，首次画图时再加载"""
+    import seaborn as sns
+    return sns
+
 
 # # 获取 STHeiti Light.ttf 的字体名称
 # font_path = "STHeiti Light.ttc"
@@ -13,51 +24,41 @@ from matplotlib import font_manager
 # plt.rcParams["font.family"] = font_name
 
 class CollectionAnalyzer:
-    def __init__(self, df: pd.DataFrame, file_type: str = None):
+    def __init__(self, df: pd.DataFrame, file_type: str = None, region_rollup: RegionRollup = None):
+        # 中文字体（进程内只配置一次）
+        set_chinese_font()
+        # 与评分器共享同一个 DataFrame（不复制），分析过程中不得修改它
         self.data = df
         # self.file_type = file_type
         self.analysis_results = {}
-        self.payment_history_cols = [
-            "上个月最小还款额",
-            "上2个月最小还款额",
-            "上3个月最小还款额",
-            "上4个月最小还款额",
-            "上5个月最小还款额",
-            "上6个月最小还款额",
-            "上7个月最小还款额",
-            "上8个月最小还款额",
-            "当期最小还款额"
-        ]
+        # 分析过程中派生的列单独存放，不写回 self.data
+        self.derived = {}
+        self._region_rollup = region_rollup
+        # 摘要模式（from_sketch）下只有分布摘要，没有明细数据
+        self.sketch = None
+        self.payment_history_cols = compute.PAYMENT_HISTORY_COLS
+
+    @classmethod
+    def from_sketch(cls, sketch: PortfolioSketch):
+        """
+        摘要模式：基于可合并的 PortfolioSketch 绘制年龄 / 风险概率 / 欠款比例 / 地区分布，
+        适用于无法一次性载入的组合级数据；依赖明细的视图返回 None。
+        """
+        analyzer = cls(pd.DataFrame())
+        analyzer.sketch = sketch
+        return analyzer
 
     def analyze_payment_history(self):
         """分析还款模式"""
-        self.data['连续未达标月数'] = 0
-        for idx, row in self.data.iterrows():
-            consecutive = 0
-            for col in self.payment_history_cols:
-                if col in self.data.columns:
-                    if pd.isna(row[col]) or row[col] <= 0:
-                        consecutive += 1
-                    else:
-                        consecutive = 0
-            self.data.at[idx, '连续未达标月数'] = consecutive
-
-        def classify_payment_pattern(row):
-            if row['连续未达标月数'] >= 6:
-                return '长期拖欠'
-            elif row['连续未达标月数'] >= 3:
-                return '中期拖欠'
-            elif row['连续未达标月数'] > 0:
-                return '短期拖欠'
-            else:
-                return '正常还款'
-
-        self.data['还款模式'] = self.data.apply(classify_payment_pattern, axis=1)
-        self.analysis_results['还款模式分布'] = self.data['还款模式'].value_counts(normalize=True) * 100
+        if self.sketch is not None:
+            return None
+        self.analysis_results['还款模式分布'] = compute.payment_history(
+            self.data, self.payment_history_cols, self.derived
+        )['还款模式分布']
 
         fig, ax = plt.subplots(figsize=(8, 5))
         data = self.analysis_results['还款模式分布'].sort_values(ascending=False)
-        sns.barplot(x=data.index, y=data.values, ax=ax)
+        _sns().barplot(x=data.index, y=data.values, ax=ax)
         for i, v in enumerate(data.values):
             ax.text(i, v + 0.5, f'{v:.1f}%', ha='center')
         ax.set_title("还款模式分布（%）")
@@ -65,16 +66,11 @@ class CollectionAnalyzer:
 
     def analyze_risk_factors(self):
         """风险等级与还款模式"""
-        if 'risk_prob' in self.data.columns:
-            self.data['风险等级'] = pd.cut(
-                self.data['risk_prob'],
-                bins=[-0.01, 0.3, 0.7, 1.01],
-                labels=['低风险', '中风险', '高风险']
-            )
-        if '风险等级' not in self.data.columns or '还款模式' not in self.data.columns:
+        if self.sketch is not None:
+            return None
+        cross = compute.risk_payment_crosstab(self.data, self.payment_history_cols, self.derived)
+        if cross is None:
             return None
-
-        cross = pd.crosstab(self.data['风险等级'], self.data['还款模式'], normalize='index') * 100
         self.analysis_results['风险等级分布'] = cross
 
         fig, ax = plt.subplots(figsize=(8, 5))
@@ -118,16 +114,11 @@ class CollectionAnalyzer:
 
     def analyze_debt_composition(self):
     
-        debt_components = [
-            '本金', '应收利息', '应收费用', '违约金', '滞纳金',
-            '取现手续费', '现金分期手续费', '账单分期手续费', '年费'
-        ]
-        debt_components = [col for col in debt_components if col in self.data.columns]
-        if not debt_components:
+        debt = compute.debt_composition(self.data, compute.DEBT_COMPONENTS, self.derived)
+        if not debt:
             return None
 
-        total = self.data[debt_components].sum()
-        data = (total / total.sum() * 100).sort_values(ascending=False)
+        data = debt['总体欠款构成(占比)'].sort_values(ascending=False)
         self.analysis_results['总体欠款构成(占比)'] = data
 
         fig, ax = plt.subplots(figsize=(8, 8))
@@ -157,22 +148,35 @@ class CollectionAnalyzer:
 
     def analyze_debt_ratio(self):
         """欠款金额与本金占比分布"""
-        if "本金" in self.data.columns and "当期账单金额" in self.data.columns:
-            self.data["欠款比例"] = (self.data["当期账单金额"] / self.data["本金"]) - 1
-        
-        def classify_ratio(r):
-            if pd.isna(r): return "无效数据"
-            if r <= 0.5: return "50%以下"
-            elif r <= 1.0: return "51%-100%"
-            elif r <= 1.5: return "101%-150%"
-            else: return "＞150%"
-        
-        self.data["欠款比例区间"] = self.data["欠款比例"].apply(classify_ratio)
-        dist = self.data["欠款比例区间"].value_counts(normalize=True) * 100
+        if self.sketch is not None:
+            # 全部为无效数据时与明细模式一致，显示 100%「无效数据」
+            if self.sketch.debt_ratio.counts.sum() + self.sketch.debt_ratio.missing == 0:
+                return None
+            dist = self.sketch.debt_ratio_distribution()
+            self.analysis_results["欠款比例分位数"] = self.sketch.debt_ratio_quantiles.quantiles()
+        else:
+            if "本金" in self.data.columns and "当期账单金额" in self.data.columns:
+                ratio = (self.data["当期账单金额"] / self.data["本金"]) - 1
+            elif "欠款比例" in self.data.columns:
+                ratio = self.data["欠款比例"]
+            else:
+                return None
+            self.derived["欠款比例"] = ratio
+
+            ratio_group = pd.Series(
+                np.select(
+                    [ratio.isna(), ratio <= 0.5, ratio <= 1.0, ratio <= 1.5],
+                    ["无效数据", "50%以下", "51%-100%", "101%-150%"],
+                    default="＞150%"
+                ),
+                index=ratio.index
+            )
+            self.derived["欠款比例区间"] = ratio_group
+            dist = ratio_group.value_counts(normalize=True) * 100
         self.analysis_results["欠款比例分布"] = dist
         
         fig, ax = plt.subplots(figsize=(6,4))
-        sns.barplot(x=dist.index, y=dist.values, ax=ax)
+        _sns().barplot(x=dist.index, y=dist.values, ax=ax)
         for i, v in enumerate(dist.values):
             ax.text(i, v + 0.5, f"{v:.1f}%", ha="center")
         ax.set_title("欠款金额与本金比例分布")
@@ -180,62 +184,90 @@ class CollectionAnalyzer:
 
     def analyze_age_distribution(self):
         """客户年龄分布"""
-        if "年龄" not in self.data.columns:
-            return None
-        
-        bins = [0, 20, 30, 40, 50, 60, 100]
-        labels = ["20以下","21-30","31-40","41-50","51-60","60以上"]
-        self.data["年龄段"] = pd.cut(self.data["年龄"], bins=bins, labels=labels, right=True)
-        dist = self.data["年龄段"].value_counts(normalize=True).sort_index() * 100
+        if self.sketch is not None:
+            if self.sketch.age.bins.sum() == 0:
+                return None
+            dist = self.sketch.age_distribution()
+        else:
+            if "年龄" not in self.data.columns:
+                return None
+
+            bins = [0, 20, 30, 40, 50, 60, 100]
+            labels = ["20以下","21-30","31-40","41-50","51-60","60以上"]
+            age_group = pd.cut(self.data["年龄"], bins=bins, labels=labels, right=True)
+            self.derived["年龄段"] = age_group
+            dist = age_group.value_counts(normalize=True).sort_index() * 100
         self.analysis_results["年龄分布"] = dist
         
         fig, ax = plt.subplots(figsize=(7,4))
-        sns.barplot(x=dist.index, y=dist.values, ax=ax)
+        _sns().barplot(x=dist.index, y=dist.values, ax=ax)
         for i, v in enumerate(dist.values):
             ax.text(i, v + 0.5, f"{v:.1f}%", ha="center")
         ax.set_title("客户年龄结构（%）")
         return fig
 
-    def analyze_region_distribution(self, id_file="utils/id_card.csv", top_n=10, ascending=False):
-        """客户地区分布（根据身份证号前6位解析省市，用户可选择 Top N 和排序方式）"""
+    def region_rollup(self, id_file=ID_CARD_FILE):
+        """地区三级计数（每个分析器只统计一次；也可由调用方跨刷新复用后传入）"""
+        if self._region_rollup is None or self._region_rollup.id_map is not load_region_map(id_file):
+            self._region_rollup = RegionRollup(self.data["证件号"], load_region_map(id_file))
+        return self._region_rollup
+
+    def analyze_region_distribution(self, id_file=ID_CARD_FILE, top_n=10, ascending=False, level="county", parent=None):
+        """
+        客户地区分布（根据身份证号前6位解析省市，用户可选择 Top N 和排序方式）
+        :param level: 统计层级 province / city / county
+        :param parent: 下钻时的上级行政区划码（省或市），为空则统计全国
+        """
+        if self.sketch is not None:
+            # 摘要模式：高频地区近似计数，只支持区县级 Top N
+            dist = self.sketch.region_top(top_n, ascending=ascending)
+            if dist.empty:
+                return None
+            self.analysis_results["地区分布"] = dist
+            fig, ax = plt.subplots(figsize=(8, 5))
+            _sns().barplot(y=dist.index, x=dist.values, ax=ax)
+            ax.set_title(f"客户地区分布（高频地区 Top {top_n}，近似值）")
+            return fig
+
         if "证件号" not in self.data.columns:
             return None
 
-        # 1. 加载地区映射表
-        try:
-            self.id_map = pd.read_csv(id_file, dtype=str).set_index("number")["name"].to_dict()
-        except Exception as e:
-            print(f"⚠️ 地区映射表加载失败: {e}")
+        # 1. 地区映射表（进程内共享，只读）
+        if not load_region_map(id_file):
+            print(f"⚠️ 地区映射表加载失败: {id_file}")
             return None
 
-        # 2. 定义身份证解析函数
-        def parse_region_from_id(id_number: str):
-            if not isinstance(id_number, str) or len(id_number) < 6:
-                return None
-            code = id_number[:6]
-            return self.id_map.get(code, None)
-
-        # 3. 生成地区列
-        self.data["地区(解析)"] = self.data["证件号"].apply(parse_region_from_id)
-
-        if self.data["地区(解析)"].isna().all():
+        # 2. 证件号 -> 整数地区码，三级计数只算一次，Top N / 排序 / 下钻都是切片
+        dist = self.region_rollup(id_file).top(level, n=top_n, ascending=ascending, parent=parent)
+        if dist.empty:
             return None
-
-        # 4. 统计地区分布
-        dist = self.data["地区(解析)"].value_counts(ascending=ascending).head(top_n)
         self.analysis_results["地区分布"] = dist
 
-        # 5. 画图
+        # 3. 画图
         fig, ax = plt.subplots(figsize=(8, 5))
-        sns.barplot(y=dist.index, x=dist.values, ax=ax)
+        _sns().barplot(y=dist.index, x=dist.values, ax=ax)
         for i, v in enumerate(dist.values):
             ax.text(v + 0.5, i, f"{v}", va="center")
-        ax.set_title(f"客户地区分布（Top {top_n}）")
+        scope = f"{self._region_rollup.name(parent)} · " if parent is not None else ""
+        ax.set_title(f"客户地区分布（{scope}{LEVEL_NAMES[level]} Top {top_n}）")
         return fig
 
 
     def analyze_risk_distribution(self):
         """风险概率直方图"""
+        if self.sketch is not None:
+            if self.sketch.risk_quantiles.count == 0:
+                return None
+            # 摘要模式：固定 20 等分 [0, 1] 直方图
+            edges = self.sketch.risk_hist.edges
+            self.analysis_results["风险概率分位数"] = self.sketch.risk_quantiles.quantiles()
+            fig, ax = plt.subplots(figsize=(7,4))
+            ax.bar(edges[:-1], self.sketch.risk_histogram().values, width=np.diff(edges), align="edge")
+            ax.set_xlabel("风险概率")
+            ax.set_ylabel("人数")
+            ax.set_title("风险概率分布直方图")
+            return fig
+
         if "risk_prob" not in self.data.columns:
             return None
         
@@ -245,3 +277,61 @@ class CollectionAnalyzer:
         ax.set_ylabel("人数")
         ax.set_title("风险概率分布直方图")
         return fig
+
+
+class TrendAnalyzer:
+    """
+    多月份趋势视图：直接读取 PortfolioStore 中已入库的评分结果，
+    每个视图只读取它需要的列和分区（月份 / 手别），不重新解析原始 Excel。
+    """
+
+    def __init__(self, store: PortfolioStore = None, months: list = None, hands: list = None):
+        set_chinese_font()
+        self.store = store or PortfolioStore()
+        self.months = months
+        self.hands = hands
+        self.analysis_results = {}
+
+    def _read(self, columns: list) -> pd.DataFrame:
+        return self.store.read(columns, months=self.months, hands=self.hands)
+
+    def _share_plot(self, col: str, labels: list, title: str):
+        share = compute.monthly_share(self._read([col]), col, labels)
+        if share.empty:
+            return None
+        self.analysis_results[f'{col}占比趋势'] = share
+
+        fig, ax = plt.subplots(figsize=(9, 5))
+        share.plot(kind='bar', stacked=True, ax=ax, colormap='viridis')
+        ax.set_xlabel("月份")
+        ax.set_ylabel("占比（%）")
+        ax.set_title(title)
+        ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left')
+        fig.tight_layout()
+        return fig
+
+    def analyze_payment_trend(self):
+        """还款模式占比（按月）"""
+        return self._share_plot('还款模式', compute.PAYMENT_PATTERN_LABELS, "还款模式占比月度趋势")
+
+    def analyze_risk_trend(self):
+        """风险等级占比（按月）"""
+        return self._share_plot('风险等级', compute.RISK_LEVEL_LABELS, "风险等级占比月度趋势")
+
+    def analyze_score_trend(self):
+        """人数与平均总评分（按月）"""
+        summary = compute.monthly_summary(self._read(['总评分', '总欠款']))
+        if summary.empty:
+            return None
+        self.analysis_results['月度汇总'] = summary
+
+        fig, ax = plt.subplots(figsize=(9, 4))
+        ax.bar(summary.index, summary['人数'], color='lightsteelblue')
+        ax.set_xlabel("月份")
+        ax.set_ylabel("人数")
+        ax2 = ax.twinx()
+        ax2.plot(summary.index, summary['平均总评分'], color='darkred', marker='o')
+        ax2.set_ylabel("平均总评分")
+        ax.set_title("人数与平均总评分月度趋势")
+        fig.tight_layout()
+        return fig
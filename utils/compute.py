@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+# 共用的分析口径：ThreeHandCollectionAnalyzer、CollectionAnalyzer 与 DuckDB 后端保持一致
+PAYMENT_HISTORY_COLS = ['上个月最小还款额'] + [f'上{i}个月最小还款额' for i in range(2, 9)] + ['当期最小还款额']
+DEBT_COMPONENTS = [
+    '本金', '应收利息', '应收费用', '违约金', '滞纳金',
+    '取现手续费', '现金分期手续费', '账单分期手续费', '年费'
+]
+RISK_LEVEL_BINS = [-0.01, 0.3, 0.7, 1.01]
+RISK_LEVEL_LABELS = ['低风险', '中风险', '高风险']
+OVERDUE_DAY_BINS = [-1, 30, 90, 180, 360, float('inf')]
+OVERDUE_DAY_LABELS = ['30天内', '31-90天', '91-180天', '181-360天', '360天以上']
+PAYMENT_PATTERN_LABELS = ['长期拖欠', '中期拖欠', '短期拖欠', '正常还款']
+
+
+def _cached(derived: dict, name: str, func):
+    """派生列缓存：同一份数据的派生结果只计算一次（derived 为调用方持有的 dict）"""
+    if derived is None:
+        return func()
+    if name not in derived:
+        derived[name] = func()
+    return derived[name]
+
+
+# ------------------- 派生列 -------------------
+def consecutive_missed(df: pd.DataFrame, payment_history_cols: list = PAYMENT_HISTORY_COLS,
+                       derived: dict = None) -> pd.Series:
+    """连续未达标月数：按时间顺序逐列累加，遇到达标月份清零（缺失的列跳过）"""
+    def compute():
+        consecutive = np.zeros(len(df), dtype=np.int64)
+        for col in payment_history_cols:
+            if col in df.columns:
+                values = df[col].to_numpy(dtype=float, na_value=np.nan)
+                missed = np.isnan(values) | (values <= 0)
+                consecutive = np.where(missed, consecutive + 1, 0)
+        return pd.Series(consecutive, index=df.index, name='连续未达标月数')
+    return _cached(derived, '连续未达标月数', compute)
+
+
+def payment_pattern(df: pd.DataFrame, payment_history_cols: list = PAYMENT_HISTORY_COLS,
+                    derived: dict = None) -> pd.Series:
+    """连续未达标月数 -> 还款模式"""
+    def compute():
+        consecutive = consecutive_missed(df, payment_history_cols, derived).to_numpy()
+        return pd.Series(
+            np.select(
+                [consecutive >= 6, consecutive >= 3, consecutive > 0],
+                PAYMENT_PATTERN_LABELS[:3],
+                default=PAYMENT_PATTERN_LABELS[3]
+            ),
+            index=df.index,
+            name='还款模式'
+        )
+    return _cached(derived, '还款模式', compute)
+
+
+def risk_level(df: pd.DataFrame, derived: dict = None):
+    """risk_prob -> 风险等级（没有 risk_prob 时使用数据中已有的风险等级列，都没有返回 None）"""
+    def compute():
+        if 'risk_prob' in df.columns:
+            return pd.cut(df['risk_prob'], bins=RISK_LEVEL_BINS, labels=RISK_LEVEL_LABELS).rename('风险等级')
+        if '风险等级' in df.columns:
+            return df['风险等级']
+        return None
+    return _cached(derived, '风险等级', compute)
+
+
+def overdue_group(df: pd.DataFrame, derived: dict = None) -> pd.Series:
+    """逾期天数分组"""
+    return _cached(derived, '逾期天数分组', lambda: pd.cut(
+        df['逾期天数'], bins=OVERDUE_DAY_BINS, labels=OVERDUE_DAY_LABELS
+    ).rename('逾期天数分组'))
+
+
+# ------------------- 聚合结果 -------------------
+def payment_history(df: pd.DataFrame, payment_history_cols: list = PAYMENT_HISTORY_COLS,
+                    derived: dict = None) -> dict:
+    """还款模式分布(%)，以及历史还款与总欠款相关性"""
+    result = {}
+    pattern = payment_pattern(df, payment_history_cols, derived)
+    result['还款模式分布'] = pattern.value_counts(normalize=True).sort_values(ascending=False, kind='stable') * 100
+
+    if '总欠款' in df.columns:
+        corr_cols = [col for col in payment_history_cols if col in df.columns] + ['总欠款']
+        result['历史还款与总欠款相关性'] = df[corr_cols].corr()['总欠款']
+    return result
+
+
+def risk_payment_crosstab(df: pd.DataFrame, payment_history_cols: list = PAYMENT_HISTORY_COLS,
+                          derived: dict = None):
+    """风险等级 × 还款模式 交叉表（按行归一化，%）"""
+    level = risk_level(df, derived)
+    if level is None:
+        return None
+    cross = pd.crosstab(level.astype(object), payment_pattern(df, payment_history_cols, derived))
+    # 行按 低 / 中 / 高 风险排列（其他取值排在后面），列按名称排序
+    rank = {label: i for i, label in enumerate(RISK_LEVEL_LABELS)}
+    cross = cross.loc[sorted(cross.index, key=lambda l: rank.get(l, len(rank)))]
+    cross = cross[sorted(cross.columns)].astype(float)
+    cross.index.name, cross.columns.name = '风险等级', '还款模式'
+    return cross.div(cross.sum(axis=1), axis=0) * 100
+
+
+def risk_factors(df: pd.DataFrame, payment_history_cols: list = PAYMENT_HISTORY_COLS,
+                 derived: dict = None) -> dict:
+    """风险概率分布、风险等级分布、逾期相关统计，以及风险等级与还款模式交叉表"""
+    result = {}
+    if 'risk_prob' in df.columns:
+        result['risk_prob分布'] = df['risk_prob'].describe()
+        counts = risk_level(df, derived).value_counts()
+        counts = counts.reindex(RISK_LEVEL_LABELS, fill_value=0).astype('int64')
+        result['风险等级分布'] = counts.sort_values(ascending=False, kind='stable').rename('count')
+
+    if '逾期天数' in df.columns and 'risk_prob' in df.columns:
+        result['逾期天数与风险相关性'] = df['逾期天数'].corr(df['risk_prob'])
+
+    if '近两年内逾期次数' in df.columns:
+        # 人数降序，同人数按次数升序（与 SQL 后端排序一致）
+        counts = df['近两年内逾期次数'].value_counts().sort_index()
+        result['近两年内逾期次数分布'] = counts.sort_values(ascending=False, kind='stable').rename('count')
+        if '总欠款' in df.columns:
+            result['逾期次数与总欠款关系'] = df.groupby('近两年内逾期次数')['总欠款'].mean()
+
+    if payment_history_cols and 'risk_prob' in df.columns:
+        result['风险等级与还款模式'] = risk_payment_crosstab(df, payment_history_cols, derived)
+    return result
+
+
+def debt_composition(df: pd.DataFrame, debt_components: list = DEBT_COMPONENTS, derived: dict = None) -> dict:
+    """欠款构成：总额、占比(%)，以及按逾期天数分组的构成"""
+    components = [col for col in debt_components if col in df.columns]
+    if not components:
+        return {}
+    result = {}
+    totals = df[components].sum().astype(float)
+    result['总体欠款构成(总额)'] = totals
+    result['总体欠款构成(占比)'] = totals / totals.sum() * 100
+
+    if '逾期天数' in df.columns:
+        grouped = df[components].groupby(overdue_group(df, derived), observed=False).sum().astype(float)
+        result['按逾期天数分组的欠款构成'] = grouped
+    return result
+
+
+def monthly_share(df: pd.DataFrame, col: str, labels: list = None, by: str = 'month') -> pd.DataFrame:
+    """按月份统计某一分类列的占比(%)：行为月份，列为类别（labels 给定时按其顺序补齐）"""
+    data = df[[by, col]].dropna()
+    if data.empty:
+        return pd.DataFrame()
+    share = pd.crosstab(data[by], data[col].astype(object), normalize='index') * 100
+    if labels:
+        share = share.reindex(columns=labels, fill_value=0.0)
+    return share.sort_index().astype(float)
+
+
+def monthly_summary(df: pd.DataFrame, by: str = 'month') -> pd.DataFrame:
+    """按月份汇总：人数、平均总评分、总欠款合计"""
+    agg = {'人数': (by, 'size')}
+    if '总评分' in df.columns:
+        agg['平均总评分'] = ('总评分', 'mean')
+    if '总欠款' in df.columns:
+        agg['总欠款合计'] = ('总欠款', 'sum')
+    return df.groupby(by).agg(**agg).sort_index()
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from utils.paths import DATA_DIR
+from utils.snapshot import arrow_safe
+
+# 导出文件目录（数据目录下）：导出流式写盘，会话中只保存路径，不保存文件内容
+EXPORT_DIR = os.path.join(DATA_DIR, ".exports")
+# 导出文件保留时间（与会话数据过期时间一致）
+EXPORT_TTL_SECONDS = 4 * 60 * 60
+
+# 取值很少、重复度高的列：Parquet 中按字典编码存储
+REGION_COLUMNS = ["身份证地区", "地区(解析)", "逾期期数", "还款模式", "风险等级"]
+# Excel 单个工作表最多 1048576 行（含表头）
+XLSX_MAX_ROWS = 1_048_575
+CHUNK_ROWS = 50_000
+
+
+def categorical_columns(df: pd.DataFrame) -> list:
+    """评分列（*得分）与地区等低基数文本列"""
+    return [c for c in df.columns if str(c).endswith("得分") or c in REGION_COLUMNS]
+
+
+def export_parquet(df: pd.DataFrame, path_or_buf):
+    """导出 Parquet：评分 / 地区列转为 category，按字典编码写入"""
+    cat_cols = categorical_columns(df)
+    out = arrow_safe(df).astype({c: "category" for c in cat_cols})
+    out.to_parquet(
+        path_or_buf,
+        engine="pyarrow",
+        index=False,
+        compression="zstd",
+        use_dictionary=cat_cols or False,
+    )
+
+
+def export_csv(df: pd.DataFrame, path_or_buf):
+    """导出 CSV（utf-8-sig，Excel 直接打开不乱码），分块写出"""
+    df.to_csv(path_or_buf, index=False, encoding="utf-8-sig", chunksize=CHUNK_ROWS)
+
+
+def export_xlsx(df: pd.DataFrame, path_or_buf, sheet_name: str = "评分结果"):
+    """
+    导出 xlsx：openpyxl 只写模式逐行流式写出，内存占用与行数无关。
+    超过单表行数上限时自动续写到下一个工作表。
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    header = [str(c) for c in df.columns]
+    ws, sheet_rows, sheet_no = None, XLSX_MAX_ROWS, 0
+
+    for start in range(0, max(len(df), 1), CHUNK_ROWS):
+        block = df.iloc[start:start + CHUNK_ROWS].astype(object)
+        block = block.where(block.notna(), None)
+        for row in block.itertuples(index=False, name=None):
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet_no += 1
+                ws = wb.create_sheet(sheet_name if sheet_no == 1 else f"{sheet_name}{sheet_no}")
+                ws.append(header)
+                sheet_rows = 0
+            ws.append(row)
+            sheet_rows += 1
+
+    if ws is None:  # 空表也保留表头
+        wb.create_sheet(sheet_name).append(header)
+    wb.save(path_or_buf)
+
+
+# 格式名 -> (文件后缀, 导出函数, MIME 类型)
+EXPORT_FORMATS = {
+    "Parquet": (".parquet", export_parquet, "application/vnd.apache.parquet"),
+    "CSV": (".csv", export_csv, "text/csv"),
+    "Excel (xlsx)": (".xlsx", export_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def export_frame(df: pd.DataFrame, fmt: str, path_or_buf):
+    """按格式名导出完整评分结果"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    EXPORT_FORMATS[fmt][1](df, path_or_buf)
+
+
+def export_to_file(df: pd.DataFrame, fmt: str, export_dir: str = EXPORT_DIR, prefix: str = "export") -> str:
+    """导出到导出目录下的唯一文件名（顺带清理过期的导出文件），返回文件路径"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    os.makedirs(export_dir, exist_ok=True)
+    cleanup_exports(export_dir)
+    fd, path = tempfile.mkstemp(dir=export_dir, prefix=f"{prefix}-", suffix=EXPORT_FORMATS[fmt][0])
+    os.close(fd)
+    try:
+        export_frame(df, fmt, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def cleanup_exports(export_dir: str = EXPORT_DIR, ttl: float = EXPORT_TTL_SECONDS) -> int:
+    """删除超过保留时间的导出文件，返回删除的文件数"""
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
@@ -1,23 +1,33 @@
+import os
+
 import pandas as pd
 
+from utils.quality import profile_quality
+from utils.schema import normalize_columns
+
 def detect_file_type(filename: str) -> str:
     """根据文件名判断是 '在案' 还是 '前催'"""
     if "前催" in filename:
         return "前催"
     return "在案"
 
-def load_file(uploaded_file):
+def load_file(uploaded_file, file_name: str = None, quality: bool = False):
     """
-    读取 Excel，并根据文件名判断类型
+    读取 Excel（上传文件对象或文件路径），并根据文件名判断类型
     - 文件名包含 "前催" -> 前催
     - 否则 -> 在案
+    列名按 utils.schema 规范化，数值 / 日期列整体转换
+    :param quality: 为 True 时在读取后做数据质量检查，返回 (df, file_type, 质量报告)。
+        转换失败数在规范化列时同步统计；其余检查是对内存中数据的第二遍向量化扫描：
+        pd.read_excel 一次性解析整个工作表，没有分块回调可以挂接，且检查依赖规范化后的列名 / 类型
     """
-    df = pd.read_excel(uploaded_file)
+    report = {}
+    df = normalize_columns(pd.read_excel(uploaded_file), report=report)
 
-    filename = uploaded_file.name  # 获取上传文件名
-    if "前催" in filename:
-        file_type = "前催"
-    else:
-        file_type = "在案"
+    # 获取上传文件名（路径输入时可通过 file_name 指定原始文件名）
+    filename = file_name or os.path.basename(getattr(uploaded_file, "name", str(uploaded_file)))
+    file_type = detect_file_type(filename)
 
+    if quality:
+        return df, file_type, profile_quality(df, report)
     return df, file_type
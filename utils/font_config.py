@@ -1,32 +1,42 @@
 import matplotlib.pyplot as plt
 from matplotlib import font_manager
+from functools import lru_cache
 import platform, os
 
 #plt.rcParams["font.family"] = ["Arial Unicode MS", "Helvetica", "Arial", "sans-serif"]
-def set_chinese_font():
+FONT_FILE = "STHeiti Light.ttc"
+
+
+@lru_cache(maxsize=None)
+def find_chinese_font():
+    """查找可用的中文字体，返回字体名称（进程内只查找一次，找不到返回 None）"""
     system = platform.system()
     font_paths = []
     if system == "Windows":
         font_paths = [r"C:\Windows\\Fonts\\msyh.ttc", r"C:\Windows\\Fonts\simhei.ttf"]
     elif system == "Darwin":  # macOS
         font_paths = ["/System/Library/Fonts/STHeiti Light.ttc"]
-    else:  # Linux
-        font_paths = ["STHeiti Light.ttc"]
+    # 随项目分发的 STHeiti Light.ttc（项目根目录 / utils 目录 / 当前工作目录）
+    here = os.path.dirname(os.path.abspath(__file__))
+    font_paths += [
+        os.path.join(os.path.dirname(here), FONT_FILE),
+        os.path.join(here, FONT_FILE),
+        FONT_FILE,
+    ]
 
-    font_path = None
-    # 获取 STHeiti Light.ttf 的字体名称
-    font_path = "STHeiti Light.ttc"
-    font_name = font_manager.FontProperties(fname=font_path).get_name()
-
-    # 设置为全局默认字体
-    plt.rcParams["font.family"] = font_name
     for path in font_paths:
         if os.path.exists(path):
-            font_path = path
-            break
+            # 注册到 matplotlib 字体管理器，按名称即可使用
+            font_manager.fontManager.addfont(path)
+            return font_manager.FontProperties(fname=path).get_name()
+    return None
 
-    if font_path:
-        my_font = font_manager.FontProperties(fname=font_path)
-        plt.rcParams["font.family"] = my_font.get_name()
 
+@lru_cache(maxsize=None)
+def set_chinese_font():
+    """设置 matplotlib 中文字体（进程内只执行一次，重复调用无开销）"""
+    font_name = find_chinese_font()
+    if font_name:
+        # 设置为全局默认字体
+        plt.rcParams["font.family"] = font_name
     plt.rcParams["axes.unicode_minus"] = False
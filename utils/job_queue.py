@@ -0,0 +1,445 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import types
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+from utils.paths import DATA_DIR
+
+# 任务库与文件目录（数据目录下的 .jobs）
+JOB_DIR = os.path.join(DATA_DIR, ".jobs")
+JOB_DB = os.path.join(JOB_DIR, "jobs.sqlite3")
+UPLOAD_DIR = os.path.join(JOB_DIR, "uploads")
+# 组合摘要任务的结果（PortfolioSketch 序列化文件，与上传文件一起按保留时间清理）
+SKETCH_DIR = os.path.join(JOB_DIR, "sketches")
+
+# 敏感字段（如 api_key）不得写入任务库，只能通过 submit(secrets=...) 在内存中传给 worker
+SENSITIVE_KEYS = ("api_key",)
+# worker 执行任务期间定期刷新心跳；超过租约时间没有心跳的任务视为 worker 已退出
+HEARTBEAT_SECONDS = 10
+LEASE_SECONDS = 60
+# 带敏感信息的任务只能由提交它的服务进程执行，排队超过该时间（服务可能已退出）直接失败
+SECRET_JOB_TIMEOUT = 60 * 60
+# 上传文件与已结束任务（payload 中含画像数据）的保留时间
+JOB_TTL_SECONDS = float(os.environ.get("PROFILE_JOB_TTL_HOURS", 24)) * 3600
+CLEANUP_INTERVAL = 10 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    status TEXT NOT NULL,          -- queued / running / done / failed
+    progress REAL DEFAULT 0,
+    message TEXT,
+    payload TEXT,
+    result TEXT,
+    error TEXT,
+    worker_pid INTEGER,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    server_id TEXT                 -- 带敏感信息的任务：提交它的服务进程
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+# 旧版任务库缺少的列
+MIGRATIONS = {"heartbeat_at": "REAL", "server_id": "TEXT"}
+
+# 任务类型 -> 处理函数 handler(payload, report) -> result(dict)
+HANDLERS = {}
+# payload 中指向上传文件的字段：任务结束（finish / fail）后删除；重新排队的任务仍需读取，不能提前删除
+UPLOAD_KEYS = ("input_path", "input_paths")
+
+
+def register_handler(kind: str):
+    """注册任务处理函数"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """
+    本地任务队列（SQLite 持久化）：页面提交任务后立即返回，由独立的 worker 进程执行，
+    进度与结果写回数据库；页面刷新 / 切换后按任务 ID 轮询即可继续查看。
+    敏感信息（API Key）只保存在服务进程与其 worker 共享的内存字典 secrets 中，不落盘。
+    """
+
+    def __init__(self, db_path: str = JOB_DB, secrets=None, server_id: str = None):
+        self.db_path = db_path
+        self.secrets = secrets
+        self.server_id = server_id
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+            existing = {row["name"] for row in con.execute("PRAGMA table_info(jobs)")}
+            for col, col_type in MIGRATIONS.items():
+                if col not in existing:
+                    con.execute(f"ALTER TABLE jobs ADD COLUMN {col} {col_type}")
+
+    @contextmanager
+    def _connect(self):
+        # 自动提交模式，需要事务时显式 BEGIN；每次操作独立连接，可跨进程使用
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        try:
+            yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("payload", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    # ------------------- 提交 / 查询 -------------------
+    def submit(self, kind: str, payload: dict, owner: str = None, secrets: dict = None) -> str:
+        """
+        提交任务，返回任务 ID
+        :param secrets: 敏感参数（如 api_key），只放在内存中，执行时合并进 payload
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"未知任务类型: {kind}")
+        leaked = [key for key in SENSITIVE_KEYS if key in payload]
+        if leaked:
+            raise ValueError(f"敏感字段 {', '.join(leaked)} 需通过 secrets 传入，不能写入任务库")
+        if secrets and self.secrets is None:
+            raise RuntimeError("当前进程未启动 worker（start_workers），无法提交带敏感信息的任务")
+
+        job_id = uuid.uuid4().hex
+        if secrets:
+            self.secrets[job_id] = dict(secrets)
+        with self._connect() as con:
+            con.execute(
+                "INSERT INTO jobs (id, kind, owner, status, payload, created_at, server_id) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, owner, json.dumps(payload, ensure_ascii=False), time.time(),
+                 self.server_id if secrets else None)
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._connect() as con:
+            return self._row_to_job(con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, owner: str = None, limit: int = 20) -> list:
+        sql = "SELECT * FROM jobs" + (" WHERE owner = ?" if owner else "") + " ORDER BY created_at DESC LIMIT ?"
+        args = (owner, limit) if owner else (limit,)
+        with self._connect() as con:
+            return [self._row_to_job(r) for r in con.execute(sql, args).fetchall()]
+
+    def position(self, job_id: str) -> int:
+        """排队中的任务前面还有几个"""
+        with self._connect() as con:
+            row = con.execute(
+                "SELECT count(*) FROM jobs WHERE status = 'queued' AND created_at < "
+                "(SELECT created_at FROM jobs WHERE id = ?)", (job_id,)
+            ).fetchone()
+        return row[0]
+
+    # ------------------- worker 使用 -------------------
+    def claim(self, worker_pid: int):
+        """原子地领取最早排队的任务（带敏感信息的任务只领取本服务进程提交的）"""
+        with self._connect() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                row = con.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' AND (server_id IS NULL OR server_id = ?) "
+                    "ORDER BY created_at LIMIT 1", (self.server_id,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    con.execute(
+                        "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ?, heartbeat_at = ?, "
+                        "message = '开始执行' WHERE id = ?",
+                        (worker_pid, now, now, row["id"])
+                    )
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        return self._row_to_job(row)
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as con:
+            con.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def update_progress(self, job_id: str, progress: float, message: str = None):
+        with self._connect() as con:
+            con.execute("UPDATE jobs SET progress = ?, message = ?, heartbeat_at = ? WHERE id = ?",
+                        (progress, message, time.time(), job_id))
+
+    def _end(self, job_id: str):
+        if self.secrets is not None:
+            self.secrets.pop(job_id, None)
+
+    def finish(self, job_id: str, result: dict):
+        with self._connect() as con:
+            con.execute(
+                "UPDATE jobs SET status = 'done', progress = 1, message = '已完成', result = ?, finished_at = ? "
+                "WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+        self._end(job_id)
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as con:
+            con.execute(
+                "UPDATE jobs SET status = 'failed', message = '执行失败', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id)
+            )
+        self._end(job_id)
+
+    def requeue_expired(self, lease_seconds: float = LEASE_SECONDS) -> int:
+        """
+        心跳超时（worker 已退出）的运行中任务重新排队；仍有心跳的任务可能属于其他存活的服务进程，不处理。
+        带敏感信息、且提交它的服务进程可能已退出的任务直接标记失败（内存中的 API Key 已丢失）。
+        """
+        now = time.time()
+        with self._connect() as con:
+            con.execute(
+                "UPDATE jobs SET status = 'failed', message = '执行失败', error = ?, finished_at = ? "
+                "WHERE server_id IS NOT NULL AND ((status = 'running' AND coalesce(heartbeat_at, started_at) < ?) "
+                "OR (status = 'queued' AND created_at < ?))",
+                ("任务中断，API Key 不落盘，请重新提交", now, now - lease_seconds, now - SECRET_JOB_TIMEOUT)
+            )
+            cur = con.execute(
+                "UPDATE jobs SET status = 'queued', worker_pid = NULL, progress = 0, message = '重新排队' "
+                "WHERE status = 'running' AND coalesce(heartbeat_at, started_at, 0) < ?",
+                (now - lease_seconds,)
+            )
+            return cur.rowcount
+
+    def cleanup(self, ttl_seconds: float = JOB_TTL_SECONDS, upload_dir: str = UPLOAD_DIR) -> int:
+        """删除超过保留时间的已结束任务记录与上传文件（含个人信息），返回删除的文件数"""
+        cutoff = time.time() - ttl_seconds
+        from utils.qwen_client import prune_usage
+
+        with self._connect() as con:
+            con.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,))
+        prune_usage(self.db_path, ttl_seconds)
+        removed = 0
+        # results 为旧版保存的评分结果目录（现已改为直接读取评分快照）
+        job_dir = os.path.dirname(self.db_path)
+        for folder in (upload_dir, os.path.join(job_dir, "sketches"), os.path.join(job_dir, "results")):
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+# ------------------- worker 进程 -------------------
+def _heartbeat_loop(queue: JobQueue, job_id: str, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            queue.heartbeat(job_id)
+        except sqlite3.Error:
+            pass
+
+
+def _remove_uploads(payload: dict):
+    """删除任务的上传文件（含个人信息）"""
+    paths = []
+    for key in UPLOAD_KEYS:
+        value = payload.get(key)
+        paths += value if isinstance(value, list) else [value]
+    for path in filter(None, paths):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def run_next(queue: JobQueue, pid: int = None) -> bool:
+    """
+    领取并执行一个任务（后台线程刷新心跳），结果写回后再删除上传文件。
+    没有可领取的任务时返回 False
+    """
+    job = queue.claim(pid or os.getpid())
+    if job is None:
+        return False
+
+    def report(progress: float, message: str = None, job_id=job["id"]):
+        queue.update_progress(job_id, progress, message)
+
+    payload = job["payload"] or {}
+    if job["server_id"]:
+        job_secrets = queue.secrets.get(job["id"]) if queue.secrets is not None else None
+        if job_secrets is None:
+            queue.fail(job["id"], "任务中断，API Key 不落盘，请重新提交")
+            _remove_uploads(payload)
+            return True
+        payload = {**payload, **job_secrets}
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat_loop, args=(queue, job["id"], stop), daemon=True).start()
+    try:
+        result = HANDLERS[job["kind"]](payload, report)
+        queue.finish(job["id"], result or {})
+    except Exception as e:
+        traceback.print_exc()
+        queue.fail(job["id"], f"{type(e).__name__}: {e}")
+    finally:
+        stop.set()
+    # 只有结果已写回才删除：worker 在此之前退出时，任务重新排队后仍可读取上传文件
+    _remove_uploads(job["payload"] or {})
+    return True
+
+
+def worker_loop(db_path: str = JOB_DB, secrets=None, server_id: str = None, poll_interval: float = 0.5):
+    """worker 主循环：领取并执行任务；空闲时回收超时任务、清理过期文件"""
+    queue = JobQueue(db_path, secrets, server_id)
+    # 所有 worker 的 Qwen 限流与用量统一记在任务库中（RPM / TPM 是整个服务共用的额度）
+    os.environ.setdefault("QWEN_STATE_DB", db_path)
+    pid = os.getpid()
+    last_maintenance = 0.0
+    while True:
+        if time.time() - last_maintenance > CLEANUP_INTERVAL:
+            queue.requeue_expired()
+            queue.cleanup()
+            last_maintenance = time.time()
+        if not run_next(queue, pid):
+            time.sleep(poll_interval)
+
+
+@contextmanager
+def _bare_main():
+    """
+    spawn 方式启动子进程时会重新执行 __main__ 对应的脚本；Streamlit 把页面脚本注册为 __main__，
+    子进程会把 app.py 整个再跑一遍。启动期间换成空模块，子进程只导入 worker 所在的模块。
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def start_workers(n: int = None, db_path: str = JOB_DB) -> JobQueue:
+    """
+    启动 n 个 worker 进程（并发上限即 n），每个服务进程只应调用一次。
+    心跳超时的历史任务先重新排队，过期文件先清理。
+    :return: 与这些 worker 共享内存 secrets 的 JobQueue（用它提交带 API Key 的任务）
+    """
+    n = n or int(os.environ.get("PROFILE_JOB_WORKERS", 2))
+    ctx = multiprocessing.get_context("spawn")
+    with _bare_main():
+        # 敏感信息只存在于 Manager 进程的内存中，服务进程和 worker 通过代理对象读写
+        manager = ctx.Manager()
+        queue = JobQueue(db_path, secrets=manager.dict(), server_id=uuid.uuid4().hex)
+        queue.manager = manager
+        queue.requeue_expired()
+        queue.cleanup()
+        queue.workers = []
+        for _ in range(n):
+            p = ctx.Process(target=worker_loop, args=(db_path, queue.secrets, queue.server_id), daemon=True)
+            p.start()
+            queue.workers.append(p)
+    return queue
+
+
+def save_upload(uploaded_file, upload_dir: str = UPLOAD_DIR) -> str:
+    """把上传文件写到磁盘，供 worker 进程读取（任务结束后删除，遗留文件按保留时间清理）"""
+    os.makedirs(upload_dir, exist_ok=True)
+    ext = os.path.splitext(uploaded_file.name)[1]
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}{ext}")
+    with open(path, "wb") as f:
+        f.write(uploaded_file.getbuffer())
+    return path
+
+
+# ------------------- 任务类型 -------------------
+@register_handler("score")
+def run_score_job(payload: dict, report) -> dict:
+    """
+    评分任务（上传文件由 run_next 在任务结束后删除）
+    payload: input_path 输入文件, file_name 原始文件名（判断在案 / 前催）, as_of 基准日(ISO)
+    result: snapshot_key 评分快照（页面直接读取快照，不另存结果）, meta 快照元数据, quality 数据质量报告,
+            store_path 组合历史库文件
+    """
+    from datetime import date
+
+    from utils.file_loader import load_file
+    from utils.portfolio_store import PortfolioStore
+    from utils.snapshot import SNAPSHOT_DIR, save_snapshot, score_with_snapshot, snapshot_key
+
+    report(0.1, "读取文件")
+    df, file_type, quality = load_file(payload["input_path"], file_name=payload.get("file_name"), quality=True)
+    report(0.4, f"评分中（{len(df)} 条）")
+    as_of = date.fromisoformat(payload["as_of"])
+    scored, meta = score_with_snapshot(df, file_type, as_of=as_of)
+
+    report(0.9, "保存结果")
+    key = snapshot_key(meta["input_hash"], as_of, meta["rules_version"])
+    if not os.path.exists(os.path.join(SNAPSHOT_DIR, f"{key}.parquet")):
+        # score_with_snapshot 写快照失败时只打印警告，这里必须保证结果可读
+        save_snapshot(key, scored, meta)
+    # 按月份 / 手别追加到组合历史库，供多月趋势视图使用
+    store_path = PortfolioStore().append(scored, payload.get("file_name") or payload["input_path"], meta)
+    return {"snapshot_key": key, "meta": meta, "quality": quality, "store_path": store_path}
+
+
+@register_handler("sketch")
+def run_sketch_job(payload: dict, report) -> dict:
+    """
+    组合摘要任务：多个文件逐块评分累加为 PortfolioSketch（上传文件由 run_next 在任务结束后删除）
+    payload: input_paths 输入文件, file_names 原始文件名（判断在案 / 前催）, as_of 基准日(ISO)
+    result: sketch_path 摘要文件, rows 汇总行数
+    """
+    from datetime import date
+
+    from utils.file_loader import detect_file_type
+    from utils.sketch import PortfolioSketch, build_sketch, iter_file_chunks
+
+    paths, names = payload["input_paths"], payload.get("file_names") or payload["input_paths"]
+    as_of = date.fromisoformat(payload["as_of"])
+    sketch = PortfolioSketch()
+    for i, (path, name) in enumerate(zip(paths, names)):
+        report(i / len(paths), f"统计第 {i + 1}/{len(paths)} 个文件：{os.path.basename(name)}")
+        sketch.merge(build_sketch(iter_file_chunks(path), detect_file_type(os.path.basename(name)), as_of=as_of))
+
+    os.makedirs(SKETCH_DIR, exist_ok=True)
+    sketch_path = os.path.join(SKETCH_DIR, f"{uuid.uuid4().hex}.pkl")
+    sketch.save(sketch_path)
+    return {"sketch_path": sketch_path, "rows": sketch.rows}
+
+
+@register_handler("qwen")
+def run_qwen_job(payload: dict, report) -> dict:
+    """
+    Qwen 话术任务
+    payload: profiles 用户画像记录(list[dict]), model, session_id；api_key 通过 secrets 传入
+    result: text 生成内容, usage 该会话在所有 worker 中的累计用量
+    """
+    import pandas as pd
+
+    from utils.qwen_client import get_client
+    from utils.qwen_helper import analyze_with_qwen
+
+    report(0.2, "调用 Qwen 中")
+    session_id = payload.get("session_id")
+    text = analyze_with_qwen(pd.DataFrame(payload["profiles"]), payload["api_key"],
+                             payload.get("model", "qwen-plus"), session_id=session_id)
+    return {"text": text, "usage": get_client(payload["api_key"]).usage_for(session_id)}
@@ -0,0 +1,23 @@
+import os
+import sys
+
+APP_NAME = "profile_analysis"
+
+
+def default_data_dir() -> str:
+    """
+    运行期数据（任务队列、评分快照、组合库、DuckDB 缓存）的根目录，必须可写：
+      - 环境变量 PROFILE_DATA_DIR 指定时使用该目录；
+      - 打包版安装目录可能只读，使用 %LOCALAPPDATA%\\profile_analysis（Windows）或 ~/.profile_analysis；
+      - 源码运行时为项目根目录（与此前一致，已有快照 / 组合库继续可用）。
+    """
+    if os.environ.get("PROFILE_DATA_DIR"):
+        return os.path.abspath(os.environ["PROFILE_DATA_DIR"])
+    if getattr(sys, "frozen", False):
+        if os.environ.get("LOCALAPPDATA"):
+            return os.path.join(os.environ["LOCALAPPDATA"], APP_NAME)
+        return os.path.join(os.path.expanduser("~"), f".{APP_NAME}")
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+DATA_DIR = default_data_dir()
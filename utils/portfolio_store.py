@@ -0,0 +1,180 @@
+import os
+import re
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+from utils import compute
+from utils.paths import DATA_DIR
+
+# 组合时间序列库（数据目录下的 .portfolio），按 月份 / 手别 分区，只追加不修改：
+#   .portfolio/month=2024-06/手别=三手/run-<输入哈希>-<基准日>-<规则版本>.parquet
+STORE_DIR = os.path.join(DATA_DIR, ".portfolio")
+HANDS = ["一手", "二手", "三手", "四手", "M3"]
+UNKNOWN_HAND = "未知"
+
+# 入库列（固定类型，保证各月份文件 schema 一致，读取时可直接按列 / 分区裁剪）
+# 趋势视图只用组合级统计，不入库证件号等个人身份信息
+STORE_COLUMNS = {
+    "总评分": "float64",
+    "地区一致性得分": "float64",
+    "欠款占比得分": "float64",
+    "地区得分": "float64",
+    "逾期得分": "float64",
+    "年龄得分": "float64",
+    "父母联系人得分": "float64",
+    "评分依据码": "Int32",
+    "risk_prob": "float64",
+    "本金": "float64",
+    "当期账单金额": "float64",
+    "总欠款": "float64",
+    "逾期天数": "float64",
+    "年龄": "float64",
+    "逾期期数数值": "float64",
+    "还款模式": "string",
+    "风险等级": "string",
+}
+
+
+def parse_partition(file_name: str, as_of: date = None):
+    """
+    由文件名识别 (月份, 手别)，如 "2406三手.xlsx" -> ("2024-06", "三手")；
+    文件名中没有 YYMM 时按评分基准日的月份
+    """
+    name = os.path.basename(str(file_name))
+    match = re.search(r"(?<!\d)(\d{2})(0[1-9]|1[0-2])(?!\d)", name)
+    if match:
+        month = f"20{match.group(1)}-{match.group(2)}"
+    else:
+        month = (as_of or date.today()).strftime("%Y-%m")
+    hand = next((h for h in HANDS if h in name), UNKNOWN_HAND)
+    return month, hand
+
+
+def _store_frame(scored: pd.DataFrame, meta: dict, run_id: str) -> pd.DataFrame:
+    """评分结果 -> 入库列（缺失的列补空值，还款模式 / 风险等级在入库时算好）"""
+    derived = {}
+    computed = {"还款模式": lambda: compute.payment_pattern(scored, derived=derived),
+                "风险等级": lambda: compute.risk_level(scored, derived)}
+    frame = pd.DataFrame(index=scored.index)
+    for col, dtype in STORE_COLUMNS.items():
+        values = computed[col]() if col in computed else scored.get(col)
+        if values is None:
+            frame[col] = pd.Series(pd.NA, index=scored.index, dtype=dtype)
+        elif dtype == "string":
+            frame[col] = pd.Series(values, index=scored.index).astype(object).astype("string")
+        else:
+            frame[col] = pd.to_numeric(values, errors="coerce").astype(dtype)
+    frame["file_type"] = pd.Series(meta.get("file_type"), index=scored.index, dtype="string")
+    frame["run_id"] = pd.Series(run_id, index=scored.index, dtype="string")
+    frame["scored_at"] = time.time()
+    return frame.reset_index(drop=True)
+
+
+class PortfolioStore:
+    """
+    按月份 / 手别分区的列式评分历史库（Parquet + hive 分区目录）。
+    每次评分追加一个文件（同一输入 + 基准日 + 规则版本只写一次）；
+    读取时只加载需要的列和分区，多个月的趋势图不需要重新解析 Excel。
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def append(self, scored: pd.DataFrame, file_name: str, meta: dict) -> str:
+        """写入一次评分结果，返回文件路径（已存在时直接返回，不重复写入）"""
+        as_of = date.fromisoformat(meta["as_of"]) if meta.get("as_of") else None
+        month, hand = parse_partition(file_name, as_of)
+        run_id = f"{meta['input_hash'][:16]}-{meta['as_of']}-{meta['rules_version']}"
+        part_dir = os.path.join(self.root, f"month={month}", f"手别={hand}")
+        path = os.path.join(part_dir, f"run-{run_id}.parquet")
+        if os.path.exists(path):
+            return path
+
+        os.makedirs(part_dir, exist_ok=True)
+        # 临时文件以 "." 开头，数据集扫描时自动忽略；文件名唯一，并发写入同一分区互不覆盖
+        fd, tmp_path = tempfile.mkstemp(dir=part_dir, prefix=f".run-{run_id}.", suffix=".parquet.tmp")
+        os.close(fd)
+        try:
+            _store_frame(scored, meta, run_id).to_parquet(tmp_path, index=False, compression="zstd")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def _dataset(self):
+        import pyarrow.dataset as ds
+
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(self.root, format="parquet", partitioning="hive")
+
+    def partitions(self) -> pd.DataFrame:
+        """已入库的分区（只读目录，不读数据；.DS_Store、残留临时文件等非分区目录的条目跳过）"""
+        rows = []
+        if os.path.isdir(self.root):
+            for month_dir in sorted(os.listdir(self.root)):
+                month_path = os.path.join(self.root, month_dir)
+                if not re.fullmatch(r"month=\d{4}-(0[1-9]|1[0-2])", month_dir) or not os.path.isdir(month_path):
+                    continue
+                for hand_dir in sorted(os.listdir(month_path)):
+                    hand_path = os.path.join(month_path, hand_dir)
+                    prefix, _, hand = hand_dir.partition("=")
+                    # 手别须是 parse_partition 能识别出的取值（含"未知"）
+                    if prefix != "手别" or parse_partition(hand)[1] != hand or not os.path.isdir(hand_path):
+                        continue
+                    files = [f for f in os.listdir(hand_path) if f.endswith(".parquet") and not f.startswith(".")]
+                    rows.append({"month": month_dir[6:], "手别": hand, "runs": len(files)})
+        return pd.DataFrame(rows, columns=["month", "手别", "runs"])
+
+    def read(self, columns: list, months: list = None, hands: list = None, latest_only: bool = True) -> pd.DataFrame:
+        """
+        读取指定列（分区过滤下推，只打开命中的文件、只解码需要的列）
+        :param latest_only: 同一月份 / 手别有多次评分时只保留最新一次
+        """
+        import pyarrow.dataset as ds
+
+        dataset = self._dataset()
+        wanted = list(dict.fromkeys(["month", "手别"] + list(columns) + (["run_id", "scored_at"] if latest_only else [])))
+        if dataset is None:
+            return pd.DataFrame(columns=wanted)
+
+        condition = None
+        if months:
+            condition = ds.field("month").isin(list(months))
+        if hands:
+            hand_cond = ds.field("手别").isin(list(hands))
+            condition = hand_cond if condition is None else condition & hand_cond
+        df = dataset.to_table(columns=wanted, filter=condition).to_pandas()
+
+        if latest_only and len(df):
+            latest = df.groupby(["month", "手别"], observed=True)["scored_at"].transform("max")
+            df = df[df["scored_at"] == latest].drop(columns=["run_id", "scored_at"])
+        for col in ("month", "手别"):
+            df[col] = df[col].astype(str)
+        return df.reset_index(drop=True)
+
+
+def ingest_files(paths, as_of: date = None, store: PortfolioStore = None) -> list:
+    """历史月份文件批量评分入库（已入库的输入直接跳过写入）"""
+    from utils.file_loader import load_file
+    from utils.snapshot import score_with_snapshot
+
+    store = store or PortfolioStore()
+    written = []
+    for path in paths:
+        df, file_type = load_file(path)
+        scored, meta = score_with_snapshot(df, file_type, as_of=as_of)
+        written.append(store.append(scored, path, meta))
+    return written
+
+
+if __name__ == "__main__":
+    import sys
+
+    for p in ingest_files(sys.argv[1:]):
+        print(f"已入库 {p}")
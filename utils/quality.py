@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from utils.reference_data import load_region_map
+
+# 各评分规则依赖的列：缺列时该规则整体跳过（得分为 0 或默认值）
+RULE_COLUMNS = {
+    "地区一致性得分": ["证件号", "账单地址"],
+    "欠款占比得分": ["本金", "当期账单金额"],
+    "地区得分": ["证件号"],
+    "逾期得分": ["逾期期数"],
+    "年龄得分": ["证件号"],
+}
+# 金额类列：不应为负数
+AMOUNT_COLUMNS = [
+    "本金", "当期账单金额", "总欠款", "最新欠款", "应收利息", "应收费用", "违约金", "滞纳金",
+    "取现手续费", "现金分期手续费", "账单分期手续费", "年费",
+]
+ID_WEIGHTS = np.array([7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2], dtype=np.int64)
+ID_CHECK_CODES = np.frombuffer(b"10X98765432", dtype=np.uint8)
+
+
+def _check(name: str, count: int, rows: int, impact: str) -> dict:
+    return {"检查项": name, "问题行数": int(count), "占比(%)": round(count / max(rows, 1) * 100, 2), "影响": impact}
+
+
+def _id_checks(ids: pd.Series, rows: int) -> list:
+    """证件号：缺失、格式、校验位、出生日期、地区码（全部为向量化检查）"""
+    # Arrow 字符串：strip / upper / 正则在 C++ 中批量执行
+    ids = ids.astype("string[pyarrow]").str.strip().str.upper()
+    present = ids.notna() & (ids != "")
+    well_formed = ids.str.fullmatch(r"[0-9]{17}[0-9X]").fillna(False).astype(bool) & present
+    checks = [
+        _check("证件号缺失", (~present).sum(), rows, "地区、城市、年龄规则按缺失处理（城市默认 5 分）"),
+        _check("证件号格式错误", (present & ~well_formed).sum(), rows, "地区 / 年龄可能解析错误"),
+    ]
+
+    valid = ids[well_formed]
+    if len(valid):
+        # 18 位证件号拼成一个字节矩阵，按列做加权求和
+        raw = np.frombuffer("".join(valid.tolist()).encode("ascii"), dtype=np.uint8).reshape(-1, 18)
+        digits = raw[:, :17].astype(np.int64) - 48
+        bad_checksum = int((ID_CHECK_CODES[(digits @ ID_WEIGHTS) % 11] != raw[:, 17]).sum())
+        birth = pd.to_datetime(pd.DataFrame({
+            "year": digits[:, 6:10] @ [1000, 100, 10, 1],
+            "month": digits[:, 10:12] @ [10, 1],
+            "day": digits[:, 12:14] @ [10, 1],
+        }), errors="coerce")
+        bad_birth = int(birth.isna().sum())
+        region_map = load_region_map()
+        region_codes = digits[:, :6] @ [100000, 10000, 1000, 100, 10, 1]
+        known = np.fromiter((int(code) for code in region_map), dtype=np.int64, count=len(region_map))
+        unmapped = int((~np.isin(region_codes, known)).sum()) if region_map else 0
+    else:
+        bad_checksum = bad_birth = unmapped = 0
+    checks += [
+        _check("证件号校验位错误", bad_checksum, rows, "可能是录入错误的证件号"),
+        _check("出生日期无效", bad_birth, rows, "证件号可能录入错误；年龄只按出生年份计算，年份异常时年龄得分为 0"),
+        _check("地区码未收录", unmapped, rows, "身份证地区为空，地区一致性为否、不计入地区分布"),
+    ]
+    return checks
+
+
+def profile_quality(df: pd.DataFrame, normalize_report: dict = None) -> dict:
+    """
+    数据质量检查（在读取 + 列名规范化之后、评分之前执行，对内存中的数据再做一遍向量化扫描，
+    每个检查只读取用到的列；转换失败数由 normalize_columns 在转换时记录，不重复扫描）
+    :param normalize_report: normalize_columns 记录的转换失败数
+    :return: 可 JSON 序列化的 dict：rows / null_rates / missing_columns / skipped_rules / checks /
+             needs_confirmation（含义待确认、未自动映射的列名）
+    """
+    rows = len(df)
+    columns = set(df.columns)
+    null_rates = (df.isna().mean() * 100).round(2) if rows else pd.Series(dtype=float)
+
+    missing = sorted({c for cols in RULE_COLUMNS.values() for c in cols if c not in columns})
+    skipped = [rule for rule, cols in RULE_COLUMNS.items() if any(c not in columns for c in cols)]
+    if not any("关系" in str(c) for c in df.columns):
+        missing.append("联系人关系")
+        skipped.append("父母联系人得分")
+
+    checks = []
+    if "证件号" in columns:
+        checks += _id_checks(df["证件号"], rows)
+
+    if "本金" in columns:
+        principal = df["本金"]
+        checks.append(_check("本金为 0 或缺失", (principal.isna() | (principal == 0)).sum(), rows,
+                             "欠款占比为无穷大或空值，欠款占比得分为 0"))
+    amount_cols = [c for c in AMOUNT_COLUMNS if c in columns and pd.api.types.is_numeric_dtype(df[c])]
+    if amount_cols:
+        negative = df[amount_cols] < 0
+        bad_cols = [c for c in amount_cols if negative[c].any()]
+        checks.append(_check("金额为负数", negative.any(axis=1).sum(), rows,
+                             f"欠款占比 / 欠款构成失真（{'、'.join(bad_cols) or '-'}）"))
+    if "risk_prob" in columns:
+        prob = df["risk_prob"]
+        checks.append(_check("risk_prob 超出 0-1", (prob.notna() & ~prob.between(0, 1)).sum(), rows,
+                             "不计入风险等级"))
+    if "逾期期数" in columns:
+        overdue = df["逾期期数"]
+        unparsed = overdue.notna() & ~overdue.astype("string[pyarrow]").str.upper().str.contains(r"M[0-9]+").fillna(False)
+        checks.append(_check("逾期期数无法解析", unparsed.sum(), rows, "按 M0 处理，逾期得分为 10"))
+
+    for col, n in (normalize_report or {}).get("coerce_failures", {}).items():
+        checks.append(_check(f"{col} 无法转换", n, rows, "按空值处理"))
+
+    return {
+        "rows": rows,
+        "null_rates": {str(k): float(v) for k, v in null_rates.items()},
+        "missing_columns": missing,
+        "skipped_rules": skipped,
+        "checks": checks,
+        "needs_confirmation": dict((normalize_report or {}).get("needs_confirmation", {})),
+    }
+
+
+def quality_issues(report: dict) -> pd.DataFrame:
+    """有问题的检查项（按问题行数降序）"""
+    checks = pd.DataFrame(report.get("checks", []), columns=["检查项", "问题行数", "占比(%)", "影响"])
+    return checks[checks["问题行数"] > 0].sort_values("问题行数", ascending=False).reset_index(drop=True)
@@ -0,0 +1,360 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+# DashScope 文本生成 HTTP 接口（可用环境变量指向代理或本地模拟服务）
+DEFAULT_BASE_URL = os.environ.get("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/api/v1")
+GENERATION_PATH = "/services/aigc/text-generation/generation"
+
+# 默认限额（按账号配额调整）：每分钟请求数 / 每分钟 token 数
+DEFAULT_RPM = int(os.environ.get("QWEN_RPM", 60))
+DEFAULT_TPM = int(os.environ.get("QWEN_TPM", 100_000))
+
+# 可重试的状态码：限流与服务端临时错误
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 未指定输出上限时，TPM 限流按此预估输出 token（只用于预估，不限制实际输出长度）
+OUTPUT_TOKEN_ESTIMATE = 1500
+# 进程内最多缓存的客户端数（按 API Key 哈希，LRU 淘汰）
+CLIENT_CACHE_SIZE = int(os.environ.get("QWEN_CLIENT_CACHE", 8))
+
+# 多进程共享限流 / 用量的 SQLite 库（任务队列 worker 中指向任务库）；为空时只在本进程内限流
+STATE_DB_ENV = "QWEN_STATE_DB"
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qwen_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS qwen_usage (
+    session_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (session_id, metric)
+);
+"""
+
+
+class TokenBucket:
+    """
+    令牌桶限流：容量 capacity，每分钟补充 rate_per_minute 个令牌。
+    acquire 不足时阻塞等待；refund / charge 用于按实际 token 用量修正预估值。
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """取出 amount 个令牌，返回等待的秒数（单次请求超过容量时按容量计）"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def charge(self, amount: float):
+        """补扣（实际用量大于预估时），令牌可以为负，后续请求相应等待"""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+    def refund(self, amount: float):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@contextmanager
+def _shared_db(db_path: str):
+    con = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+def _init_shared_db(db_path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    with _shared_db(db_path) as con:
+        con.executescript(SHARED_SCHEMA)
+
+
+class SharedTokenBucket:
+    """
+    跨进程令牌桶：状态保存在 SQLite（qwen_buckets 表），多个 worker 进程共用同一份 RPM / TPM 额度。
+    接口与 TokenBucket 一致；时间使用 time.time()（各进程可比）。
+    """
+
+    def __init__(self, db_path: str, name: str, rate_per_minute: float, capacity: float = None):
+        self.db_path = db_path
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        _init_shared_db(db_path)
+
+    def _update(self, delta: float = 0.0, need: float = None) -> float:
+        """
+        事务内补充令牌后加减 delta；need 不为空时只在令牌足够时扣除 need。
+        返回还需等待的秒数（0 表示成功）
+        """
+        with _shared_db(self.db_path) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = con.execute("SELECT tokens, updated FROM qwen_buckets WHERE name = ?", (self.name,)).fetchone()
+                tokens = self.capacity if row is None else min(self.capacity, row[0] + max(now - row[1], 0) * self.rate)
+                wait = 0.0
+                if need is not None:
+                    if tokens >= need:
+                        tokens -= need
+                    else:
+                        wait = (need - tokens) / self.rate
+                tokens = min(self.capacity, tokens + delta) if delta > 0 else tokens + delta
+                con.execute("INSERT OR REPLACE INTO qwen_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                            (self.name, tokens, now))
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        return wait
+
+    def acquire(self, amount: float = 1) -> float:
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            wait = self._update(need=amount)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def charge(self, amount: float):
+        self._update(delta=-amount)
+
+    def refund(self, amount: float):
+        self._update(delta=amount)
+
+
+class UsageCounter:
+    """按会话累计用量（进程内）"""
+
+    def __init__(self):
+        self.usage = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def add(self, session_id, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                self.usage[session_id][key] += value
+
+    def get(self, session_id) -> dict:
+        with self.lock:
+            return dict(self.usage.get(session_id, {}))
+
+
+class SharedUsageCounter:
+    """按会话累计用量（SQLite qwen_usage 表，所有 worker 进程汇总）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        _init_shared_db(db_path)
+
+    def add(self, session_id, **counts):
+        now = time.time()
+        with _shared_db(self.db_path) as con:
+            con.executemany(
+                "INSERT INTO qwen_usage (session_id, metric, value, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id, metric) DO UPDATE SET value = value + excluded.value, updated = excluded.updated",
+                [(session_id or "", key, int(value), now) for key, value in counts.items()]
+            )
+
+    def get(self, session_id) -> dict:
+        with _shared_db(self.db_path) as con:
+            rows = con.execute("SELECT metric, value FROM qwen_usage WHERE session_id = ?", (session_id or "",))
+            return {metric: value for metric, value in rows}
+
+
+def prune_usage(db_path: str, ttl_seconds: float) -> int:
+    """删除超过保留时间未更新的会话用量"""
+    if not os.path.exists(db_path):
+        return 0
+    with _shared_db(db_path) as con:
+        con.executescript(SHARED_SCHEMA)
+        return con.execute("DELETE FROM qwen_usage WHERE updated < ?", (time.time() - ttl_seconds,)).rowcount
+
+
+class QwenError(Exception):
+    """Qwen 调用失败（不可重试的错误，或重试次数用尽）"""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class QwenClient:
+    """
+    单个 API Key 的 Qwen 客户端：
+    - 复用 HTTP 连接（requests.Session），API Key 只放在本客户端的请求头里，不设置任何全局状态
+    - 请求数 / token 数两个令牌桶限流（RPM / TPM）；指定 state_db（或环境变量 QWEN_STATE_DB）时
+      令牌桶与用量保存在 SQLite 中，多个 worker 进程共用同一份额度、用量汇总
+    - 429 / 5xx / 超时 / 连接错误有限次重试，指数退避 + 随机抖动，优先遵循 Retry-After
+    - 按会话累计调用次数、token 用量、重试与限流次数
+    """
+
+    def __init__(self, api_key: str, base_url: str = None, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM,
+                 timeout: float = 60, max_retries: int = 4, backoff_base: float = 1.0, backoff_cap: float = 30.0,
+                 state_db: str = None):
+        import requests  # 仅在真正调用 Qwen 时加载
+
+        self.api_key = api_key
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.state_db = state_db or os.environ.get(STATE_DB_ENV) or None
+        if self.state_db:
+            # 限额按 API Key 计（库中只保存 Key 的哈希）
+            key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+            self.request_bucket = SharedTokenBucket(self.state_db, f"{key_id}:rpm", rpm)
+            self.token_bucket = SharedTokenBucket(self.state_db, f"{key_id}:tpm", tpm)
+            self.usage = SharedUsageCounter(self.state_db)
+        else:
+            self.request_bucket = TokenBucket(rpm)
+            self.token_bucket = TokenBucket(tpm)
+            self.usage = UsageCounter()
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+        self._requests = requests
+
+    @staticmethod
+    def estimate_tokens(prompt: str, output_tokens: int = None) -> int:
+        """预估 token：中文约 1 字 1 token（偏保守），加上预计输出 token"""
+        return len(prompt) + (output_tokens or OUTPUT_TOKEN_ESTIMATE)
+
+    def _record(self, session_id, **counts):
+        self.usage.add(session_id, **counts)
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_cap)
+            except ValueError:
+                pass
+        # full jitter：[0, min(cap, base * 2^attempt)] 内均匀取值，避免多个 worker 同时重试
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def generate(self, prompt: str, model: str = "qwen-plus", session_id: str = None,
+                 max_tokens: int = None, expected_output_tokens: int = None, **parameters) -> dict:
+        """
+        调用文本生成，返回 {"text", "input_tokens", "output_tokens", "request_id"}
+        失败（不可重试或重试用尽）时抛出 QwenError
+        :param max_tokens: 输出上限，只有调用方指定时才发送（默认不截断输出）
+        :param expected_output_tokens: 预计输出 token，只用于 TPM 限流预估（实际用量返回后修正）
+        """
+        if max_tokens is not None:
+            parameters["max_tokens"] = max_tokens
+        body = {
+            "model": model,
+            "input": {"prompt": prompt},
+            "parameters": parameters,
+        }
+        estimate = self.estimate_tokens(prompt, max_tokens or expected_output_tokens)
+        url = self.base_url + GENERATION_PATH
+
+        for attempt in range(self.max_retries + 1):
+            waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(estimate)
+            self._record(session_id, requests=1, wait_ms=int(waited * 1000))
+            try:
+                resp = self.session.post(url, json=body, timeout=self.timeout)
+            except (self._requests.Timeout, self._requests.ConnectionError) as e:
+                self.token_bucket.refund(estimate)
+                if attempt == self.max_retries:
+                    self._record(session_id, failures=1)
+                    raise QwenError(0, type(e).__name__, str(e)) from e
+                self._record(session_id, retries=1)
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if resp.status_code == 200:
+                data = resp.json()
+                usage = data.get("usage", {})
+                used = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                # 按实际用量修正 TPM 令牌桶
+                if used and used < estimate:
+                    self.token_bucket.refund(estimate - used)
+                elif used > estimate:
+                    self.token_bucket.charge(used - estimate)
+                self._record(session_id, input_tokens=usage.get("input_tokens", 0),
+                             output_tokens=usage.get("output_tokens", 0))
+                return {
+                    "text": data.get("output", {}).get("text", ""),
+                    "input_tokens": usage.get("input_tokens", 0),
+                    "output_tokens": usage.get("output_tokens", 0),
+                    "request_id": data.get("request_id"),
+                }
+
+            self.token_bucket.refund(estimate)
+            try:
+                err = resp.json()
+            except ValueError:
+                err = {}
+            error = QwenError(resp.status_code, err.get("code", ""), err.get("message", resp.text[:200]))
+            if resp.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                self._record(session_id, failures=1)
+                raise error
+            self._record(session_id, retries=1, throttled=int(resp.status_code == 429))
+            time.sleep(self._backoff(attempt, resp.headers.get("Retry-After")))
+
+    def usage_for(self, session_id: str = None) -> dict:
+        return self.usage.get(session_id)
+
+
+# API Key 哈希 -> 客户端（同一进程内按 Key 复用连接和限流状态；不以 Key 明文为键，数量有上限）
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def _client_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def get_client(api_key: str, **kwargs) -> QwenClient:
+    """按 API Key 取共享客户端（同一 Key 的所有会话共用一套限额），超出 CLIENT_CACHE_SIZE 时淘汰最久未用的"""
+    key = _client_key(api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = QwenClient(api_key, **kwargs)
+            while len(_clients) > CLIENT_CACHE_SIZE:
+                # 只移出缓存，不关闭连接：其他线程可能仍在使用被淘汰的客户端
+                _clients.popitem(last=False)
+        _clients.move_to_end(key)
+        return client
@@ -1,24 +1,21 @@
 # utils/qwen_helper.py
-import dashscope
 import pandas as pd
-from http import HTTPStatus
 
-def analyze_with_qwen(user_profiles: pd.DataFrame, api_key: str, model: str = "qwen-plus") -> str:
-    """
-    调用 Qwen 分析客户画像并生成逐用户催收话术。
-    :param user_profiles: DataFrame (TOP N用户画像)
-    :param api_key: Qwen API Key
-    :param model: Qwen 模型 (默认 qwen-plus)
-    """
-    dashscope.api_key = api_key
+from utils.qwen_client import QwenError, get_client
+
+# 每位客户预计输出的 token 数（只用于限流预估，不限制输出长度）
+OUTPUT_TOKENS_PER_PROFILE = 300
+
 
-    # 把前20行用户画像转成文本，带上关键字段
+def build_prompt(user_profiles: pd.DataFrame) -> str:
+    """生成催收话术提示词"""
+    # 把 Top K 用户画像转成文本，带上关键字段
     profiles_text = user_profiles.to_string(index=False)
 
     prompt = f"""
 你是一个资深的催收专家。
 
-下面是20位客户的画像（包含评分、风险等级、还款模式、本金、账单金额、欠款比例等数据）。
+下面是{len(user_profiles)}位客户的画像（包含评分、评分依据、风险等级、还款模式、本金、账单金额、欠款比例等数据）。
 
 请你逐个客户进行分析，并输出以下内容：
 
@@ -47,16 +44,28 @@ def analyze_with_qwen(user_profiles: pd.DataFrame, api_key: str, model: str = "q
 - ...
 ---
 """
+    return prompt
 
-    response = dashscope.Generation.call(
-        model=model,
-        prompt=prompt,
-        top_p=0.8,
-        temperature=0.7
-    )
-
-    if response.status_code == HTTPStatus.OK:
-        return response.output["text"]
-    else:
-        return f"❌ 调用失败: {response.code}, {response.message}"
+
+def analyze_with_qwen(user_profiles: pd.DataFrame, api_key: str, model: str = "qwen-plus",
+                      session_id: str = None) -> str:
+    """
+    调用 Qwen 分析客户画像并生成逐用户催收话术。
+    :param user_profiles: DataFrame (TOP N用户画像)
+    :param api_key: Qwen API Key（只用于该 Key 的共享客户端，不设置全局状态）
+    :param model: Qwen 模型 (默认 qwen-plus)
+    :param session_id: 用量按会话累计，见 get_client(api_key).usage_for(session_id)
+    """
+    try:
+        response = get_client(api_key).generate(
+            build_prompt(user_profiles),
+            model=model,
+            session_id=session_id,
+            expected_output_tokens=OUTPUT_TOKENS_PER_PROFILE * max(len(user_profiles), 1),
+            top_p=0.8,
+            temperature=0.7
+        )
+    except QwenError as e:
+        return f"❌ 调用失败: {e.code}, {e.message}"
+    return response["text"]
 
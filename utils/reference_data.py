@@ -0,0 +1,90 @@
+import os
+import pickle
+from functools import lru_cache
+
+import pandas as pd
+
+# 进程级共享的只读参考数据：所有会话共用同一份，避免每个评分器/分析器各自加载
+
+ID_CARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "id_card.csv")
+# 预编译的参考数据（打包时由 build_reference_blob 生成），存在且不旧于源文件时优先读取
+REFERENCE_BLOB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_data.pkl")
+BLOB_VERSION = 1
+
+# 身份证前四位 -> 城市等级得分
+CITY_SCORE_MAP = {
+    # 一线城市（10分）
+    "1101": 10, "3101": 10, "4401": 10, "4403": 10,
+    # 二线城市（8分）
+    "2101": 8, "3501": 8, "2102": 8, "5301": 8, "2301": 8, "3701": 8, "4406": 8, "2201": 8,
+    "3303": 8, "1301": 8, "4501": 8, "3204": 8, "3505": 8, "3601": 8, "5201": 8, "1401": 8,
+    "3706": 8, "3304": 8, "3206": 8, "3307": 8, "4404": 8, "4413": 8, "3203": 8, "4601": 8,
+    "6501": 8, "3306": 8, "4420": 8, "3310": 8, "6201": 8, "3707": 8, "5101": 8, "3301": 8,
+    "3201": 8, "4201": 8, "3205": 8, "5001": 8, "1201": 8, "4301": 8, "3702": 8, "3302": 8,
+    "3202": 8, "6101": 8, "4101": 8, "3401": 8, "3502": 8, "4419": 8,
+    # 三线 + 四线城市（统一 5分）
+    "1306": 5, "3211": 5, "3210": 5, "4503": 5, "1302": 5, "4602": 5, "3305": 5, "1501": 5,
+    "1310": 5, "4103": 5, "3710": 5, "3209": 5, "3713": 5, "4407": 5, "4405": 5, "3212": 5,
+    "3506": 5, "1304": 5, "3708": 5, "3402": 5, "3703": 5, "6401": 5, "4502": 5, "5107": 5,
+    "4408": 5, "2103": 5, "3607": 5, "2306": 5, "4205": 5, "1502": 5, "6104": 5, "1303": 5,
+    "4302": 5, "3503": 5, "2202": 5, "3208": 5, "4412": 5, "3509": 5, "4304": 5, "3507": 5,
+    "3207": 5, "2106": 5, "5307": 5, "4452": 5, "2224": 5, "3309": 5, "3604": 5, "3508": 5,
+    "1309": 5, "2104": 5, "4206": 5, "3611": 5, "2108": 5, "3504": 5, "3403": 5, "3311": 5,
+    "4306": 5, "4418": 5, "4210": 5, "3709": 5, "3308": 5, "2111": 5, "3705": 5, "4113": 5,
+    "3405": 5, "5113": 5, "6301": 5, "4209": 5, "2302": 5, "5115": 5, "5111": 5, "4303": 5,
+    "5203": 5, "3213": 5, "4107": 5, "4115": 5, "3411": 5, "2107": 5, "4451": 5, "4211": 5,
+    "4102": 5, "5106": 5, "3714": 5, "4414": 5, "1506": 5, "1305": 5, "4409": 5, "5329": 5,
+    "4402": 5, "4114": 5, "3408": 5, "4202": 5, "3415": 5, "4509": 5, "3609": 5, "4505": 5,
+    "2310": 5, "1307": 5, "4504": 5, "3711": 5, "4212": 5, "4307": 5, "2308": 5, "5325": 5,
+    "5226": 5, "4417": 5, "1407": 5, "6105": 5, "1507": 5, "4228": 5, "4416": 5, "4310": 5,
+    "3412": 5, "3715": 5, "1402": 5, "6103": 5, "4110": 5, "1504": 5, "1408": 5, "4105": 5,
+    "1410": 5, "3418": 5, "5303": 5, "5328": 5, "4305": 5, "2114": 5, "4104": 5, "2110": 5,
+    "3717": 5, "2105": 5, "4117": 5, "4415": 5, "4108": 5, "3410": 5, "4312": 5, "2203": 5,
+    "6108": 5, "4203": 5, "3716": 5, "3610": 5, "3404": 5, "4116": 5, "5227": 5, "5105": 5,
+    "5304": 5, "5114": 5, "2205": 5, "3413": 5, "3704": 5, "5110": 5, "5109": 5, "3608": 5,
+    "1505": 5, "3602": 5, "2109": 5, "5118": 5, "2112": 5, "1308": 5, "4313": 5
+}
+
+
+def _read_region_csv(id_file: str) -> dict:
+    return pd.read_csv(id_file, dtype=str).set_index("number")["name"].to_dict()
+
+
+def _load_blob(blob_file: str = REFERENCE_BLOB, source: str = ID_CARD_FILE):
+    """读取预编译参考数据；不存在、版本不符或比源文件旧时返回 None"""
+    if not os.path.exists(blob_file):
+        return None
+    if os.path.exists(source) and os.path.getmtime(blob_file) < os.path.getmtime(source):
+        return None
+    with open(blob_file, "rb") as f:
+        blob = pickle.load(f)
+    return blob if blob.get("version") == BLOB_VERSION else None
+
+
+def build_reference_blob(blob_file: str = REFERENCE_BLOB, id_file: str = ID_CARD_FILE) -> str:
+    """预编译参考数据：地区码表，启动时免去 CSV 解析（打包前执行）；城市等级表在源码中，无需预编译"""
+    blob = {
+        "version": BLOB_VERSION,
+        "region_map": _read_region_csv(id_file),
+    }
+    tmp_path = blob_file + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(blob, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, blob_file)
+    return blob_file
+
+
+@lru_cache(maxsize=None)
+def load_region_map(id_file: str = ID_CARD_FILE) -> dict:
+    """加载身份证前6位 -> 地区名称映射（每个文件每进程只读取一次，调用方不得修改）"""
+    if id_file == ID_CARD_FILE:
+        blob = _load_blob()
+        if blob is not None:
+            return blob["region_map"]
+    if not os.path.exists(id_file):
+        return {}
+    return _read_region_csv(id_file)
+
+
+if __name__ == "__main__":
+    print(f"已生成 {build_reference_blob()}")
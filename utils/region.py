@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from utils.reference_data import load_region_map
+
+# 层级 -> 行政区划码的截断粒度（身份证前6位：省2位 + 市2位 + 区县2位）
+LEVEL_UNITS = {"province": 10000, "city": 100, "county": 1}
+LEVEL_NAMES = {"province": "省", "city": "市", "county": "区县"}
+
+
+class RegionRollup:
+    """
+    地区分布预计算：证件号前6位转为整数码，一次性统计区县 / 市 / 省三级人数。
+    之后任意 Top N、升降序、逐级下钻都只是对计数数组的切片，不再访问明细数据。
+    """
+
+    def __init__(self, id_numbers: pd.Series, id_map: dict = None):
+        self.id_map = id_map if id_map is not None else load_region_map()
+
+        codes = pd.to_numeric(id_numbers.astype("string").str[:6], errors="coerce")
+        valid = codes.between(110000, 999999)
+        codes = codes[valid].to_numpy(dtype=np.int64)
+        self.total = int(len(id_numbers))
+        self.unparsed = int(self.total - len(codes))
+
+        # 区县级：紧凑编号后 bincount；市 / 省级由区县计数向上汇总
+        self.codes, self.counts, self.mapped = {}, {}, {}
+        county, inverse = np.unique(codes, return_inverse=True)
+        county_counts = np.bincount(inverse, minlength=len(county))
+        for level, unit in LEVEL_UNITS.items():
+            level_codes, level_inverse = np.unique(county // unit * unit, return_inverse=True)
+            self.codes[level] = level_codes
+            self.counts[level] = np.bincount(level_inverse, weights=county_counts, minlength=len(level_codes)).astype(np.int64)
+            self.mapped[level] = np.array([f"{c:06d}" in self.id_map for c in level_codes], dtype=bool)
+
+    def name(self, code: int) -> str:
+        """行政区划码 -> 名称（码表未收录时返回码本身）"""
+        return self.id_map.get(f"{int(code):06d}", f"{int(code):06d}")
+
+    def _select(self, level: str, parent: int = None, mapped_only: bool = False):
+        codes, counts = self.codes[level], self.counts[level]
+        mask = np.ones(len(codes), dtype=bool)
+        if parent is not None:
+            parent_unit = LEVEL_UNITS["province"] if parent % LEVEL_UNITS["province"] == 0 else LEVEL_UNITS["city"]
+            mask &= codes // parent_unit * parent_unit == parent
+        if mapped_only:
+            mask &= self.mapped[level]
+        return codes[mask], counts[mask]
+
+    def top(self, level: str = "county", n: int = 10, ascending: bool = False, parent: int = None,
+            mapped_only: bool = True) -> pd.Series:
+        """
+        某一层级的 Top N 地区人数（按名称索引）
+        码表中同一地区有多个编码（行政区划调整后重新编号），按名称合并计数，与按名称 value_counts 口径一致
+        :param parent: 只统计该省 / 市下属的地区（行政区划码，如 440000 / 440300）
+        :param mapped_only: 只统计码表中能解析出名称的地区
+        """
+        codes, counts = self._select(level, parent, mapped_only)
+        by_name = pd.Series(counts, index=[self.name(c) for c in codes]).groupby(level=0, sort=False).sum()
+        order = np.argsort(by_name.to_numpy() if ascending else -by_name.to_numpy(), kind="stable")[:n]
+        return by_name.iloc[order].rename("count")
+
+    def children(self, level: str, parent: int = None) -> pd.Series:
+        """下钻用：某层级（可限定上级）的全部地区人数，按人数降序，索引为行政区划码"""
+        codes, counts = self._select(level, parent)
+        order = np.argsort(-counts, kind="stable")
+        return pd.Series(counts[order], index=codes[order], name="count")
@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+TOTAL_COL = "总评分"
+STATUS_BOTH, STATUS_NEW, STATUS_GONE = "两期均有", "本期新增", "本期移出"
+
+
+def score_columns(df: pd.DataFrame) -> list:
+    """各规则得分列（与 run_scoring 汇总口径一致）"""
+    return [c for c in df.columns if c.endswith("得分")]
+
+
+def load_scored(source, key: str = "证件号") -> pd.DataFrame:
+    """读取导出的评分结果（parquet / csv / xlsx），主键列按文本读取"""
+    ext = os.path.splitext(str(getattr(source, "name", source)))[1].lower()
+    if ext == ".parquet":
+        df = pd.read_parquet(source)
+    elif ext == ".csv":
+        df = pd.read_csv(source, dtype={key: str})
+    else:
+        df = pd.read_excel(source, dtype={key: str})
+    if key in df.columns:
+        df[key] = df[key].astype("string")
+    return df
+
+
+def _take(values: np.ndarray, pos: np.ndarray, mask: np.ndarray, fill) -> np.ndarray:
+    """按行号取值，mask 为 False（该期没有这个主键，行号为 -1）的位置填 fill，不对 -1 取下标"""
+    out = np.full(len(pos), fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+    out[mask] = values[pos[mask]]
+    return out
+
+
+def _ranks(total: np.ndarray) -> np.ndarray:
+    """总评分降序名次（1 起，同分按原顺序）"""
+    order = np.argsort(-total, kind="stable")
+    ranks = np.empty(len(total), dtype=np.int64)
+    ranks[order] = np.arange(1, len(total) + 1)
+    return ranks
+
+
+class RunDiff:
+    """
+    两期评分结果对比：按主键关联，计算排名 / 总评分变化、各规则得分变化，
+    以及进入 / 跌出 Top K 的名单和原因。
+    主键先整体 factorize 成连续整数码（一次哈希），之后的关联都是整数数组下标运算，
+    百万对百万行也只需数秒。同一期内重复的主键只保留排名最高的一条。
+    任一期为空时无法对比，table 为空表（列结构不变）。
+    """
+
+    def __init__(self, prev: pd.DataFrame, curr: pd.DataFrame, key: str = "证件号", top_k: int = 100):
+        for name, df in (("上期", prev), ("本期", curr)):
+            if key not in df.columns or TOTAL_COL not in df.columns:
+                raise ValueError(f"{name}结果缺少 {key} 或 {TOTAL_COL} 列")
+        self.key = key
+        self.top_k = top_k
+        self.rules = [c for c in score_columns(curr) if c in set(score_columns(prev))]
+
+        # ------------------- 主键整数化 + 关联 -------------------
+        codes, uniques = pd.factorize(pd.concat([prev[key], curr[key]], ignore_index=True).astype("string"))
+        prev_codes, curr_codes = codes[:len(prev)], codes[len(prev):]
+        prev_rank = _ranks(prev[TOTAL_COL].to_numpy(dtype=float))
+        curr_rank = _ranks(curr[TOTAL_COL].to_numpy(dtype=float))
+
+        # 主键码 -> 行号（重复主键保留名次最好的行；空主键码为 -1，不参与关联）
+        n_keys = len(uniques)
+        prev_pos = self._positions(prev_codes, prev_rank, n_keys)
+        curr_pos = self._positions(curr_codes, curr_rank, n_keys)
+        present = (prev_pos >= 0) | (curr_pos >= 0)
+        key_ids = np.flatnonzero(present)
+        if len(prev) == 0 or len(curr) == 0:
+            key_ids = key_ids[:0]
+        p, c = prev_pos[key_ids], curr_pos[key_ids]
+        in_prev, in_curr = p >= 0, c >= 0
+
+        table = pd.DataFrame({key: uniques[key_ids]})
+        table["状态"] = np.select([in_prev & in_curr, in_curr], [STATUS_BOTH, STATUS_NEW], default=STATUS_GONE)
+        before_rank = _take(prev_rank, p, in_prev, 0)
+        after_rank = _take(curr_rank, c, in_curr, 0)
+        table["上期排名"] = pd.Series(before_rank, dtype="Int64").where(in_prev)
+        table["本期排名"] = pd.Series(after_rank, dtype="Int64").where(in_curr)
+        # 正数表示名次上升
+        table["排名变化"] = table["上期排名"] - table["本期排名"]
+
+        for col in [TOTAL_COL] + self.rules:
+            before = _take(prev[col].to_numpy(dtype=float), p, in_prev, np.nan)
+            after = _take(curr[col].to_numpy(dtype=float), c, in_curr, np.nan)
+            if col == TOTAL_COL:
+                table["上期总评分"], table["本期总评分"] = before, after
+            table[f"{col}变化"] = after - before
+
+        table["上期TopK"] = in_prev & (before_rank <= top_k)
+        table["本期TopK"] = in_curr & (after_rank <= top_k)
+        table["主要原因"] = self._main_reason(table)
+        self.table = table
+
+    @staticmethod
+    def _positions(codes: np.ndarray, ranks: np.ndarray, n_keys: int) -> np.ndarray:
+        pos = np.full(n_keys, -1, dtype=np.int64)
+        valid = np.flatnonzero(codes >= 0)
+        # 按名次倒序写入，名次最好的行最后写入、覆盖重复主键
+        valid = valid[np.argsort(-ranks[valid], kind="stable")]
+        pos[codes[valid]] = valid
+        return pos
+
+    def _main_reason(self, table: pd.DataFrame) -> np.ndarray:
+        """得分变化绝对值最大的规则；两期得分不变时名次变化来自其他客户"""
+        reason = np.select(
+            [table["状态"] == STATUS_NEW, table["状态"] == STATUS_GONE],
+            [STATUS_NEW, STATUS_GONE],
+            default="得分未变（他人排名变化）"
+        ).astype(object)
+        if not self.rules:
+            return reason
+        deltas = np.nan_to_num(table[[f"{r}变化" for r in self.rules]].to_numpy(dtype=float))
+        changed = np.abs(deltas).max(axis=1) > 0
+        top_rule = np.abs(deltas).argmax(axis=1)
+        labels = np.array([r.removesuffix("得分") for r in self.rules], dtype=object)
+        signs = np.where(deltas[np.arange(len(deltas)), top_rule] > 0, "上升", "下降")
+        both = (table["状态"] == STATUS_BOTH).to_numpy() & changed
+        reason[both] = labels[top_rule[both]] + signs[both]
+        return reason
+
+    # ------------------- 结果视图 -------------------
+    def entered(self) -> pd.DataFrame:
+        """本期进入 Top K（上期不在 Top K）"""
+        t = self.table
+        return t[t["本期TopK"] & ~t["上期TopK"]].sort_values("本期排名")
+
+    def left(self) -> pd.DataFrame:
+        """本期跌出 Top K（上期在 Top K）"""
+        t = self.table
+        return t[t["上期TopK"] & ~t["本期TopK"]].sort_values("上期排名")
+
+    def rule_contribution(self) -> pd.DataFrame:
+        """进入 / 跌出 Top K 的客户，各规则得分变化合计（定位是哪条规则带来的变动）"""
+        cols = [f"{r}变化" for r in self.rules]
+        result = pd.DataFrame({
+            "进入TopK": self.entered()[cols].sum(),
+            "跌出TopK": self.left()[cols].sum(),
+            "全部共同客户": self.table.loc[self.table["状态"] == STATUS_BOTH, cols].sum(),
+        })
+        result.index = [c.removesuffix("变化") for c in cols]
+        return result
+
+    def summary(self) -> dict:
+        t = self.table
+        both = t[t["状态"] == STATUS_BOTH]
+        return {
+            "共同客户": int(len(both)),
+            "本期新增": int((t["状态"] == STATUS_NEW).sum()),
+            "本期移出": int((t["状态"] == STATUS_GONE).sum()),
+            "进入TopK": int(len(self.entered())),
+            "跌出TopK": int(len(self.left())),
+            "名次上升": int((both["排名变化"] > 0).sum()),
+            "名次下降": int((both["排名变化"] < 0).sum()),
+            "总评分上升": int((both[f"{TOTAL_COL}变化"] > 0).sum()),
+            "总评分下降": int((both[f"{TOTAL_COL}变化"] < 0).sum()),
+        }
+
+
+def compare_runs(prev: pd.DataFrame, curr: pd.DataFrame, key: str = "证件号", top_k: int = 100) -> RunDiff:
+    """对比两期 CollectionScorer.run_scoring 的输出"""
+    return RunDiff(prev, curr, key=key, top_k=top_k)
@@ -0,0 +1,179 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+import pandas as pd
+
+# 规范列名 -> (规范类型, 各月文件中出现过的列名变体)
+# 类型: "str" 文本 / "numeric" 数值 / "datetime" 日期
+CANONICAL_COLUMNS = {
+    # 客户信息
+    "证件号": ("str", ["身份证号", "身份证号码", "证件号码", "客户证件号", "客户身份证号"]),
+    "客户姓名": ("str", ["姓名", "客户名称", "持卡人姓名"]),
+    "账单地址": ("str", ["账单邮寄地址", "账单寄送地址", "邮寄地址"]),
+    "逾期期数": ("str", ["逾期阶段", "逾期账龄"]),
+    "留案": ("str", ["是否留案"]),
+    # 欠款金额
+    "本金": ("numeric", ["欠款本金", "本金余额", "剩余本金"]),
+    "当期账单金额": ("numeric", ["本期账单金额", "账单金额"]),
+    "总欠款": ("numeric", ["欠款总额", "总欠款金额"]),
+    "最新欠款": ("numeric", ["最新欠款金额", "最新欠款额"]),
+    "应收利息": ("numeric", ["利息"]),
+    "应收费用": ("numeric", ["费用"]),
+    "违约金": ("numeric", []),
+    "滞纳金": ("numeric", []),
+    "取现手续费": ("numeric", []),
+    "现金分期手续费": ("numeric", []),
+    "账单分期手续费": ("numeric", []),
+    "年费": ("numeric", []),
+    # 历史还款
+    "上个月最小还款额": ("numeric", ["上1个月最小还款额", "上一个月最小还款额"]),
+    **{f"上{i}个月最小还款额": ("numeric", []) for i in range(2, 9)},
+    "当期最小还款额": ("numeric", ["本期最小还款额"]),
+    # 风险
+    "逾期天数": ("numeric", ["逾期天"]),
+    "近两年内逾期次数": ("numeric", ["近2年内逾期次数", "近两年逾期次数"]),
+    "risk_prob": ("numeric", ["风险概率", "risk_probability"]),
+    "最后取现日期": ("datetime", ["末次取现日期", "最近取现日期"]),
+}
+
+# 含义可能不同的列名：不自动改名（会改变评分口径），只在识别结果中提示人工确认
+# 原列名 -> 可能对应的规范列名
+UNCONFIRMED_ALIASES = {
+    "委案金额": "总欠款",
+    "账龄": "逾期期数",
+    "过期天数": "逾期天数",
+}
+
+# 未登记列按列名猜测类型（沿用 profile_analysis.load_data 的规则）
+DATE_KEYWORDS = ("日期",)
+MONEY_KEYWORDS = ("金额", "款", "费", "息")
+# 按列名猜测的数值列，转换后至少这么多比例的非空值可解析才采用，避免把文本列清空
+GUESS_MIN_PARSE_RATE = 0.9
+
+
+class SchemaMapping(NamedTuple):
+    """一种表头布局的识别结果"""
+    rename: dict           # 原列名 -> 规范列名
+    numeric: tuple         # 登记为数值的列（规范列名）
+    datetime: tuple        # 登记为日期的列
+    text: tuple            # 登记为文本的列
+    guessed_numeric: tuple  # 按列名猜测的数值列
+    guessed_datetime: tuple  # 按列名猜测的日期列
+    needs_confirmation: dict  # 未自动映射、需人工确认的列：原列名 -> 可能对应的规范列名
+
+
+def _normalize_header(name) -> str:
+    """统一全角括号、去除空白，便于匹配列名变体"""
+    name = str(name).replace("（", "(").replace("）", ")")
+    return re.sub(r"\s+", "", name)
+
+
+@lru_cache(maxsize=None)
+def _alias_index() -> dict:
+    index = {}
+    for canonical, (_, aliases) in CANONICAL_COLUMNS.items():
+        for name in [canonical, *aliases]:
+            index[_normalize_header(name)] = canonical
+    return index
+
+
+@lru_cache(maxsize=256)
+def detect_schema(columns: tuple) -> SchemaMapping:
+    """
+    根据表头识别列名映射与列类型。
+    以表头签名（列名元组）缓存，同一布局的文件只识别一次。
+    """
+    alias_index = _alias_index()
+    rename, taken = {}, set()
+    for col in columns:
+        canonical = alias_index.get(_normalize_header(col))
+        # 同一规范列只映射第一次出现的变体，其余保持原名
+        if canonical and canonical not in taken and (canonical == col or canonical not in columns):
+            taken.add(canonical)
+            if canonical != col:
+                rename[col] = canonical
+
+    needs_confirmation = {}
+    for col in columns:
+        suggested = UNCONFIRMED_ALIASES.get(_normalize_header(col))
+        if suggested and suggested not in taken:
+            needs_confirmation[col] = suggested
+
+    by_type = {"str": [], "numeric": [], "datetime": []}
+    guessed_numeric, guessed_datetime = [], []
+    for col in columns:
+        name = rename.get(col, col)
+        if name in taken:
+            by_type[CANONICAL_COLUMNS[name][0]].append(name)
+        elif any(k in str(name) for k in DATE_KEYWORDS):
+            guessed_datetime.append(name)
+        elif any(k in str(name) for k in MONEY_KEYWORDS):
+            guessed_numeric.append(name)
+
+    return SchemaMapping(
+        rename=rename,
+        numeric=tuple(by_type["numeric"]),
+        datetime=tuple(by_type["datetime"]),
+        text=tuple(by_type["str"]),
+        guessed_numeric=tuple(guessed_numeric),
+        guessed_datetime=tuple(guessed_datetime),
+        needs_confirmation=needs_confirmation,
+    )
+
+
+def _to_text(s: pd.Series) -> pd.Series:
+    """文本列统一为字符串（保留空值）；Excel 读成数字的证件号等去掉多余的 .0"""
+    if pd.api.types.is_bool_dtype(s) or not pd.api.types.is_numeric_dtype(s):
+        return s.astype(str).where(s.notna(), None)
+    if (s.dropna() % 1 == 0).all():
+        s = s.astype("Int64")
+    return s.astype(str).where(s.notna(), None)
+
+
+def _count_failures(report: dict, before: pd.DataFrame, after: pd.DataFrame):
+    """记录转换失败数：原值非空、转换后为空"""
+    if report is None:
+        return
+    failures = (before.notna() & after.isna()).sum()
+    report.setdefault("coerce_failures", {}).update({k: int(v) for k, v in failures.items() if v})
+
+
+def normalize_columns(df: pd.DataFrame, report: dict = None) -> pd.DataFrame:
+    """
+    列名规范化 + 批量类型转换：
+    1. 按表头签名识别（缓存）并重命名为规范列名
+    2. 数值列、日期列各一次整体转换
+    :param report: 传入 dict 时记录各列转换失败的个数（coerce_failures）
+                   以及需人工确认的列名（needs_confirmation），供数据质量检查使用
+    """
+    schema = detect_schema(tuple(df.columns))
+    df = df.rename(columns=schema.rename)
+    if report is not None and schema.needs_confirmation:
+        report["needs_confirmation"] = dict(schema.needs_confirmation)
+
+    if schema.numeric:
+        cols = list(schema.numeric)
+        converted = df[cols].apply(pd.to_numeric, errors="coerce")
+        _count_failures(report, df[cols], converted)
+        df[cols] = converted
+
+    if schema.guessed_numeric:
+        cols = list(schema.guessed_numeric)
+        converted = df[cols].apply(pd.to_numeric, errors="coerce")
+        keep = converted.notna().sum() >= GUESS_MIN_PARSE_RATE * df[cols].notna().sum()
+        keep_cols = keep[keep].index.tolist()
+        if keep_cols:
+            _count_failures(report, df[keep_cols], converted[keep_cols])
+            df[keep_cols] = converted[keep_cols]
+
+    date_cols = list(schema.datetime + schema.guessed_datetime)
+    if date_cols:
+        converted = df[date_cols].apply(pd.to_datetime, errors="coerce")
+        _count_failures(report, df[date_cols], converted)
+        df[date_cols] = converted
+
+    for col in schema.text:
+        df[col] = _to_text(df[col])
+
+    return df
@@ -200,20 +200,112 @@
 #         # 是否留案
 #         if "留案" in self.df.columns:
 #             self.df.loc[self.df["留案"] == "是", "评分"] += 5
+import numpy as np
 import pandas as pd
-import os
-import re
-from datetime import datetime
+from datetime import date
+
+from utils.reference_data import CITY_SCORE_MAP, load_region_map
+
+# 评分规则版本：任何影响评分结果的规则调整都需要同步修改，快照据此失效
+RULES_VERSION = "2024.2"
+
+
+# 评分依据：每条规则命中的分档编号（0 = 缺少相关列未评分），按 3 位一组打包成一个整数列，
+# 与得分在同一次向量化计算中生成；只有展示 / 发给 Qwen 的行才用 explain 解码成文字
+EXPLAIN_COL = "评分依据码"
+EXPLAIN_BITS = 3
+SCORE_RULES = [
+    ("地区一致性", {1: "账单地址与身份证地区一致(+10)", 2: "账单地址与身份证地区不一致(+0)"}),
+    ("欠款占比", {1: "欠款占比≤50%(+10)", 2: "欠款占比50%-100%(+8)", 3: "欠款占比100%-150%(+5)",
+              4: "欠款占比＞150%(+0)", 5: "欠款占比无法计算(+0)"}),
+    ("城市", {1: "一线城市(+10)", 2: "二线城市(+8)", 3: "三四线城市(+5)", 4: "城市未收录(+0)",
+            5: "证件号缺失(默认+5)"}),
+    ("逾期期数", {1: "逾期≤M3(+10)", 2: "逾期M4-M12(+8)", 3: "逾期M13-M24(+5)", 4: "逾期＞M24(+0)"}),
+    ("年龄", {1: "年龄18-29岁(+8)", 2: "年龄30-39岁(+10)", 3: "年龄40-54岁(+5)", 4: "年龄55岁及以上(+0)",
+            5: "年龄未满18或无法解析(+0)"}),
+    ("父母联系人", {1: "有父母联系人(+5)", 2: "无父母联系人(+0)"}),
+]
+RULE_INDEX = {name: i for i, (name, _) in enumerate(SCORE_RULES)}
+
+
+def explain_code(code) -> str:
+    """单个评分依据码 -> 文字（各规则以"；"分隔，未评分的规则省略）"""
+    if pd.isna(code):
+        return ""
+    code = int(code)
+    parts = []
+    for i, (_, bands) in enumerate(SCORE_RULES):
+        band = (code >> (EXPLAIN_BITS * i)) & ((1 << EXPLAIN_BITS) - 1)
+        if band:
+            parts.append(bands.get(band, f"未知分档{band}"))
+    return "；".join(parts)
+
+
+def explain(df: pd.DataFrame) -> pd.Series:
+    """解码评分依据（只对传入的行计算，如 Top K；相同的码只解码一次）"""
+    if EXPLAIN_COL not in df.columns:
+        return pd.Series("", index=df.index, name="评分依据")
+    codes = df[EXPLAIN_COL]
+    texts = {code: explain_code(code) for code in codes.dropna().unique()}
+    return codes.map(texts).fillna("").rename("评分依据")
+
+
+def score_columns(df: pd.DataFrame) -> list:
+    """参与总评分的各规则得分列"""
+    return [c for c in df.columns if c.endswith("得分")]
+
+
+def weight_vector(score_cols: list, weights: dict = None) -> np.ndarray:
+    """规则权重向量（未指定的规则权重为 1）"""
+    weights = weights or {}
+    return np.array([weights.get(c, 1.0) for c in score_cols], dtype=np.float32)
+
+
+class WeightedRanker:
+    """
+    按权重重新排名：各规则得分保存为 int8 矩阵（每行 6 字节），
+    换一组权重只需一次矩阵-向量乘法 + argpartition 选出 Top K，不重新执行任何规则。
+    """
+
+    def __init__(self, scored_df: pd.DataFrame):
+        self.score_cols = score_columns(scored_df)
+        # 得分列可能来自用户上传的表格：非数值 / 缺失按 0 分，超出 int8 范围或非整数时报错，避免截断后排名错误
+        values = scored_df[self.score_cols].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        info = np.iinfo(np.int8)
+        bad = (values < info.min) | (values > info.max) | (values != np.round(values))
+        if bad.any():
+            bad_cols = [c for c, hit in zip(self.score_cols, bad.any(axis=0)) if hit]
+            raise ValueError(f"得分列取值超出范围（需为 {info.min}~{info.max} 的整数）: {', '.join(bad_cols)}")
+        self.matrix = np.ascontiguousarray(values.astype(np.int8))
+
+    def scores(self, weights: dict = None) -> np.ndarray:
+        return self.matrix @ weight_vector(self.score_cols, weights)
+
+    def top_k(self, weights: dict = None, k: int = 20):
+        """
+        返回 (行位置, 加权总分)，按加权总分降序；同分按原行顺序，
+        因此权重全为 1 时与 run_scoring 的排序一致
+        """
+        scores = self.scores(weights)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        # 先用 argpartition 找到第 k 名的分数，再只对不低于该分数的候选行排序
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth)
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+        return order, scores[order]
+
 
 class CollectionScorer:
-    def __init__(self, df: pd.DataFrame, file_type: str):
-        self.df = df.copy()
+    def __init__(self, df: pd.DataFrame, file_type: str, as_of: date = None):
+        # 浅拷贝：新增评分列不影响调用方的 DataFrame，原始列数据共享不复制
+        self.df = df.copy(deep=False)
         self.file_type = file_type
-        # 加载身份证地区码表
-        self.id_map = {}
-        id_file = os.path.join(os.path.dirname(__file__), "id_card.csv")
-        if os.path.exists(id_file):
-            self.id_map = pd.read_csv(id_file, dtype=str).set_index("number")["name"].to_dict()
+        # 评分基准日：年龄等随时间变化的指标以此为准，保证同一输入结果可复现
+        self.as_of = as_of or date.today()
+        # 身份证地区码表（进程内共享，只读）
+        self.id_map = load_region_map()
 
     def parse_region_from_id(self, id_number: str):
         """根据身份证号提取地区"""
@@ -222,8 +314,11 @@ class CollectionScorer:
         code = id_number[:6]
         return self.id_map.get(code, None)
 
-    def run_scoring(self):
-        """总评分逻辑"""
+    def run_scoring(self, weights: dict = None):
+        """
+        总评分逻辑
+        :param weights: 规则权重（如 {"逾期得分": 2, "地区得分": 0}），默认各规则等权相加
+        """
         # 初始化每个评分维度列
         self.df["地区一致性得分"] = 0
         self.df["欠款占比得分"] = 0
@@ -232,12 +327,17 @@ class CollectionScorer:
         self.df["年龄得分"] = 0
         self.df["父母联系人得分"] = 0
 
-        # 调用统一评分方法
+        # 调用统一评分方法（同时记录各规则命中的分档）
+        self._bands = np.zeros(len(self.df), dtype=np.int32)
         self._score_all()
+        self.df[EXPLAIN_COL] = self._bands
 
         # 汇总总评分
-        score_cols = [c for c in self.df.columns if c.endswith("得分")]
-        self.df["总评分"] = self.df[score_cols].sum(axis=1)
+        score_cols = score_columns(self.df)
+        if weights:
+            self.df["总评分"] = WeightedRanker(self.df).scores(weights)
+        else:
+            self.df["总评分"] = self.df[score_cols].sum(axis=1)
 
         # 将总评分放到最后一列
         cols = [c for c in self.df.columns if c != "总评分"] + ["总评分"]
@@ -247,20 +347,26 @@ class CollectionScorer:
         self.df = self.df.sort_values("总评分", ascending=False).reset_index(drop=True)
         return self.df
 
+    def _set_band(self, rule: str, band):
+        """记录某条规则命中的分档（1 起编号，0 表示未评分）"""
+        band = np.asarray(band, dtype=np.int32)
+        self._bands |= band << (EXPLAIN_BITS * RULE_INDEX[rule])
+
     def _score_all(self):
-        """统一评分逻辑"""
+        """统一评分逻辑（按列向量化计算）"""
         # ------------------- 地区一致性 -------------------
         if "证件号" in self.df.columns:
-            self.df["身份证地区"] = self.df["证件号"].apply(self.parse_region_from_id)
+            self.df["身份证地区"] = self.df["证件号"].str[:6].map(self.id_map)
             if "账单地址" in self.df.columns:
-                def check_region_consistency(row):
-                    id_region = row["身份证地区"]
-                    addr = str(row["账单地址"]) if pd.notnull(row["账单地址"]) else ""
-                    return id_region in addr if id_region and addr.strip() else False
-                self.df["地区一致性"] = self.df.apply(check_region_consistency, axis=1)
+                addrs = self.df["账单地址"].where(self.df["账单地址"].notnull(), "").astype(str)
+                self.df["地区一致性"] = [
+                    isinstance(region, str) and addr.strip() != "" and region in addr
+                    for region, addr in zip(self.df["身份证地区"], addrs)
+                ]
             else:
                 self.df["地区一致性"] = False
             self.df.loc[self.df["地区一致性"], "地区一致性得分"] = 10
+            self._set_band("地区一致性", np.where(self.df["地区一致性"], 1, 2))
 
         # ------------------- 欠款占比 -------------------
         if "本金" in self.df.columns and "当期账单金额" in self.df.columns:
@@ -269,76 +375,60 @@ class CollectionScorer:
             self.df.loc[(self.df["欠款占比"] > 0.5) & (self.df["欠款占比"] <= 1.0), "欠款占比得分"] = 8
             self.df.loc[(self.df["欠款占比"] > 1.0) & (self.df["欠款占比"] <= 1.5), "欠款占比得分"] = 5
             self.df.loc[self.df["欠款占比"] > 1.5, "欠款占比得分"] = 0
+            ratio = self.df["欠款占比"]
+            self._set_band("欠款占比", np.select(
+                [ratio <= 0.5, ratio <= 1.0, ratio <= 1.5, ratio > 1.5],
+                [1, 2, 3, 4],
+                default=5
+            ))
 
         # ------------------- 城市得分 -------------------
         if "证件号" in self.df.columns:
-            def score_city_from_id(id_number):
-                CITY_SCORE_MAP = {
-                    # 一线城市（10分）
-                    "1101": 10, "3101": 10, "4401": 10, "4403": 10,
-                    # 二线城市（8分）
-                    "2101": 8, "3501": 8, "2102": 8, "5301": 8, "2301": 8, "3701": 8, "4406": 8, "2201": 8,
-                    "3303": 8, "1301": 8, "4501": 8, "3204": 8, "3505": 8, "3601": 8, "5201": 8, "1401": 8,
-                    "3706": 8, "3304": 8, "3206": 8, "3307": 8, "4404": 8, "4413": 8, "3203": 8, "4601": 8,
-                    "6501": 8, "3306": 8, "4420": 8, "3310": 8, "6201": 8, "3707": 8, "5101": 8, "3301": 8,
-                    "3201": 8, "4201": 8, "3205": 8, "5001": 8, "1201": 8, "4301": 8, "3702": 8, "3302": 8,
-                    "3202": 8, "6101": 8, "4101": 8, "3401": 8, "3502": 8, "4419": 8,
-                    # 三线 + 四线城市（统一 5分）
-                    "1306": 5, "3211": 5, "3210": 5, "4503": 5, "1302": 5, "4602": 5, "3305": 5, "1501": 5,
-                    "1310": 5, "4103": 5, "3710": 5, "3209": 5, "3713": 5, "4407": 5, "4405": 5, "3212": 5,
-                    "3506": 5, "1304": 5, "3708": 5, "3402": 5, "3703": 5, "6401": 5, "4502": 5, "5107": 5,
-                    "4408": 5, "2103": 5, "3607": 5, "2306": 5, "4205": 5, "1502": 5, "6104": 5, "1303": 5,
-                    "4302": 5, "3503": 5, "2202": 5, "3208": 5, "4412": 5, "3509": 5, "4304": 5, "3507": 5,
-                    "3207": 5, "2106": 5, "5307": 5, "4452": 5, "2224": 5, "3309": 5, "3604": 5, "3508": 5,
-                    "1309": 5, "2104": 5, "4206": 5, "3611": 5, "2108": 5, "3504": 5, "3403": 5, "3311": 5,
-                    "4306": 5, "4418": 5, "4210": 5, "3709": 5, "3308": 5, "2111": 5, "3705": 5, "4113": 5,
-                    "3405": 5, "5113": 5, "6301": 5, "4209": 5, "2302": 5, "5115": 5, "5111": 5, "4303": 5,
-                    "5203": 5, "3213": 5, "4107": 5, "4115": 5, "3411": 5, "2107": 5, "4451": 5, "4211": 5,
-                    "4102": 5, "5106": 5, "3714": 5, "4414": 5, "1506": 5, "1305": 5, "4409": 5, "5329": 5,
-                    "4402": 5, "4114": 5, "3408": 5, "4202": 5, "3415": 5, "4509": 5, "3609": 5, "4505": 5,
-                    "2310": 5, "1307": 5, "4504": 5, "3711": 5, "4212": 5, "4307": 5, "2308": 5, "5325": 5,
-                    "5226": 5, "4417": 5, "1407": 5, "6105": 5, "1507": 5, "4228": 5, "4416": 5, "4310": 5,
-                    "3412": 5, "3715": 5, "1402": 5, "6103": 5, "4110": 5, "1504": 5, "1408": 5, "4105": 5,
-                    "1410": 5, "3418": 5, "5303": 5, "5328": 5, "4305": 5, "2114": 5, "4104": 5, "2110": 5,
-                    "3717": 5, "2105": 5, "4117": 5, "4415": 5, "4108": 5, "3410": 5, "4312": 5, "2203": 5,
-                    "6108": 5, "4203": 5, "3716": 5, "3610": 5, "3404": 5, "4116": 5, "5227": 5, "5105": 5,
-                    "5304": 5, "5114": 5, "2205": 5, "3413": 5, "3704": 5, "5110": 5, "5109": 5, "3608": 5,
-                    "1505": 5, "3602": 5, "2109": 5, "5118": 5, "2112": 5, "1308": 5, "4313": 5
-                }
-
-                if not id_number or len(id_number) < 4:
-                    return 5
-                code = id_number[:4]
-                return CITY_SCORE_MAP.get(code, 0)
-            self.df["地区得分"] = self.df["证件号"].apply(score_city_from_id)
+            # 证件号缺失或不足4位按默认 5 分，未收录城市 0 分
+            id4 = self.df["证件号"].str[:4]
+            city_score = id4.map(CITY_SCORE_MAP).fillna(0)
+            city_score[id4.isna() | (id4.str.len() < 4)] = 5
+            self.df["地区得分"] = city_score.astype(int)
+            self._set_band("城市", np.select(
+                [id4.isna() | (id4.str.len() < 4), city_score == 10, city_score == 8, city_score == 5],
+                [5, 1, 2, 3],
+                default=4
+            ))
 
         # ------------------- 逾期期数得分 -------------------
         if "逾期期数" in self.df.columns:
-            def parse_overdue(x):
-                if pd.isna(x): return 0
-                m = re.search(r"M(\d+)", str(x).upper())
-                return int(m.group(1)) if m else 0
-            self.df["逾期期数数值"] = self.df["逾期期数"].apply(parse_overdue)
-            def overdue_score(m):
-                if m==0: return 10
-                elif 1<=m<=3: return 10
-                elif 4<=m<=12: return 8
-                elif 13<=m<=24: return 5
-                else: return 0
-            self.df["逾期得分"] = self.df["逾期期数数值"].apply(overdue_score)
+            overdue = self.df["逾期期数"].astype(str).str.upper().str.extract(r"M(\d+)", expand=False)
+            self.df["逾期期数数值"] = pd.to_numeric(overdue, errors="coerce").fillna(0).astype(int)
+            m = self.df["逾期期数数值"]
+            self.df["逾期得分"] = np.select(
+                [m <= 3, m <= 12, m <= 24],
+                [10, 8, 5],
+                default=0
+            )
+            self._set_band("逾期期数", np.select([m <= 3, m <= 12, m <= 24], [1, 2, 3], default=4))
 
         # ------------------- 年龄得分 -------------------
         if "证件号" in self.df.columns:
             self.df["出生年份"] = pd.to_numeric(self.df["证件号"].str[6:10], errors="coerce")
-            current_year = datetime.now().year
-            self.df["年龄"] = self.df["出生年份"].apply(lambda x: current_year-x if pd.notnull(x) else None)
+            self.df["年龄"] = self.as_of.year - self.df["出生年份"]
             self.df.loc[self.df["年龄"].between(18,30,inclusive="both"), "年龄得分"] = 8
             self.df.loc[self.df["年龄"].between(30,40,inclusive="left"), "年龄得分"] = 10
             self.df.loc[self.df["年龄"].between(40,55,inclusive="left"), "年龄得分"] = 5
             self.df.loc[self.df["年龄"]>55, "年龄得分"]=0
+            age = self.df["年龄"]
+            self._set_band("年龄", np.select(
+                [age.between(18, 30, inclusive="left"), age.between(30, 40, inclusive="left"),
+                 age.between(40, 55, inclusive="left"), age >= 55],
+                [1, 2, 3, 4],
+                default=5
+            ))
 
         # ------------------- 父母联系人得分 -------------------
         contact_cols = [c for c in self.df.columns if "关系" in c]
         if contact_cols:
-            self.df["是否有父母联系人"] = self.df[contact_cols].apply(lambda row: any("父" in str(v) for v in row), axis=1)
+            has_parent = np.zeros(len(self.df), dtype=bool)
+            for col in contact_cols:
+                has_parent |= self.df[col].astype(str).str.contains("父", regex=False).to_numpy()
+            self.df["是否有父母联系人"] = has_parent
             self.df.loc[self.df["是否有父母联系人"], "父母联系人得分"] = 5
+            self._set_band("父母联系人", np.where(has_parent, 1, 2))
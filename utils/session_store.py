@@ -0,0 +1,174 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "profile_analysis_spill")
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """DataFrame 实际占用内存（含字符串对象）"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class SessionStore:
+    """
+    进程级会话数据仓库（多个 Streamlit 会话共用一个实例）
+    - 每个会话按内存预算记账，超出预算时把该会话最久未用的数据溢写到磁盘；
+      单个数据超出会话预算时本身也不常驻内存（保留在磁盘，每次 get 时加载）
+    - 空闲超过 idle_seconds 的会话整体溢写，所有会话总量超出 total_budget 时按 LRU 溢写
+    - 被溢写的数据在下次 get 时透明地从磁盘加载回来
+    - 空闲超过 expire_seconds 的会话整体删除（含溢写文件）；启动时清理上次遗留的过期溢写文件
+    """
+
+    def __init__(self, session_budget: int = 512 * 1024 ** 2, total_budget: int = 4 * 1024 ** 3,
+                 idle_seconds: int = 15 * 60, expire_seconds: int = 4 * 60 * 60, spill_dir: str = DEFAULT_SPILL_DIR):
+        self.session_budget = session_budget
+        self.total_budget = total_budget
+        self.idle_seconds = idle_seconds
+        self.expire_seconds = expire_seconds
+        self.spill_dir = spill_dir
+        self._lock = threading.RLock()
+        # session_id -> {"frames": OrderedDict[key -> (df, nbytes)], "spilled": {key: path}, "last_access": ts}
+        self._sessions = OrderedDict()
+        self.cleanup_spill_dir()
+
+    # ------------------- 对外接口 -------------------
+    def put(self, session_id: str, key: str, df: pd.DataFrame):
+        """保存会话数据（同一 key 覆盖旧值）"""
+        with self._lock:
+            session = self._touch(session_id)
+            self._discard(session, key)
+            session["frames"][key] = (df, frame_nbytes(df))
+            if session["frames"][key][1] > self.session_budget:
+                self._spill(session_id, session, key)
+            else:
+                self._enforce_session_budget(session_id, session, keep=key)
+            self._enforce_global()
+
+    def get(self, session_id: str, key: str):
+        """读取会话数据，已溢写的从磁盘加载（未超出会话预算时放回内存）；不存在返回 None"""
+        with self._lock:
+            session = self._touch(session_id)
+            if key in session["frames"]:
+                session["frames"].move_to_end(key)
+                return session["frames"][key][0]
+            path = session["spilled"].get(key)
+            if path is None or not os.path.exists(path):
+                session["spilled"].pop(key, None)
+                return None
+            df = pd.read_pickle(path)
+            nbytes = frame_nbytes(df)
+            if nbytes > self.session_budget:
+                # 超出会话预算的数据：只交给调用方使用，溢写文件保留，不放回内存
+                return df
+            del session["spilled"][key]
+            os.remove(path)
+            session["frames"][key] = (df, nbytes)
+            self._enforce_session_budget(session_id, session, keep=key)
+            self._enforce_global()
+            return df
+
+    def drop(self, session_id: str, key: str = None):
+        """删除会话的某个数据，key 为空时删除整个会话"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            if key is not None:
+                self._discard(session, key)
+                return
+            for k in list(session["frames"]) + list(session["spilled"]):
+                self._discard(session, k)
+            del self._sessions[session_id]
+
+    def expire(self) -> list:
+        """删除空闲超过 expire_seconds 的会话（内存数据和溢写文件），返回被删除的会话"""
+        with self._lock:
+            now = time.time()
+            expired = [sid for sid, s in self._sessions.items() if now - s["last_access"] > self.expire_seconds]
+            for sid in expired:
+                self.drop(sid)
+            return expired
+
+    def cleanup_spill_dir(self) -> int:
+        """删除溢写目录中超过 expire_seconds 未修改的文件（上次运行遗留），返回删除的文件数"""
+        if not os.path.isdir(self.spill_dir):
+            return 0
+        cutoff = time.time() - self.expire_seconds
+        removed = 0
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if name.endswith(".pkl") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def usage(self) -> dict:
+        """各会话内存 / 磁盘占用（字节）"""
+        with self._lock:
+            return {
+                sid: {
+                    "memory": sum(n for _, n in s["frames"].values()),
+                    "spilled": sum(os.path.getsize(p) for p in s["spilled"].values() if os.path.exists(p)),
+                    "idle_seconds": int(time.time() - s["last_access"]),
+                }
+                for sid, s in self._sessions.items()
+            }
+
+    # ------------------- 内部逻辑 -------------------
+    def _touch(self, session_id: str) -> dict:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {"frames": OrderedDict(), "spilled": {}, "last_access": 0.0}
+            self._sessions[session_id] = session
+        session["last_access"] = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _discard(self, session: dict, key: str):
+        session["frames"].pop(key, None)
+        path = session["spilled"].pop(key, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def _spill(self, session_id: str, session: dict, key: str):
+        df, _ = session["frames"].pop(key)
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"{session_id}_{abs(hash(key)):x}.pkl")
+        df.to_pickle(path)
+        session["spilled"][key] = path
+
+    @staticmethod
+    def _memory(session: dict) -> int:
+        return sum(n for _, n in session["frames"].values())
+
+    def _enforce_session_budget(self, session_id: str, session: dict, keep: str):
+        # 按最久未用顺序溢写，当前正在使用的数据保留在内存
+        for key in [k for k in session["frames"] if k != keep]:
+            if self._memory(session) <= self.session_budget:
+                break
+            self._spill(session_id, session, key)
+
+    def _enforce_global(self):
+        self.expire()
+        now = time.time()
+        # 1. 空闲会话整体溢写
+        for sid, session in self._sessions.items():
+            if now - session["last_access"] > self.idle_seconds:
+                for key in list(session["frames"]):
+                    self._spill(sid, session, key)
+        # 2. 总量超预算时，从最久未活跃的会话开始溢写（最近活跃的会话保留）
+        total = sum(self._memory(s) for s in self._sessions.values())
+        for sid, session in list(self._sessions.items())[:-1]:
+            if total <= self.total_budget:
+                break
+            total -= self._memory(session)
+            for key in list(session["frames"]):
+                self._spill(sid, session, key)
@@ -0,0 +1,309 @@
+import math
+import os
+import pickle
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils.reference_data import load_region_map
+
+# 与 CollectionAnalyzer 的分组口径保持一致
+AGE_BINS = [0, 20, 30, 40, 50, 60, 100]
+AGE_LABELS = ["20以下", "21-30", "31-40", "41-50", "51-60", "60以上"]
+DEBT_RATIO_EDGES = [0.5, 1.0, 1.5]
+DEBT_RATIO_LABELS = ["50%以下", "51%-100%", "101%-150%", "＞150%"]
+RISK_PROB_EDGES = np.linspace(0, 1, 21)
+
+
+class FixedHistogram:
+    """固定分箱直方图：逐块累加、可合并（分箱必须一致）"""
+
+    def __init__(self, edges, right: bool = False):
+        self.edges = np.asarray(edges, dtype=float)
+        self.right = right
+        # counts[0] 为低于下界，counts[-1] 为高于上界，中间为各分箱
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)
+        self.missing = 0
+        # 恰好落在开口一侧边界上的值（right=False 时等于上界，right=True 时等于下界）：
+        # 已计入越界部分，需要闭区间口径（如 np.histogram 最后一箱含上界）时再并入相邻分箱
+        self.on_edge = 0
+
+    def update(self, values):
+        values = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=float)
+        valid = ~np.isnan(values)
+        self.missing += int((~valid).sum())
+        idx = np.searchsorted(self.edges, values[valid], side="left" if self.right else "right")
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.on_edge += int((values[valid] == self.edges[0 if self.right else -1]).sum())
+        return self
+
+    def merge(self, other: "FixedHistogram"):
+        if not np.array_equal(self.edges, other.edges) or self.right != other.right:
+            raise ValueError("直方图分箱不一致，无法合并")
+        self.counts += other.counts
+        self.missing += other.missing
+        self.on_edge += other.on_edge
+        return self
+
+    @property
+    def bins(self) -> np.ndarray:
+        """各分箱计数（不含越界部分）"""
+        return self.counts[1:-1]
+
+
+class QuantileSketch:
+    """
+    相对误差分位数草图（DDSketch 思路）：按 log(γ) 对数分桶计数，
+    任意分位数的相对误差不超过 relative_accuracy，可逐块更新、任意合并。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zero = 0
+        self.count = 0
+        self.missing = 0
+
+    def _bucket_counts(self, values: np.ndarray) -> dict:
+        keys = np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+        uniq, counts = np.unique(keys, return_counts=True)
+        return dict(zip(uniq.tolist(), counts.tolist()))
+
+    def update(self, values):
+        values = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce"), dtype=float)
+        finite = np.isfinite(values)
+        self.missing += int((~finite).sum())
+        values = values[finite]
+        self.count += len(values)
+        pos = values > self.min_value
+        neg = values < -self.min_value
+        self.zero += int(len(values) - pos.sum() - neg.sum())
+        self.positive.update(self._bucket_counts(values[pos]))
+        self.negative.update(self._bucket_counts(-values[neg]))
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        if self.relative_accuracy != other.relative_accuracy:
+            raise ValueError("分位数草图精度不一致，无法合并")
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zero += other.zero
+        self.count += other.count
+        self.missing += other.missing
+        return self
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def quantiles(self, qs=(0.05, 0.25, 0.5, 0.75, 0.95)) -> pd.Series:
+        return pd.Series([self.quantile(q) for q in qs], index=[f"{int(q * 100)}%" for q in qs])
+
+
+class HeavyHitters:
+    """
+    高频项计数（Misra-Gries）：最多保留 capacity 个计数器，
+    每项计数的低估不超过 总数 / (capacity + 1)，可逐块更新、任意合并。
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.counters = Counter()
+        self.total = 0
+
+    def _trim(self):
+        if len(self.counters) <= self.capacity:
+            return
+        # 所有计数减去第 capacity+1 大的计数，去掉非正的项
+        cut = sorted(self.counters.values(), reverse=True)[self.capacity]
+        self.counters = Counter({k: v - cut for k, v in self.counters.items() if v > cut})
+
+    def update(self, values):
+        counts = pd.Series(values).dropna().value_counts()
+        self.total += int(counts.sum())
+        self.counters.update(dict(zip(counts.index.tolist(), counts.values.tolist())))
+        self._trim()
+        return self
+
+    def merge(self, other: "HeavyHitters"):
+        self.counters.update(other.counters)
+        self.total += other.total
+        self._trim()
+        return self
+
+    def top(self, n: int = 10, ascending: bool = False) -> pd.Series:
+        items = sorted(self.counters.items(), key=lambda kv: kv[1], reverse=not ascending)[:n]
+        return pd.Series([v for _, v in items], index=[k for k, _ in items], name="count", dtype="int64")
+
+
+class PortfolioSketch:
+    """
+    组合级分布摘要：年龄分布、风险概率直方图与分位数、欠款比例分布与分位数、高频地区。
+    每块评分结果调用 update 累加，不同文件 / 进程的摘要用 merge 合并，
+    内存占用与数据行数无关。
+    """
+
+    def __init__(self, region_capacity: int = 200, relative_accuracy: float = 0.01):
+        self.rows = 0
+        self.age = FixedHistogram(AGE_BINS, right=True)
+        self.risk_hist = FixedHistogram(RISK_PROB_EDGES)
+        self.risk_quantiles = QuantileSketch(relative_accuracy)
+        self.debt_ratio = FixedHistogram(DEBT_RATIO_EDGES, right=True)
+        self.debt_ratio_quantiles = QuantileSketch(relative_accuracy)
+        self.regions = HeavyHitters(region_capacity)
+
+    def update(self, df: pd.DataFrame):
+        """累加一块评分结果（CollectionScorer.run_scoring 的输出）"""
+        self.rows += len(df)
+        if "年龄" in df.columns:
+            self.age.update(df["年龄"])
+        if "risk_prob" in df.columns:
+            self.risk_hist.update(df["risk_prob"])
+            self.risk_quantiles.update(df["risk_prob"])
+        if "本金" in df.columns and "当期账单金额" in df.columns:
+            ratio = (df["当期账单金额"] / df["本金"]) - 1
+            self.debt_ratio.update(ratio)
+            self.debt_ratio_quantiles.update(ratio)
+        if "证件号" in df.columns:
+            self.regions.update(df["证件号"].astype("string").str[:6])
+        return self
+
+    def merge(self, other: "PortfolioSketch"):
+        self.rows += other.rows
+        self.age.merge(other.age)
+        self.risk_hist.merge(other.risk_hist)
+        self.risk_quantiles.merge(other.risk_quantiles)
+        self.debt_ratio.merge(other.debt_ratio)
+        self.debt_ratio_quantiles.merge(other.debt_ratio_quantiles)
+        self.regions.merge(other.regions)
+        return self
+
+    # ------------------- 分布视图 -------------------
+    def age_distribution(self) -> pd.Series:
+        """年龄段占比（%），口径同 analyze_age_distribution"""
+        counts = pd.Series(self.age.bins, index=AGE_LABELS)
+        return counts / max(counts.sum(), 1) * 100
+
+    def debt_ratio_distribution(self) -> pd.Series:
+        """欠款比例区间占比（%），口径同 analyze_debt_ratio"""
+        counts = pd.Series(self.debt_ratio.counts, index=DEBT_RATIO_LABELS)
+        counts["无效数据"] = self.debt_ratio.missing
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts / max(counts.sum(), 1) * 100
+
+    def risk_histogram(self) -> pd.Series:
+        """风险概率 20 等分直方图（人数），口径同 np.histogram：最后一箱含 1.0，超出 [0, 1] 的值不计入"""
+        edges = self.risk_hist.edges
+        labels = [f"{lo:.2f}-{hi:.2f}" for lo, hi in zip(edges[:-1], edges[1:])]
+        counts = self.risk_hist.bins.copy()
+        counts[-1] += self.risk_hist.on_edge
+        return pd.Series(counts, index=labels)
+
+    def region_top(self, n: int = 10, ascending: bool = False) -> pd.Series:
+        """高频地区（名称），计数为近似值（可能略低估）"""
+        id_map = load_region_map()
+        top = self.regions.top(len(self.regions.counters))
+        top.index = [id_map.get(code) for code in top.index]
+        # 同一地区的多个编码按名称合并
+        top = top[top.index.notna()].groupby(level=0, sort=False).sum()
+        return top.sort_values(ascending=ascending, kind="stable").head(n)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> "PortfolioSketch":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+# ------------------- 分块读取与并行构建 -------------------
+def iter_file_chunks(source, chunksize: int = 100_000):
+    """
+    分块读取 csv / parquet / xlsx，每块列名规范化后返回，不把整个文件读入内存
+    :param source: 文件路径，或带 name 属性的文件对象（如 Streamlit 上传文件）
+    """
+    from utils.schema import normalize_columns
+
+    ext = os.path.splitext(str(getattr(source, "name", source)))[1].lower()
+    if ext == ".csv":
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype={"证件号": str}):
+            yield normalize_columns(chunk)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield normalize_columns(batch.to_pandas())
+    else:
+        # openpyxl 只读模式逐行读取
+        from openpyxl import load_workbook
+
+        wb = load_workbook(source, read_only=True, data_only=True)
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield normalize_columns(pd.DataFrame(buffer, columns=header))
+                buffer = []
+        if buffer:
+            yield normalize_columns(pd.DataFrame(buffer, columns=header))
+        wb.close()
+
+
+def build_sketch(chunks, file_type: str = "在案", as_of: date = None) -> PortfolioSketch:
+    """逐块评分并累加到摘要"""
+    from utils.scoring import CollectionScorer
+
+    sketch = PortfolioSketch()
+    for chunk in chunks:
+        sketch.update(CollectionScorer(chunk, file_type, as_of=as_of).run_scoring())
+    return sketch
+
+
+def _sketch_file(args) -> PortfolioSketch:
+    path, file_type, as_of, chunksize = args
+    return build_sketch(iter_file_chunks(path, chunksize), file_type, as_of)
+
+
+def build_portfolio_sketch(paths, file_type: str = None, as_of: date = None,
+                           workers: int = None, chunksize: int = 100_000) -> PortfolioSketch:
+    """多个文件并行构建摘要后合并；file_type 为空时按文件名判断"""
+    from utils.file_loader import detect_file_type
+
+    tasks = [(p, file_type or detect_file_type(os.path.basename(p)), as_of, chunksize) for p in paths]
+    sketch = PortfolioSketch()
+    if workers == 1 or len(tasks) <= 1:
+        for task in tasks:
+            sketch.merge(_sketch_file(task))
+        return sketch
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_sketch_file, tasks):
+            sketch.merge(part)
+    return sketch
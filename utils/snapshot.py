@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from utils.paths import DATA_DIR
+from utils.scoring import CollectionScorer, RULES_VERSION
+
+# 评分快照目录（数据目录下），可通过参数覆盖
+SNAPSHOT_DIR = os.path.join(DATA_DIR, ".snapshots")
+META_KEY = b"profile_analysis"
+# 快照保留天数；规则版本变化后旧快照不会再命中，直接清理
+SNAPSHOT_TTL_DAYS = float(os.environ.get("PROFILE_SNAPSHOT_TTL_DAYS", 30))
+# 同一输入最多保留的基准日个数（按基准日从新到旧）
+SNAPSHOT_KEEP_AS_OF = int(os.environ.get("PROFILE_SNAPSHOT_KEEP_AS_OF", 3))
+
+
+def hash_input(df: pd.DataFrame, file_type: str) -> str:
+    """计算输入数据的内容哈希（列名 + 逐行哈希 + 文件类型）"""
+    h = hashlib.sha256()
+    h.update(file_type.encode("utf-8"))
+    h.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def snapshot_key(input_hash: str, as_of: date, rules_version: str = RULES_VERSION) -> str:
+    """由 (输入, 基准日, 规则版本) 三元组生成快照键"""
+    raw = f"{input_hash}|{as_of.isoformat()}|{rules_version}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def mixed_columns(df: pd.DataFrame) -> list:
+    """Excel 读入的混合类型列（如数字和文本混排），这类列无法直接写 Parquet"""
+    import pyarrow as pa
+
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed.append(col)
+    return mixed
+
+
+def arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """混合类型列统一转为字符串（保留空值），用于导出"""
+    mixed = mixed_columns(df)
+    if not mixed:
+        return df
+    out = df.copy(deep=False)
+    for col in mixed:
+        out[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return out
+
+
+def load_snapshot(key: str, snapshot_dir: str = SNAPSHOT_DIR):
+    """读取快照，返回 (DataFrame, 元数据)；不存在时返回 (None, None)"""
+    import pyarrow.parquet as pq
+
+    path = os.path.join(snapshot_dir, f"{key}.parquet")
+    if not os.path.exists(path):
+        return None, None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(META_KEY, b"{}"))
+    df = table.to_pandas()
+    # 混合类型列按原始取值还原，与重新评分的结果完全一致
+    for col in meta.pop("pickled_columns", []):
+        df[col] = df[col].map(pickle.loads, na_action="ignore").astype(object)
+    return df, meta
+
+
+def save_snapshot(key: str, df: pd.DataFrame, meta: dict, snapshot_dir: str = SNAPSHOT_DIR):
+    """写入快照（Parquet + 元数据），先写临时文件再原子替换"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # 混合类型列逐值序列化为二进制，读取时还原（不改变类型和取值）
+    mixed = mixed_columns(df)
+    if mixed:
+        df = df.copy(deep=False)
+        for col in mixed:
+            df[col] = df[col].map(pickle.dumps, na_action="ignore")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[META_KEY] = json.dumps(dict(meta, pickled_columns=mixed), ensure_ascii=False).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    path = os.path.join(snapshot_dir, f"{key}.parquet")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return path
+
+
+def score_with_snapshot(df: pd.DataFrame, file_type: str, as_of: date = None, snapshot_dir: str = SNAPSHOT_DIR):
+    """
+    带快照的评分：相同 (输入, 基准日, 规则版本) 直接读取快照，不再重新计算
+    :return: (评分结果 DataFrame, 快照元数据)
+    """
+    as_of = as_of or date.today()
+    input_hash = hash_input(df, file_type)
+    key = snapshot_key(input_hash, as_of)
+
+    try:
+        cached, meta = load_snapshot(key, snapshot_dir)
+    except Exception as e:
+        print(f"⚠️ 快照读取失败，重新评分: {e}")
+        cached, meta = None, None
+    if cached is not None:
+        return cached, meta
+
+    scored = CollectionScorer(df, file_type, as_of=as_of).run_scoring()
+    meta = {
+        "input_hash": input_hash,
+        "as_of": as_of.isoformat(),
+        "rules_version": RULES_VERSION,
+        "file_type": file_type,
+        "rows": int(len(scored)),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        save_snapshot(key, scored, meta, snapshot_dir)
+        prune_snapshots(snapshot_dir)
+    except Exception as e:
+        print(f"⚠️ 快照写入失败: {e}")
+    return scored, meta
+
+
+def prune_snapshots(snapshot_dir: str = SNAPSHOT_DIR, ttl_days: float = SNAPSHOT_TTL_DAYS,
+                    keep_as_of: int = SNAPSHOT_KEEP_AS_OF) -> int:
+    """
+    清理快照：规则版本不是当前版本的、超过保留天数的、
+    同一输入超出最近 keep_as_of 个基准日的，以及遗留的临时文件。返回删除的文件数
+    """
+    import pyarrow.parquet as pq
+
+    if not os.path.isdir(snapshot_dir):
+        return 0
+    now = time.time()
+    expired, by_input = [], {}
+    for name in os.listdir(snapshot_dir):
+        path = os.path.join(snapshot_dir, name)
+        try:
+            age_days = (now - os.path.getmtime(path)) / 86400
+            if name.endswith(".tmp"):
+                if age_days > 1:
+                    expired.append(path)
+                continue
+            if not name.endswith(".parquet"):
+                continue
+            meta = json.loads((pq.read_schema(path).metadata or {}).get(META_KEY, b"{}"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 快照无法读取，跳过清理: {name} {e}")
+            continue
+        if meta.get("rules_version") != RULES_VERSION or age_days > ttl_days:
+            expired.append(path)
+        else:
+            by_input.setdefault(meta.get("input_hash"), []).append((meta.get("as_of", ""), path))
+    for runs in by_input.values():
+        expired += [path for _, path in sorted(runs, reverse=True)[keep_as_of:]]
+
+    for path in expired:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return len(expired)
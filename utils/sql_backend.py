@@ -0,0 +1,216 @@
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+
+# 分组口径与 pandas 实现（utils.compute）共用
+from utils.compute import OVERDUE_DAY_BINS, OVERDUE_DAY_LABELS, RISK_LEVEL_LABELS
+from utils.paths import DATA_DIR
+
+# Excel 转存的 Parquet 缓存目录（数据目录下，不写到源文件旁边）
+CACHE_DIR = os.path.join(DATA_DIR, ".cache", "duckdb")
+
+
+def _q(name: str) -> str:
+    """SQL 标识符转义（列名多为中文）"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _risk_level_sql(col: str = "risk_prob") -> str:
+    # 等价于 pd.cut(bins=[-0.01, 0.3, 0.7, 1.01])，右闭区间，超出范围为 NULL
+    c = _q(col)
+    return (
+        f"CASE WHEN {c} > -0.01 AND {c} <= 0.3 THEN '低风险' "
+        f"WHEN {c} > 0.3 AND {c} <= 0.7 THEN '中风险' "
+        f"WHEN {c} > 0.7 AND {c} <= 1.01 THEN '高风险' END"
+    )
+
+
+def _overdue_group_sql(col: str = "逾期天数") -> str:
+    c = _q(col)
+    cases = " ".join(
+        f"WHEN {c} > {lo} AND {c} <= {hi} THEN '{label}'"
+        for lo, hi, label in zip(OVERDUE_DAY_BINS[:-1], OVERDUE_DAY_BINS[1:], OVERDUE_DAY_LABELS)
+        if hi != float('inf')
+    )
+    return f"CASE {cases} WHEN {c} > {OVERDUE_DAY_BINS[-2]} THEN '{OVERDUE_DAY_LABELS[-1]}' END"
+
+
+def _payment_pattern_sql(cols: list) -> str:
+    # 连续未达标月数：逐列累加，遇到达标月份清零（与逐行循环的 pandas 实现一致）
+    consecutive = "0"
+    for col in cols:
+        c = _q(col)
+        consecutive = f"(CASE WHEN {c} IS NULL OR {c} <= 0 THEN {consecutive} + 1 ELSE 0 END)"
+    return (
+        f"CASE WHEN {consecutive} >= 6 THEN '长期拖欠' "
+        f"WHEN {consecutive} >= 3 THEN '中期拖欠' "
+        f"WHEN {consecutive} > 0 THEN '短期拖欠' ELSE '正常还款' END"
+    )
+
+
+class DuckDBAggregator:
+    """
+    聚合分析的 SQL 后端：直接在 Parquet 上用 DuckDB 执行 groupby / corr / value_counts，
+    不把整表读入内存，超出内存的数据集也能处理，并自动多线程并行。
+    返回值的结构与 pandas 实现一致。
+    """
+
+    def __init__(self, parquet_path, threads: int = None):
+        import duckdb
+
+        self.parquet_path = parquet_path
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        paths = parquet_path if isinstance(parquet_path, (list, tuple)) else [parquet_path]
+        path_list = ", ".join("'" + str(p).replace("'", "''") + "'" for p in paths)
+        self.con.execute(f"CREATE VIEW data AS SELECT * FROM read_parquet([{path_list}], union_by_name = true)")
+        self.columns = [row[0] for row in self.con.execute("DESCRIBE data").fetchall()]
+
+    @classmethod
+    def from_file(cls, file_path: str, cache_dir: str = CACHE_DIR, threads: int = None, chunksize: int = 100_000):
+        """
+        Excel / csv 输入先分块规范化并转存为 Parquet（缓存目录下，每块一个文件），
+        不把整个文件读入内存；源文件未变化（路径 + 大小 + 修改时间）时直接复用
+        """
+        if str(file_path).lower().endswith(".parquet"):
+            return cls(file_path, threads=threads)
+
+        from utils.sketch import iter_file_chunks
+        from utils.snapshot import arrow_safe
+
+        abs_path = os.path.abspath(file_path)
+        stat = os.stat(abs_path)
+        stem = f"{os.path.splitext(os.path.basename(abs_path))[0]}-{hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:12]}"
+        part_dir = os.path.join(cache_dir, f"{stem}-{stat.st_size}-{stat.st_mtime_ns}")
+        if not os.path.isdir(part_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_dir = f"{part_dir}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for i, chunk in enumerate(iter_file_chunks(abs_path, chunksize)):
+                arrow_safe(chunk).to_parquet(os.path.join(tmp_dir, f"part-{i:05d}.parquet"), index=False, compression="zstd")
+            try:
+                os.replace(tmp_dir, part_dir)
+            except OSError:
+                # 其他进程已写好同一份缓存
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            # 同一源文件的旧缓存（文件已修改）一并删除
+            for name in os.listdir(cache_dir):
+                if name.startswith(stem + "-") and name != os.path.basename(part_dir) and not name.endswith(".tmp"):
+                    shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        parts = sorted(os.path.join(part_dir, f) for f in os.listdir(part_dir) if f.endswith(".parquet"))
+        if not parts:
+            raise ValueError(f"文件中没有数据: {file_path}")
+        return cls(parts, threads=threads)
+
+    def _df(self, sql: str) -> pd.DataFrame:
+        return self.con.execute(sql).df()
+
+    def has(self, *cols) -> bool:
+        return all(c in self.columns for c in cols)
+
+    def row_count(self) -> int:
+        return self.con.execute("SELECT count(*) FROM data").fetchone()[0]
+
+    # ------------------- 还款模式 -------------------
+    def payment_history(self, payment_history_cols: list) -> dict:
+        """还款模式分布(%)，以及历史还款与总欠款相关性"""
+        cols = [c for c in payment_history_cols if c in self.columns]
+        result = {}
+        dist = self._df(
+            f"SELECT {_payment_pattern_sql(cols)} AS pattern, count(*) * 100.0 / sum(count(*)) OVER () AS pct "
+            f"FROM data GROUP BY 1 ORDER BY pct DESC"
+        )
+        result['还款模式分布'] = pd.Series(dist['pct'].values, index=dist['pattern'].values, name='proportion')
+
+        if self.has('总欠款'):
+            corr_cols = cols + ['总欠款']
+            exprs = ", ".join(f"corr({_q(c)}, {_q('总欠款')})" for c in corr_cols)
+            values = self.con.execute(f"SELECT {exprs} FROM data").fetchone()
+            result['历史还款与总欠款相关性'] = pd.Series(values, index=corr_cols, name='总欠款', dtype=float)
+        return result
+
+    # ------------------- 风险因素 -------------------
+    def risk_factors(self, payment_history_cols: list = None) -> dict:
+        result = {}
+        if self.has('risk_prob'):
+            c = _q('risk_prob')
+            row = self.con.execute(
+                f"SELECT count({c}), avg({c}), stddev_samp({c}), min({c}), "
+                f"quantile_cont({c}, 0.25), quantile_cont({c}, 0.5), quantile_cont({c}, 0.75), max({c}) FROM data"
+            ).fetchone()
+            result['risk_prob分布'] = pd.Series(
+                row, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'], name='risk_prob', dtype=float
+            )
+            counts = self._df(
+                f"SELECT {_risk_level_sql()} AS level, count(*) AS n FROM data "
+                f"WHERE {_risk_level_sql()} IS NOT NULL GROUP BY 1"
+            )
+            level_counts = pd.Series(counts['n'].values, index=counts['level'].values)
+            level_counts = level_counts.reindex(RISK_LEVEL_LABELS, fill_value=0).astype('int64')
+            result['风险等级分布'] = level_counts.sort_values(ascending=False, kind='stable').rename('count')
+
+        if self.has('逾期天数', 'risk_prob'):
+            result['逾期天数与风险相关性'] = self.con.execute(
+                f"SELECT corr({_q('逾期天数')}, {_q('risk_prob')}) FROM data"
+            ).fetchone()[0]
+
+        if self.has('近两年内逾期次数'):
+            k = _q('近两年内逾期次数')
+            counts = self._df(f"SELECT {k} AS k, count(*) AS n FROM data WHERE {k} IS NOT NULL GROUP BY 1 ORDER BY n DESC, k")
+            result['近两年内逾期次数分布'] = pd.Series(counts['n'].values, index=counts['k'].values, name='count')
+            if self.has('总欠款'):
+                means = self._df(f"SELECT {k} AS k, avg({_q('总欠款')}) AS m FROM data WHERE {k} IS NOT NULL GROUP BY 1 ORDER BY 1")
+                result['逾期次数与总欠款关系'] = pd.Series(means['m'].values, index=means['k'].values, name='总欠款')
+
+        if payment_history_cols and self.has('risk_prob'):
+            result['风险等级与还款模式'] = self.risk_payment_crosstab(payment_history_cols)
+        return result
+
+    def risk_payment_crosstab(self, payment_history_cols: list) -> pd.DataFrame:
+        """风险等级 × 还款模式 交叉表（按行归一化，%）"""
+        cols = [c for c in payment_history_cols if c in self.columns]
+        counts = self._df(
+            f"SELECT {_risk_level_sql()} AS level, {_payment_pattern_sql(cols)} AS pattern, count(*) AS n "
+            f"FROM data WHERE {_risk_level_sql()} IS NOT NULL GROUP BY 1, 2"
+        )
+        cross = counts.pivot(index='level', columns='pattern', values='n').fillna(0)
+        cross = cross.reindex([l for l in RISK_LEVEL_LABELS if l in cross.index])
+        cross = cross[sorted(cross.columns)].astype(float)
+        cross.index.name, cross.columns.name = '风险等级', '还款模式'
+        return cross.div(cross.sum(axis=1), axis=0) * 100
+
+    # ------------------- 欠款构成 -------------------
+    def debt_composition(self, debt_components: list) -> dict:
+        components = [c for c in debt_components if c in self.columns]
+        if not components:
+            return {}
+        result = {}
+        sums = ", ".join(f"coalesce(sum({_q(c)}), 0)" for c in components)
+        totals = pd.Series(self.con.execute(f"SELECT {sums} FROM data").fetchone(), index=components, dtype=float)
+        result['总体欠款构成(总额)'] = totals
+        result['总体欠款构成(占比)'] = totals / totals.sum() * 100
+
+        if self.has('逾期天数'):
+            group_sums = ", ".join(f"coalesce(sum({_q(c)}), 0) AS {_q(c)}" for c in components)
+            grouped = self._df(
+                f"SELECT {_overdue_group_sql()} AS grp, {group_sums} FROM data "
+                f"WHERE {_overdue_group_sql()} IS NOT NULL GROUP BY 1"
+            ).set_index('grp')
+            grouped = grouped.reindex(OVERDUE_DAY_LABELS, fill_value=0).astype(float)
+            grouped.index = pd.CategoricalIndex(OVERDUE_DAY_LABELS, categories=OVERDUE_DAY_LABELS, ordered=True, name='逾期天数分组')
+            result['按逾期天数分组的欠款构成'] = grouped
+        return result
+
+    # ------------------- 明细抽样（画散点图用） -------------------
+    def sample(self, columns: list, n: int = 5000) -> pd.DataFrame:
+        if not columns:
+            raise ValueError("抽样至少需要指定一列")
+        missing = [c for c in columns if c not in self.columns]
+        if missing:
+            raise ValueError(f"数据中缺少列: {'、'.join(map(str, missing))}")
+        cols = ", ".join(_q(c) for c in columns)
+        return self._df(f"SELECT {cols} FROM data USING SAMPLE {int(n)} ROWS")